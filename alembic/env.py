@@ -27,6 +27,13 @@ if config.config_file_name is not None:
 # add your model's MetaData object here
 target_metadata = Base.metadata
 
+# Объекты, созданные миграциями вне моделей: autogenerate их не удаляет
+UNMAPPED_OBJECTS = {"search_vector", "ix_tweets_search_vector"}
+
+
+def include_object(object, name, type_, reflected, compare_to) -> bool:
+    return not (reflected and compare_to is None and name in UNMAPPED_OBJECTS)
+
 
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode."""
@@ -34,6 +41,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -43,7 +51,11 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
@@ -0,0 +1,30 @@
+# alembic/script.py.mako
+"""Add feed pagination indexes
+
+Revision ID: 4c1e7a9b2d3f
+Revises: 63fac8a08259
+Create Date: 2026-10-18 10:12:31.418207
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "4c1e7a9b2d3f"
+down_revision = "63fac8a08259"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_tweets_created_at_id", "tweets", ["created_at", "id"], unique=False
+    )
+    op.create_index(
+        "ix_tweet_likes_tweet_id", "tweet_likes", ["tweet_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tweet_likes_tweet_id", table_name="tweet_likes")
+    op.drop_index("ix_tweets_created_at_id", table_name="tweets")
@@ -0,0 +1,36 @@
+# alembic/script.py.mako
+"""Add missing indexes
+
+Revision ID: a2c6e8f0b3d5
+Revises: f5a7c3d9e1b2
+Create Date: 2026-10-18 15:41:09.204761
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a2c6e8f0b3d5"
+down_revision = "f5a7c3d9e1b2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Первичный ключ (follower_id, following_id) не помогает при поиске
+    # подписчиков пользователя и раскладке его твитов по лентам
+    op.create_index(
+        "ix_user_followers_following_id_follower_id",
+        "user_followers",
+        ["following_id", "follower_id"],
+        unique=False,
+    )
+    # Каскадное удаление пользователя и проверка владельца медиа
+    op.create_index(op.f("ix_medias_user_id"), "medias", ["user_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_medias_user_id"), table_name="medias")
+    op.drop_index(
+        "ix_user_followers_following_id_follower_id", table_name="user_followers"
+    )
@@ -0,0 +1,41 @@
+# alembic/script.py.mako
+"""Add tweets like_count
+
+Revision ID: b7d2e4f61a08
+Revises: 4c1e7a9b2d3f
+Create Date: 2026-10-18 11:03:47.562914
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b7d2e4f61a08"
+down_revision = "4c1e7a9b2d3f"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "tweets",
+        sa.Column("like_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.execute("""
+        UPDATE tweets SET like_count = (
+            SELECT count(*) FROM tweet_likes WHERE tweet_likes.tweet_id = tweets.id
+        )
+    """)
+    op.create_index(
+        "ix_tweets_like_count_created_at_id",
+        "tweets",
+        ["like_count", "created_at", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tweets_like_count_created_at_id", table_name="tweets")
+    op.drop_column("tweets", "like_count")
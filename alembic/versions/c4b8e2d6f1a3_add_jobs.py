@@ -0,0 +1,46 @@
+# alembic/script.py.mako
+"""Add jobs
+
+Revision ID: c4b8e2d6f1a3
+Revises: a2c6e8f0b3d5
+Create Date: 2026-10-18 19:12:44.518203
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c4b8e2d6f1a3"
+down_revision = "a2c6e8f0b3d5"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "jobs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(length=100), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("attempts", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("run_at", sa.DateTime(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("failed_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    # Воркеры выбирают готовые задачи по run_at, упавшие в выборку не входят
+    op.create_index(
+        "ix_jobs_run_at",
+        "jobs",
+        ["run_at"],
+        unique=False,
+        postgresql_where=sa.text("failed_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_jobs_run_at", table_name="jobs")
+    op.drop_table("jobs")
@@ -0,0 +1,76 @@
+# alembic/script.py.mako
+"""Add home timeline
+
+Revision ID: d91a3c5e7f20
+Revises: b7d2e4f61a08
+Create Date: 2026-10-18 12:41:09.730651
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d91a3c5e7f20"
+down_revision = "b7d2e4f61a08"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users",
+        sa.Column("followers_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.execute("""
+        UPDATE users SET followers_count = (
+            SELECT count(*) FROM user_followers
+            WHERE user_followers.following_id = users.id
+        )
+    """)
+    op.create_index(
+        "ix_tweets_author_id_id", "tweets", ["author_id", "id"], unique=False
+    )
+    op.create_table(
+        "home_timeline",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("tweet_id", sa.Integer(), nullable=False),
+        sa.Column("author_id", sa.Integer(), nullable=False),
+        sa.Column("score", sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(["author_id"], ["users.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["tweet_id"], ["tweets.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "tweet_id"),
+    )
+    op.create_index(
+        "ix_home_timeline_user_id_score_tweet_id",
+        "home_timeline",
+        ["user_id", "score", "tweet_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_home_timeline_user_id_author_id",
+        "home_timeline",
+        ["user_id", "author_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_home_timeline_tweet_id", "home_timeline", ["tweet_id"], unique=False
+    )
+    # Раскладка уже опубликованных твитов по лентам текущих подписчиков
+    op.execute("""
+        INSERT INTO home_timeline (user_id, tweet_id, author_id, score)
+        SELECT user_followers.follower_id, tweets.id, tweets.author_id, tweets.id
+        FROM user_followers
+        JOIN tweets ON tweets.author_id = user_followers.following_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_home_timeline_tweet_id", table_name="home_timeline")
+    op.drop_index("ix_home_timeline_user_id_author_id", table_name="home_timeline")
+    op.drop_index("ix_home_timeline_user_id_score_tweet_id", table_name="home_timeline")
+    op.drop_table("home_timeline")
+    op.drop_index("ix_tweets_author_id_id", table_name="tweets")
+    op.drop_column("users", "followers_count")
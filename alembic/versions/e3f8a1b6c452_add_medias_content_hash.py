@@ -0,0 +1,33 @@
+# alembic/script.py.mako
+"""Add medias content_hash
+
+Revision ID: e3f8a1b6c452
+Revises: d91a3c5e7f20
+Create Date: 2026-10-18 14:20:55.118374
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e3f8a1b6c452"
+down_revision = "d91a3c5e7f20"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Файлы, загруженные до перехода на хранение по хэшу, остаются с NULL
+    op.add_column(
+        "medias", sa.Column("content_hash", sa.String(length=64), nullable=True)
+    )
+    op.create_index(
+        op.f("ix_medias_content_hash"), "medias", ["content_hash"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_medias_content_hash"), table_name="medias")
+    op.drop_column("medias", "content_hash")
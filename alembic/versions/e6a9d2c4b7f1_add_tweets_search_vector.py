@@ -0,0 +1,45 @@
+# alembic/script.py.mako
+"""Add tweets search vector
+
+Revision ID: e6a9d2c4b7f1
+Revises: c4b8e2d6f1a3
+Create Date: 2026-10-18 21:03:17.264810
+
+"""
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e6a9d2c4b7f1"
+down_revision = "c4b8e2d6f1a3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Генерируемый столбец пересчитывается самой БД при записи content.
+    # Добавление STORED-столбца переписывает таблицу под эксклюзивной блокировкой
+    op.add_column(
+        "tweets",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('russian', content)", persisted=True),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        "ix_tweets_search_vector",
+        "tweets",
+        ["search_vector"],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tweets_search_vector", table_name="tweets")
+    op.drop_column("tweets", "search_vector")
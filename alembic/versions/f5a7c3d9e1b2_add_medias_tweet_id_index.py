@@ -0,0 +1,24 @@
+# alembic/script.py.mako
+"""Add medias tweet_id index
+
+Revision ID: f5a7c3d9e1b2
+Revises: e3f8a1b6c452
+Create Date: 2026-10-18 15:02:47.530912
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "f5a7c3d9e1b2"
+down_revision = "e3f8a1b6c452"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f("ix_medias_tweet_id"), "medias", ["tweet_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_medias_tweet_id"), table_name="medias")
@@ -0,0 +1,155 @@
+"""Сравнение гидрации ленты: ORM + selectinload против одной проекции с JSON-агрегатами.
+
+Запуск:
+    python benchmarks/feed_hydration.py --tweets 10000 100000
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python benchmarks/feed_hydration.py
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import selectinload
+from sqlalchemy.pool import StaticPool
+
+from microblog.api.schemas import AuthUserSchema, TweetShemaOut, TweetsResponseSchema
+from microblog.db.base import Base
+from microblog.db.models import Media, Tweet, User, tweet_like_association
+from microblog.repositories.repository import TweetRepository
+
+USERS = 1000
+LIKES_PER_TWEET = 5
+MEDIA_EVERY = 3
+BATCH = 5000
+
+
+async def seed(session: AsyncSession, tweets: int) -> None:
+    """Наполнение БД пользователями, твитами, вложениями и лайками пачками"""
+    rnd = random.Random(42)
+    await session.execute(
+        insert(User),
+        [
+            {"id": i, "name": f"user{i}", "api_key": f"key{i}"}
+            for i in range(1, USERS + 1)
+        ],
+    )
+    start = datetime(2024, 1, 1)
+    for offset in range(0, tweets, BATCH):
+        ids = range(offset + 1, min(offset + BATCH, tweets) + 1)
+        likes = [
+            {"user_id": user_id, "tweet_id": tweet_id}
+            for tweet_id in ids
+            for user_id in rnd.sample(
+                range(1, USERS + 1), rnd.randint(0, LIKES_PER_TWEET)
+            )
+        ]
+        like_count: dict[int, int] = {}
+        for like in likes:
+            like_count[like["tweet_id"]] = like_count.get(like["tweet_id"], 0) + 1
+        await session.execute(
+            insert(Tweet),
+            [
+                {
+                    "id": tweet_id,
+                    "content": f"tweet {tweet_id}",
+                    "author_id": rnd.randint(1, USERS),
+                    "created_at": start + timedelta(seconds=tweet_id),
+                    "like_count": like_count.get(tweet_id, 0),
+                }
+                for tweet_id in ids
+            ],
+        )
+        if likes:
+            await session.execute(insert(tweet_like_association), likes)
+        medias = [
+            {"path": f"{tweet_id:064x}.jpg", "user_id": 1, "tweet_id": tweet_id}
+            for tweet_id in ids
+            if tweet_id % MEDIA_EVERY == 0
+        ]
+        await session.execute(insert(Media), medias)
+    await session.commit()
+
+
+async def orm_page(session: AsyncSession, limit: int) -> list[TweetShemaOut]:
+    """Прежняя схема: ORM-объекты + selectinload + model_validate(from_attributes)"""
+    query = (
+        select(Tweet)
+        .options(
+            selectinload(Tweet.author),
+            selectinload(Tweet.attachments),
+            selectinload(Tweet.likes),
+        )
+        .order_by(Tweet.like_count.desc(), Tweet.created_at.desc(), Tweet.id.desc())
+        .limit(limit)
+    )
+    tweets = (await session.execute(query)).scalars().all()
+    return [
+        TweetShemaOut.model_validate(tweet, from_attributes=True) for tweet in tweets
+    ]
+
+
+async def projection_page(session: AsyncSession, limit: int) -> list[dict]:
+    """Текущая схема: одна выборка колонок, вложения и лайки агрегированы в БД"""
+    tweets, _ = await TweetRepository(session).get_tweets(
+        user=AuthUserSchema(id=1, name="user1"),
+        all_tweets=True,
+        cursor=None,
+        limit=limit,
+    )
+    return tweets
+
+
+async def measure(factory: async_sessionmaker, page, limit: int, repeat: int) -> float:
+    """Медиана времени получения и сериализации страницы, мс"""
+    timings = []
+    for _ in range(repeat):
+        async with factory() as session:
+            started = time.perf_counter()
+            tweets = await page(session, limit)
+            TweetsResponseSchema(result=True, tweets=tweets).model_dump_json(
+                by_alias=True
+            )
+            timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+async def run(url: str, tweets: int, limit: int, repeat: int) -> None:
+    kwargs = {"poolclass": StaticPool} if url.startswith("sqlite") else {}
+    engine = create_async_engine(url, **kwargs)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+    async with factory() as session:
+        await seed(session, tweets)
+
+    orm = await measure(factory, orm_page, limit, repeat)
+    projection = await measure(factory, projection_page, limit, repeat)
+    print(
+        f"{tweets:>8} твитов, страница {limit}: "
+        f"ORM {orm:8.2f} мс | проекция {projection:8.2f} мс | x{orm / projection:.1f}"
+    )
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tweets", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    url = os.getenv("BENCH_DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+    for tweets in args.tweets:
+        asyncio.run(run(url, tweets, args.limit, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""Генератор синтетического социального графа для нагрузочных тестов.
+
+Подписчики, активность авторов и лайки распределены по степенному закону:
+немногие пользователи собирают большую часть подписчиков, пишут большую часть
+твитов и ставят большую часть лайков. Пользователи получают API-Key вида
+load<id>, на пустой базе load1, load2, ... - по ним авторизуется
+benchmarks/load_test.py.
+Данные добавляются к существующим, вставка пачками через COPY/executemany.
+
+Запуск:
+    python benchmarks/generate_data.py --users 10000 --tweets 100000
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python benchmarks/generate_data.py \\
+        --users 200000 --tweets 5000000 --likes-per-tweet 2 --fan-out
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from faker import Faker
+from sqlalchemy import func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from microblog.config import settings
+from microblog.db.base import Base
+from microblog.db.models import (
+    Media,
+    Tweet,
+    User,
+    tweet_like_association,
+    user_followers_association,
+)
+from microblog.repositories.repository import TweetRepository, bulk_insert
+
+BATCH = 10_000
+START = datetime(2024, 1, 1)
+
+
+class PowerLaw:
+    """Выбор id по закону Ципфа: вес id с рангом r равен 1 / r**exponent,
+    ранги раздаются id в случайном порядке"""
+
+    def __init__(self, ids: range, exponent: float, rnd: random.Random) -> None:
+        self.ids = list(ids)
+        rnd.shuffle(self.ids)
+        self.cum_weights = list(
+            accumulate(1 / rank**exponent for rank in range(1, len(self.ids) + 1))
+        )
+        self.rnd = rnd
+
+    def sample(self, k: int) -> list[int]:
+        return self.rnd.choices(self.ids, cum_weights=self.cum_weights, k=k)
+
+
+def degree(rnd: random.Random, mean: float, alpha: float, cap: int) -> int:
+    """Степень вершины по распределению Парето со средним около mean"""
+    if mean <= 0:
+        return 0
+    scale = mean * (alpha - 1) / alpha
+    return min(cap, int(scale * rnd.paretovariate(alpha)))
+
+
+def batches(total: int, size: int = BATCH) -> Iterator[range]:
+    for start in range(0, total, size):
+        yield range(start, min(start + size, total))
+
+
+async def max_id(session: AsyncSession, column) -> int:
+    return await session.scalar(select(func.max(column))) or 0
+
+
+async def generate_users(
+    session: AsyncSession, args: argparse.Namespace, offset: int, fake: Faker
+) -> range:
+    """Пользователи с API-Key <key_prefix><id>: ключи уникальны и при
+    повторном запуске, данные которого добавляются к существующим"""
+    names = [fake.name()[:50] for _ in range(1000)]
+    user_ids = range(offset + 1, offset + args.users + 1)
+    for chunk in batches(args.users):
+        records = [
+            (
+                offset + i + 1,
+                names[i % len(names)],
+                f"{args.key_prefix}{offset + i + 1}",
+                0,
+            )
+            for i in chunk
+        ]
+        await bulk_insert(
+            session,
+            User.__table__,
+            ["id", "name", "api_key", "followers_count"],
+            records,
+        )
+        await session.commit()
+    return user_ids
+
+
+async def generate_follows(
+    session: AsyncSession,
+    args: argparse.Namespace,
+    user_ids: range,
+    rnd: random.Random,
+) -> int:
+    """Подписки: число подписок - Парето, цель выбирается по популярности"""
+    popularity = PowerLaw(user_ids, args.exponent, rnd)
+    records: list[tuple] = []
+    total = 0
+    for follower in user_ids:
+        count = degree(rnd, args.follows_per_user, args.alpha, len(user_ids) - 1)
+        targets = set(popularity.sample(count))
+        targets.discard(follower)
+        records.extend((follower, target) for target in targets)
+        if len(records) >= BATCH or follower == user_ids[-1]:
+            await bulk_insert(
+                session,
+                user_followers_association,
+                ["follower_id", "following_id"],
+                records,
+            )
+            await session.commit()
+            total += len(records)
+            records = []
+
+    # Денормализованный счётчик подписчиков одним UPDATE
+    followers = (
+        select(func.count())
+        .select_from(user_followers_association)
+        .where(user_followers_association.c.following_id == User.id)
+        .correlate(User)
+        .scalar_subquery()
+    )
+    await session.execute(
+        update(User)
+        .where(User.id.between(user_ids[0], user_ids[-1]))
+        .values(followers_count=followers)
+    )
+    await session.commit()
+    return total
+
+
+async def generate_tweets(
+    session: AsyncSession,
+    args: argparse.Namespace,
+    user_ids: range,
+    offsets: dict[str, int],
+    rnd: random.Random,
+    fake: Faker,
+) -> tuple[int, int]:
+    """Твиты, лайки и вложения: авторы и лайкающие - по активности"""
+    sentences = [fake.sentence(nb_words=12) for _ in range(1000)]
+    authors = PowerLaw(user_ids, args.exponent, rnd)
+    likers = PowerLaw(user_ids, args.exponent, rnd)
+    step = timedelta(days=365) / max(args.tweets, 1)
+    likes_total = medias_total = 0
+    media_id = offsets["medias"]
+
+    for chunk in batches(args.tweets):
+        tweets, likes, medias = [], [], []
+        for i, author_id in zip(chunk, authors.sample(len(chunk)), strict=True):
+            tweet_id = offsets["tweets"] + i + 1
+            liked_by = set(
+                likers.sample(
+                    degree(rnd, args.likes_per_tweet, args.alpha, len(user_ids))
+                )
+            )
+            tweets.append(
+                (
+                    tweet_id,
+                    rnd.choice(sentences),
+                    author_id,
+                    START + step * i,
+                    len(liked_by),
+                )
+            )
+            likes.extend((user_id, tweet_id) for user_id in liked_by)
+            if rnd.random() < args.media_ratio:
+                media_id += 1
+                medias.append(
+                    (media_id, f"load/{media_id:08d}.jpg", author_id, tweet_id)
+                )
+
+        await bulk_insert(
+            session,
+            Tweet.__table__,
+            ["id", "content", "author_id", "created_at", "like_count"],
+            tweets,
+        )
+        if likes:
+            await bulk_insert(
+                session, tweet_like_association, ["user_id", "tweet_id"], likes
+            )
+        if medias:
+            await bulk_insert(
+                session,
+                Media.__table__,
+                ["id", "path", "user_id", "tweet_id"],
+                medias,
+            )
+        await session.commit()
+        likes_total += len(likes)
+        medias_total += len(medias)
+        print(f"  твитов: {chunk[-1] + 1}/{args.tweets}", end="\r")
+
+    print()
+    return likes_total, medias_total
+
+
+async def reset_sequences(session: AsyncSession) -> None:
+    """Id вставлены явно - последовательности PostgreSQL сдвигаются на max(id)"""
+    if session.get_bind().dialect.name != "postgresql":
+        return
+    for table in ("users", "tweets", "medias"):
+        await session.execute(
+            text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"(SELECT max(id) FROM {table}))"
+            )
+        )
+    await session.commit()
+
+
+async def run(url: str, args: argparse.Namespace) -> None:
+    engine = create_async_engine(url)
+    if args.create_tables:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    rnd = random.Random(args.seed)
+    fake = Faker("ru_RU")
+    fake.seed_instance(args.seed)
+    started = time.perf_counter()
+
+    async with factory() as session:
+        offsets = {
+            "users": await max_id(session, User.id),
+            "tweets": await max_id(session, Tweet.id),
+            "medias": await max_id(session, Media.id),
+        }
+        user_ids = await generate_users(session, args, offsets["users"], fake)
+        follows = await generate_follows(session, args, user_ids, rnd)
+        likes, medias = await generate_tweets(
+            session, args, user_ids, offsets, rnd, fake
+        )
+        await reset_sequences(session)
+
+        if args.fan_out:
+            await TweetRepository(session).fan_out_imported(after_id=offsets["tweets"])
+
+        async with engine.begin() as conn:
+            await conn.execute(text("ANALYZE"))
+
+    await engine.dispose()
+    rows = args.users + follows + args.tweets + likes + medias
+    elapsed = time.perf_counter() - started
+    print(
+        f"пользователей {args.users}, подписок {follows}, твитов {args.tweets}, "
+        f"лайков {likes}, медиа {medias}: {rows} строк за {elapsed:.1f} с "
+        f"({rows / elapsed:,.0f} строк/с)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--tweets", type=int, default=100_000)
+    parser.add_argument("--follows-per-user", type=float, default=20)
+    parser.add_argument("--likes-per-tweet", type=float, default=5)
+    parser.add_argument("--media-ratio", type=float, default=0.2)
+    parser.add_argument(
+        "--exponent", type=float, default=1.1, help="Показатель закона Ципфа"
+    )
+    parser.add_argument(
+        "--alpha", type=float, default=2.0, help="Хвост распределения Парето, > 1"
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--key-prefix", default="load", help="Префикс API-Key, уникальный на запуск"
+    )
+    parser.add_argument(
+        "--fan-out", action="store_true", help="Заполнить домашние ленты"
+    )
+    parser.add_argument(
+        "--create-tables", action="store_true", help="Создать таблицы без Alembic"
+    )
+    args = parser.parse_args()
+
+    url = os.getenv("BENCH_DATABASE_URL", settings.POSTGRES.DATABASE_URL)
+    asyncio.run(run(url, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Сериализация ленты: ответ FastAPI по response_model против FastJSONResponse.
+
+До: модель ответа повторно валидируется по response_model, проходит
+jsonable_encoder и json.dumps, время форматируется strftime на каждый твит.
+После: pydantic-core пишет модель сразу в байты, время форматируется с кешем.
+
+Запуск:
+    python benchmarks/json_serialization.py --tweets 1000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import UTC, datetime, timedelta
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from pydantic import ConfigDict, computed_field
+
+from microblog.api.schemas import TweetShemaOut, TweetsResponseSchema, UserLikeSchema
+from microblog.core.responses import FastJSONResponse
+
+USERS = 1000
+LIKES_PER_TWEET = 5
+
+
+class StrftimeTweetLikeSchema(UserLikeSchema):
+    # Повторная валидация получает уже сериализованный user_id вместо id
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class StrftimeTweetSchema(TweetShemaOut):
+    """Твит с прежним форматированием времени через strftime"""
+
+    likes: list[StrftimeTweetLikeSchema] = []
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def stamp(self) -> str:
+        if self.created_at.tzinfo is None:
+            utc_time = self.created_at.replace(tzinfo=UTC)
+        else:
+            utc_time = self.created_at.astimezone(UTC)
+
+        return utc_time.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class StrftimeResponseSchema(TweetsResponseSchema):
+    tweets: list[StrftimeTweetSchema] | None
+
+
+def make_feed(tweets: int) -> list[dict]:
+    """Лента в виде словарей, которые отдаёт репозиторий"""
+    rnd = random.Random(42)
+    start = datetime(2024, 1, 1)
+    feed = []
+    for tweet_id in range(1, tweets + 1):
+        likes = [
+            {"id": user_id, "name": f"user{user_id}"}
+            for user_id in rnd.sample(
+                range(1, USERS + 1), rnd.randint(0, LIKES_PER_TWEET)
+            )
+        ]
+        feed.append(
+            {
+                "id": tweet_id,
+                "content": f"tweet {tweet_id} " * 10,
+                "created_at": start + timedelta(seconds=tweet_id),
+                "author": {"id": rnd.randint(1, USERS), "name": "author"},
+                "attachments": [f"{tweet_id:064x}.jpg"] if tweet_id % 3 == 0 else [],
+                "likes": likes,
+                "like_count": len(likes),
+            }
+        )
+    return feed
+
+
+def before(feed: list[dict]) -> bytes:
+    """Прежний путь: response_model -> валидация -> jsonable_encoder -> json.dumps"""
+    field = create_model_field(name="Response", type_=StrftimeResponseSchema)
+    content = StrftimeResponseSchema(result=True, tweets=feed)
+    encoded = asyncio.run(serialize_response(field=field, response_content=content))
+    return JSONResponse(encoded).body
+
+
+def after(feed: list[dict]) -> bytes:
+    """Текущий путь: модель сразу в байты через pydantic-core"""
+    content = TweetsResponseSchema(result=True, tweets=feed)
+    return FastJSONResponse(content).body
+
+
+def measure(render, feed: list[dict], repeat: int) -> float:
+    """Медиана времени сериализации в пересчёте на один твит, мкс"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        render(feed)
+        timings.append((time.perf_counter() - started) * 1_000_000 / len(feed))
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tweets", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    feed = make_feed(args.tweets)
+
+    old = measure(before, feed, args.repeat)
+    new = measure(after, feed, args.repeat)
+    print(
+        f"{args.tweets} твитов: до {old:6.2f} мкс/твит | "
+        f"после {new:6.2f} мкс/твит | x{old / new:.1f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""Нагрузочный драйвер: смесь запросов ленты, лайков, подписок, профилей и загрузок.
+
+Виртуальные пользователи авторизуются ключами load1..loadN из
+benchmarks/generate_data.py, id твитов и авторов для лайков, подписок
+и профилей берутся из полученных лент. По каждой ручке выводятся
+число запросов, ошибки, пропускная способность и задержки p50/p95/p99.
+
+Запуск:
+    python benchmarks/load_test.py --base-url http://localhost:8000 \\
+        --users 10000 --concurrency 50 --duration 60 \\
+        --mix feed=50,home=15,like=15,follow=8,profile=10,upload=2
+"""
+
+import argparse
+import asyncio
+import io
+import random
+import time
+from collections import defaultdict
+
+import httpx
+from PIL import Image
+
+DEFAULT_MIX = "feed=50,home=15,like=15,follow=8,profile=10,upload=2"
+
+
+class Stats:
+    """Задержки и ошибки по ручкам"""
+
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    def record(self, endpoint: str, seconds: float, ok: bool) -> None:
+        self.latencies[endpoint].append(seconds)
+        if not ok:
+            self.errors[endpoint] += 1
+
+    def report(self, elapsed: float) -> str:
+        lines = [
+            f"{'ручка':<28}{'запросов':>10}{'ошибок':>8}{'rps':>9}"
+            f"{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}"
+        ]
+        total = 0
+        for endpoint in sorted(self.latencies):
+            timings = sorted(self.latencies[endpoint])
+            total += len(timings)
+            lines.append(
+                f"{endpoint:<28}{len(timings):>10}{self.errors[endpoint]:>8}"
+                f"{len(timings) / elapsed:>9.1f}"
+                + "".join(
+                    f"{percentile(timings, p) * 1000:>10.1f}" for p in (50, 95, 99)
+                )
+            )
+        lines.append(f"{'всего':<28}{total:>10}{'':>8}{total / elapsed:>9.1f}")
+        return "\n".join(lines)
+
+
+def percentile(timings: list[float], p: float) -> float:
+    """Перцентиль по ближайшему рангу, timings отсортированы"""
+    rank = max(0, min(len(timings) - 1, round(p / 100 * len(timings)) - 1))
+    return timings[rank]
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        name, weight = item.split("=")
+        if name not in ACTIONS:
+            raise argparse.ArgumentTypeError(f"Неизвестное действие {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+def make_png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), (30, 144, 255)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class VirtualUser:
+    """Пользователь со своим API-Key и замеченными id твитов и авторов"""
+
+    def __init__(
+        self, client: httpx.AsyncClient, stats: Stats, api_key: str, png: bytes
+    ) -> None:
+        self.client = client
+        self.stats = stats
+        self.headers = {"api-key": api_key}
+        self.png = png
+        self.tweet_ids: list[int] = []
+        self.author_ids: list[int] = []
+
+    async def request(self, endpoint: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(
+                method, url, headers=self.headers, **kwargs
+            )
+        except httpx.HTTPError:
+            self.stats.record(endpoint, time.perf_counter() - started, ok=False)
+            return None
+        # 404 на повторный лайк/подписку - ожидаемый ответ, не ошибка сервера
+        ok = response.is_success or response.status_code == 404
+        self.stats.record(endpoint, time.perf_counter() - started, ok=ok)
+        return response
+
+    def remember(self, response) -> None:
+        if response is None or response.status_code != 200:
+            return
+        for tweet in response.json().get("tweets") or []:
+            self.tweet_ids.append(tweet["id"])
+            self.author_ids.append(tweet["author"]["id"])
+        del self.tweet_ids[:-200], self.author_ids[:-200]
+
+    async def feed(self) -> None:
+        self.remember(await self.request("GET /api/tweets", "GET", "/api/tweets"))
+
+    async def home(self) -> None:
+        self.remember(
+            await self.request(
+                "GET /api/tweets?all_tweets=0",
+                "GET",
+                "/api/tweets",
+                params={"all_tweets": False},
+            )
+        )
+
+    async def like(self) -> None:
+        if not self.tweet_ids:
+            return await self.feed()
+        tweet_id = random.choice(self.tweet_ids)
+        method = random.choice(("POST", "DELETE"))
+        await self.request(
+            f"{method} /api/tweets/{{id}}/likes",
+            method,
+            f"/api/tweets/{tweet_id}/likes",
+        )
+
+    async def follow(self) -> None:
+        if not self.author_ids:
+            return await self.feed()
+        user_id = random.choice(self.author_ids)
+        method = random.choice(("POST", "DELETE"))
+        await self.request(
+            f"{method} /api/users/{{id}}/follow", method, f"/api/users/{user_id}/follow"
+        )
+
+    async def profile(self) -> None:
+        if not self.author_ids:
+            return await self.feed()
+        user_id = random.choice(self.author_ids)
+        await self.request("GET /api/users/{id}", "GET", f"/api/users/{user_id}")
+
+    async def upload(self) -> None:
+        await self.request(
+            "POST /api/medias",
+            "POST",
+            "/api/medias",
+            files={"file": ("load.png", self.png, "image/png")},
+        )
+
+
+ACTIONS = {
+    "feed": VirtualUser.feed,
+    "home": VirtualUser.home,
+    "like": VirtualUser.like,
+    "follow": VirtualUser.follow,
+    "profile": VirtualUser.profile,
+    "upload": VirtualUser.upload,
+}
+
+
+async def worker(
+    client: httpx.AsyncClient,
+    stats: Stats,
+    args: argparse.Namespace,
+    png: bytes,
+    deadline: float,
+) -> None:
+    user = VirtualUser(
+        client, stats, f"{args.key_prefix}{random.randint(1, args.users)}", png
+    )
+    names, weights = zip(*args.mix.items(), strict=True)
+    while time.perf_counter() < deadline:
+        (action,) = random.choices(names, weights=weights)
+        await ACTIONS[action](user)
+
+
+async def run(args: argparse.Namespace) -> None:
+    stats = Stats()
+    png = make_png()
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=args.base_url, limits=limits, timeout=args.timeout
+    ) as client:
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(
+            *(
+                worker(client, stats, args, png, deadline)
+                for _ in range(args.concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - started
+
+    print(stats.report(elapsed))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--key-prefix", default="load")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,12 @@ from fastapi import HTTPException, status
 from fastapi.params import Depends, Header
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from microblog.core.database import get_db
-from microblog.db.models import User
+from microblog.api.schemas import AuthUserSchema
+from microblog.config import settings
+from microblog.core.cache import feed_cache
+from microblog.core.database import get_db, get_read_db, reads_from_replica
+from microblog.core.events import event_bus
+from microblog.core.security import auth_cache
 from microblog.repositories.interfaces import IMediaRepository, ITweetRepository
 from microblog.repositories.repository import (
     MediaRepository,
@@ -28,7 +32,7 @@ async def get_user_repository(
 async def get_user_service(
     user_repo: Annotated[UserRepository, Depends(get_user_repository)],
 ) -> UserService:
-    return UserService(user_repo)
+    return UserService(user_repo, feed_cache)
 
 
 async def get_tweet_repository(
@@ -40,7 +44,37 @@ async def get_tweet_repository(
 async def get_tweet_service(
     tweet_repo: Annotated[ITweetRepository, Depends(get_tweet_repository)],
 ) -> TweetService:
-    return TweetService(tweet_repo)
+    return TweetService(tweet_repo, feed_cache, event_bus)
+
+
+async def get_read_user_repository(
+    db: Annotated[AsyncSession, Depends(get_read_db)],
+) -> UserRepository:
+    return UserRepository(db)
+
+
+async def get_read_user_service(
+    user_repo: Annotated[UserRepository, Depends(get_read_user_repository)],
+) -> UserService:
+    """Сервис пользователей для ручек чтения: запросы идут на реплики"""
+    return UserService(user_repo, feed_cache)
+
+
+async def get_read_tweet_repository(
+    db: Annotated[AsyncSession, Depends(get_read_db)],
+) -> ITweetRepository:
+    return TweetRepository(db)
+
+
+async def get_read_tweet_service(
+    tweet_repo: Annotated[ITweetRepository, Depends(get_read_tweet_repository)],
+    db: Annotated[AsyncSession, Depends(get_read_db)],
+) -> TweetService:
+    """Сервис твитов для ручек чтения: запросы идут на реплики"""
+    replica_lag = 0.0
+    if reads_from_replica(db):
+        replica_lag = settings.POSTGRES.STICKY_PRIMARY_SECONDS
+    return TweetService(tweet_repo, feed_cache, event_bus, replica_lag)
 
 
 async def get_media_repository(
@@ -56,19 +90,23 @@ async def get_media_service(
 
 
 async def get_current_user(
-    user_service: Annotated[UserService, Depends(get_user_service)],
+    user_repo: Annotated[UserRepository, Depends(get_read_user_repository)],
     api_key: Annotated[str, Header(..., description="Ключ текущего пользователя")],
-) -> User:
+) -> AuthUserSchema:
     if not api_key:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Ключа пользователя API-Key не существует",
         )
-    user = await user_service._user_repo.get_user_by_api_key(api_key)
+    # В общем случае авторизация - поиск в кэше, БД только при промахе
+    cached, user = auth_cache.lookup(api_key)
+    if not cached:
+        user = await user_repo.get_user_by_api_key(api_key)
+        auth_cache.set(api_key, user)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Не верный ключ API-Key для данного пользователя",
         )
 
-    return user  # type: ignore
+    return user
@@ -1,74 +1,124 @@
-from typing import Annotated
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, UploadFile
-from fastapi.params import Body, Depends, File, Path
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Request, Response, UploadFile
+from fastapi.params import Body, Depends, File, Path, Query
+from fastapi.responses import FileResponse, StreamingResponse
 
 from microblog.api.dependencies import (
     get_current_user,
     get_media_service,
+    get_read_tweet_service,
+    get_read_user_service,
     get_tweet_service,
     get_user_service,
 )
 from microblog.api.schemas import (
+    AuthUserSchema,
+    BatchIdsSchema,
+    BatchSuccessSchema,
     CreateTweetSchema,
+    FollowsResponseSchema,
     FollUnfollowSchema,
     TweetsResponseSchema,
     TweetSuccessSchema,
     UserResponseSchema,
-    UserSchemaOut,
 )
-from microblog.db.models import User
+from microblog.config import settings
+from microblog.core.events import event_bus, sse_stream
+from microblog.core.responses import FastJSONRoute
+from microblog.core.static import static_files
+from microblog.core.storage import UploadRoute, media_response
 from microblog.logger import get_logger
-from microblog.services.media_service import MediaService
+from microblog.services.media_service import MediaService, get_media_file
 from microblog.services.tweet_service import TweetService
 from microblog.services.user_service import UserService
 
 logger = get_logger(__name__)
 
-# Роутеры
+# Роутеры, модели ответов API сериализуются сразу в байты
 start_router = APIRouter(tags=["Стартовый"])
-users_router = APIRouter(prefix="/api/users", tags=["Пользователи"])
-tweets_router = APIRouter(prefix="/api/tweets", tags=["Твиты"])
-medias_router = APIRouter(prefix="/api/medias", tags=["Медиа"])
+users_router = APIRouter(
+    prefix="/api/users", tags=["Пользователи"], route_class=FastJSONRoute
+)
+tweets_router = APIRouter(
+    prefix="/api/tweets", tags=["Твиты"], route_class=FastJSONRoute
+)
+medias_router = APIRouter(prefix="/api/medias", tags=["Медиа"], route_class=UploadRoute)
+uploads_router = APIRouter(prefix=settings.MEDIA.MEDIA_URL.rstrip("/"), tags=["Медиа"])
 
 # Аннотации для ручек
-CurrentUser = Annotated[User, Depends(get_current_user)]
+CurrentUser = Annotated[AuthUserSchema, Depends(get_current_user)]
 IdUserAnnotated = Annotated[int, Path(..., description="ID Пользователя")]
 ServiceUserAnnotated = Annotated[UserService, Depends(get_user_service)]
 ServiceTweetAnnotated = Annotated[TweetService, Depends(get_tweet_service)]
+# Сервисы ручек чтения: запросы идут на реплики, если они настроены
+ReadServiceUserAnnotated = Annotated[UserService, Depends(get_read_user_service)]
+ReadServiceTweetAnnotated = Annotated[TweetService, Depends(get_read_tweet_service)]
 IdTweetAnnotated = Annotated[int, Path(..., description="ID Твита")]
 ServiceMediaAnnotated = Annotated[MediaService, Depends(get_media_service)]
 
 
 @start_router.get("/", summary="Загрузка статики")
-async def read_index():
-    return FileResponse("static/index.html")
+async def read_index(request: Request):
+    return await static_files.get_response("index.html", request.scope)
 
 
 @users_router.get("/me", summary="Получить по API")
 async def get_me(
     authenticated_user: CurrentUser,
+    user_service: ReadServiceUserAnnotated,
 ) -> UserResponseSchema:
     """Ручка получения пользователя по api-key
     вызывается при запросе фронта, заглушка"""
-    user_schema = UserSchemaOut.model_validate(authenticated_user, from_attributes=True)
-    return UserResponseSchema(result=True, user=user_schema)
+    return await user_service.get_user_profile(user_id=authenticated_user.id)
 
 
 @users_router.get("/{id_user}", summary="Получить по ID")
 async def get_user_by_id(
-    _: CurrentUser,
+    current_user: CurrentUser,
     id_user: IdUserAnnotated,
-    user_service: ServiceUserAnnotated,
+    user_service: ReadServiceUserAnnotated,
 ) -> UserResponseSchema:
     """Ручка получения пользователя по ID"""
 
     return await user_service.get_user_profile(
         user_id=id_user,
+        viewer=current_user,
     )
 
 
+@users_router.get("/{id_user}/followers", summary="Подписчики по ID")
+async def get_user_followers(
+    _: CurrentUser,
+    id_user: IdUserAnnotated,
+    user_service: ReadServiceUserAnnotated,
+    cursor: Annotated[
+        str | None, Query(description="Курсор следующей страницы")
+    ] = None,
+    limit: Annotated[int | None, Query(ge=1, description="Размер страницы")] = None,
+) -> FollowsResponseSchema:
+    """Ручка постраничного получения подписчиков пользователя,
+    следующая страница запрашивается по next_cursor"""
+
+    return await user_service.get_followers(user_id=id_user, cursor=cursor, limit=limit)
+
+
+@users_router.get("/{id_user}/following", summary="Подписки по ID")
+async def get_user_following(
+    _: CurrentUser,
+    id_user: IdUserAnnotated,
+    user_service: ReadServiceUserAnnotated,
+    cursor: Annotated[
+        str | None, Query(description="Курсор следующей страницы")
+    ] = None,
+    limit: Annotated[int | None, Query(ge=1, description="Размер страницы")] = None,
+) -> FollowsResponseSchema:
+    """Ручка постраничного получения подписок пользователя,
+    следующая страница запрашивается по next_cursor"""
+
+    return await user_service.get_following(user_id=id_user, cursor=cursor, limit=limit)
+
+
 @users_router.post("/{id_user}/follow", summary="Подписаться по ID")
 async def follow_user_by_id(
     current_user: CurrentUser,
@@ -97,6 +147,29 @@ async def unfollow_user_by_id(
     )
 
 
+@users_router.post("/follow:batch", summary="Подписаться на список ID")
+async def follow_users_batch(
+    current_user: CurrentUser,
+    batch: BatchIdsSchema,
+    user_service: ServiceUserAnnotated,
+) -> BatchSuccessSchema:
+    """Ручка пакетной подписки одной транзакцией, например при синхронизации
+    после офлайна. Уже оформленные подписки и несуществующие id пропускаются"""
+
+    return await user_service.follow_users(user_ids=batch.ids, user=current_user)
+
+
+@users_router.delete("/follow:batch", summary="Отписаться от списка ID")
+async def unfollow_users_batch(
+    current_user: CurrentUser,
+    batch: BatchIdsSchema,
+    user_service: ServiceUserAnnotated,
+) -> BatchSuccessSchema:
+    """Ручка пакетной отписки одной транзакцией"""
+
+    return await user_service.unfollow_users(user_ids=batch.ids, user=current_user)
+
+
 @tweets_router.post("", summary="Опубликовать твит")
 async def post_tweet(
     current_user: CurrentUser,
@@ -111,16 +184,114 @@ async def post_tweet(
     )
 
 
-@tweets_router.get("", summary="Получить твиты")
+@tweets_router.get("", summary="Получить твиты", response_model=TweetsResponseSchema)
 async def get_tweets(
     current_user: CurrentUser,
-    tweet_service: ServiceTweetAnnotated,
+    tweet_service: ReadServiceTweetAnnotated,
     all_tweets: bool = True,
-) -> TweetsResponseSchema | UserResponseSchema:
-    """Ручка получения всех твитов на кого подписан пользователь при all_tweets=False,
-    Ручка получения всех твитов при all_tweets=True"""
+    cursor: Annotated[
+        str | None, Query(description="Курсор следующей страницы")
+    ] = None,
+    limit: Annotated[int | None, Query(ge=1, description="Размер страницы")] = None,
+    with_likes: Annotated[
+        bool, Query(description="Включить список лайкнувших в ответ")
+    ] = True,
+    ids: Annotated[
+        list[int] | None,
+        Query(
+            max_length=settings.BATCH_MAX_SIZE,
+            description="Получить твиты по списку ID: ?ids=1&ids=2",
+        ),
+    ] = None,
+) -> Response | TweetsResponseSchema:
+    """Ручка получения твитов тех, на кого подписан пользователь при all_tweets=False,
+    Ручка получения всех твитов при all_tweets=True.
+    Постраничная выдача: следующая страница запрашивается по next_cursor.
+    Счётчик лайков отдаётся всегда, список лайкнувших - при with_likes=True.
+    Ответ сериализуется в сервисе и кэшируется.
+    При заданных ids - твиты по списку одним запросом, без пагинации"""
+
+    if ids:
+        return await tweet_service.get_tweets_by_ids(
+            tweet_ids=ids, with_likes=with_likes
+        )
+
+    return await tweet_service.get_tweets(
+        user=current_user,
+        all_tweets=all_tweets,
+        cursor=cursor,
+        limit=limit,
+        with_likes=with_likes,
+    )
+
+
+@tweets_router.get(
+    "/stream", summary="Поток событий ленты", response_class=StreamingResponse
+)
+async def stream_tweets(current_user: CurrentUser) -> StreamingResponse:
+    """Ручка живой ленты (Server-Sent Events): новые и удалённые твиты,
+    изменения числа лайков. Новые твиты клиент дочитывает через ?ids="""
+
+    logger.debug("Пользователь %s подписался на события ленты", current_user.id)
+    return StreamingResponse(
+        sse_stream(event_bus, settings.EVENTS.HEARTBEAT_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
-    return await tweet_service.get_tweets(user=current_user, all_tweets=all_tweets)
+# Пакетные ручки объявлены до /{id_tweet}, иначе путь совпадёт с ID твита
+@tweets_router.get(
+    "/search", summary="Поиск твитов", response_model=TweetsResponseSchema
+)
+async def search_tweets(
+    current_user: CurrentUser,
+    tweet_service: ReadServiceTweetAnnotated,
+    q: Annotated[
+        str,
+        Query(
+            min_length=1,
+            max_length=settings.FEED.SEARCH_QUERY_MAX_LENGTH,
+            description="Поисковый запрос",
+        ),
+    ],
+    cursor: Annotated[
+        str | None, Query(description="Курсор следующей страницы")
+    ] = None,
+    limit: Annotated[int | None, Query(ge=1, description="Размер страницы")] = None,
+    with_likes: Annotated[
+        bool, Query(description="Включить список лайкнувших в ответ")
+    ] = True,
+) -> TweetsResponseSchema:
+    """Ручка полнотекстового поиска по тексту твитов.
+    Порядок - по релевантности, усиленной числом лайков.
+    Постраничная выдача: следующая страница запрашивается по next_cursor"""
+
+    logger.debug("Пользователь %s ищет твиты", current_user.id)
+    return await tweet_service.search_tweets(
+        query=q, cursor=cursor, limit=limit, with_likes=with_likes
+    )
+
+
+@tweets_router.post("/likes:batch", summary="Лайкнуть список ID")
+async def like_tweets_batch(
+    current_user: CurrentUser,
+    batch: BatchIdsSchema,
+    tweet_service: ServiceTweetAnnotated,
+) -> BatchSuccessSchema:
+    """Ручка пакетной установки лайков одной транзакцией.
+    Уже лайкнутые и несуществующие твиты пропускаются"""
+    return await tweet_service.like_tweets(user=current_user, tweet_ids=batch.ids)
+
+
+@tweets_router.delete("/likes:batch", summary="Убрать лайки со списка ID")
+async def unlike_tweets_batch(
+    current_user: CurrentUser,
+    batch: BatchIdsSchema,
+    tweet_service: ServiceTweetAnnotated,
+) -> BatchSuccessSchema:
+    """Ручка пакетного снятия лайков одной транзакцией"""
+    return await tweet_service.unlike_tweets(user=current_user, tweet_ids=batch.ids)
 
 
 @tweets_router.delete("/{id_tweet}", summary="Удалить по ID")
@@ -170,3 +341,22 @@ async def upload_media(
 ):
     """Ручка загрузки медиа из твита"""
     return await media_service.upload_media(user=current_user, file=file)
+
+
+@uploads_router.head("/{file_path:path}", include_in_schema=False)
+@uploads_router.get(
+    "/{file_path:path}", summary="Получить медиа", response_class=FileResponse
+)
+async def get_media(
+    request: Request,
+    file_path: Annotated[str, Path(..., description="Путь к файлу медиа")],
+    size: Annotated[
+        Literal["small", "medium", "original"], Query(description="Размер копии")
+    ] = "original",
+) -> Response:
+    """Ручка отдачи медиа: уменьшенная копия по параметру size.
+    Поддерживает Range, If-None-Match/If-Modified-Since и X-Accel-Redirect.
+    Без api-key, как и раздача static/uploads раньше: фронт грузит картинки
+    тегом <img>, который не передаёт заголовки. Имя файла - хэш содержимого"""
+    media_file = await get_media_file(file_path, size)
+    return media_response(media_file, file_path, size, request.headers)
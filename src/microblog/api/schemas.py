@@ -1,7 +1,8 @@
 from datetime import UTC, datetime
-from typing import Any
+from functools import lru_cache
+from typing import Any, Self
 
-from pydantic import BaseModel, Field, computed_field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, computed_field, field_validator
 
 from microblog.config import settings
 from microblog.logger import get_logger
@@ -14,7 +15,17 @@ class UserAuthorSchema(BaseModel):
     name: str
 
 
+class AuthUserSchema(UserAuthorSchema):
+    """Аутентифицированный пользователь без связей, хранится в кэше авторизации"""
+
+    model_config = ConfigDict(frozen=True)
+
+
 class UserSchemaOut(UserAuthorSchema):
+    followers_count: int = 0
+    following_count: int = 0
+    # Первые подписчики и подписки, полные списки - постранично
+    # в /api/users/{id}/followers и /following
     followers: list[UserAuthorSchema] = []
     following: list[UserAuthorSchema] = []
 
@@ -24,6 +35,12 @@ class UserResponseSchema(BaseModel):
     user: UserSchemaOut | None
 
 
+class FollowsResponseSchema(BaseModel):
+    result: bool
+    users: list[UserAuthorSchema] | None
+    next_cursor: str | None = None
+
+
 class FollUnfollowSchema(BaseModel):
     result: bool
     message: str
@@ -34,6 +51,17 @@ class TweetSuccessSchema(BaseModel):
     message: str
 
 
+class BatchIdsSchema(BaseModel):
+    ids: list[int] = Field(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)
+
+
+class BatchSuccessSchema(BaseModel):
+    """Результат пакетной операции: id, для которых состояние изменилось"""
+
+    result: bool
+    ids: list[int]
+
+
 class UserLikeSchema(BaseModel):
     user_id: int = Field(..., alias="id", serialization_alias="user_id")
     name: str
@@ -44,6 +72,16 @@ class CreateTweetSchema(BaseModel):
     tweet_id: int | None
 
 
+@lru_cache(maxsize=4096)
+def utc_stamp(created_at: datetime) -> str:
+    """Время в UTC вида 2024-01-01T12:00:00Z. Твиты ленты запрашиваются
+    многократно, поэтому форматирование кешируется по значению времени"""
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(UTC).replace(tzinfo=None)
+
+    return created_at.isoformat(timespec="seconds") + "Z"
+
+
 class TweetShemaOut(BaseModel):
     id: int
     content: str
@@ -51,17 +89,13 @@ class TweetShemaOut(BaseModel):
     author: UserAuthorSchema
     attachments: list[str] = []
     likes: list[UserLikeSchema] = []
+    like_count: int = 0
 
     @computed_field  # type: ignore[prop-decorator]
     @property
     def stamp(self) -> str:
         """Принудительная конвертация времени в UTC для фронта"""
-        if self.created_at.tzinfo is None:
-            utc_time = self.created_at.replace(tzinfo=UTC)
-        else:
-            utc_time = self.created_at.astimezone(UTC)
-
-        return utc_time.strftime("%Y-%m-%dT%H:%M:%SZ")
+        return utc_stamp(self.created_at)
 
     @field_validator("attachments", mode="before")
     @classmethod
@@ -86,6 +120,14 @@ class TweetShemaOut(BaseModel):
 class TweetsResponseSchema(BaseModel):
     result: bool
     tweets: list[TweetShemaOut] | None
+    next_cursor: str | None = None
+
+    @classmethod
+    def from_rows(cls, tweets: list[dict], next_cursor: str | None = None) -> Self:
+        """Страница из словарей проекции ленты, каждый проверяется по TweetShemaOut"""
+        return cls.model_validate(
+            {"result": True, "tweets": tweets, "next_cursor": next_cursor}
+        )
 
 
 class MediaResponseSchema(BaseModel):
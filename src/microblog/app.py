@@ -1,15 +1,22 @@
 from fastapi import FastAPI
-from starlette.staticfiles import StaticFiles
 
 from microblog.api.routes import (
     medias_router,
     start_router,
     tweets_router,
+    uploads_router,
     users_router,
 )
 from microblog.config import settings
+from microblog.core.database import PrimaryStickinessMiddleware
+from microblog.core.http_metrics import MetricsMiddleware, metrics_app
+from microblog.core.jobs import JobsMiddleware
 from microblog.core.lifespan import lifespan
+from microblog.core.query_stats import QueryStatsMiddleware
+from microblog.core.responses import FastJSONResponse
+from microblog.core.static import static_files
 from microblog.logger import get_logger
+from microblog.services.jobs import job_runner
 
 logger = get_logger(__name__)
 
@@ -24,6 +31,7 @@ def create_app() -> FastAPI:
             "email": settings.CONTACT_EMAIL,
         },
         lifespan=lifespan,
+        default_response_class=FastJSONResponse,
     )
     logger.debug(f"Создание экземпляра приложения: {settings.PROJECT_NAME}")
 
@@ -32,13 +40,29 @@ def create_app() -> FastAPI:
         ("users_router", users_router),
         ("tweets_router", tweets_router),
         ("medias_router", medias_router),
+        ("uploads_router", uploads_router),
     ]
 
     for name, router in routers:
         app.include_router(router)
         logger.debug(f"Подключен роутер: {name}")
 
-    app.mount("/", StaticFiles(directory="static"))
+    app.add_middleware(PrimaryStickinessMiddleware)
+    logger.debug("Подключено окно чтения из primary после записи")
+
+    app.add_middleware(QueryStatsMiddleware)
+    logger.debug("Подключен учёт SQL-запросов")
+
+    # Последний добавленный middleware - внешний: время запроса включает учёт SQL
+    app.add_middleware(MetricsMiddleware)
+    app.mount("/metrics", metrics_app())
+    logger.debug("Подключены метрики Prometheus")
+
+    # Задачи режима memory выполняются после ответа и не входят в его метрики
+    app.add_middleware(JobsMiddleware, runner=job_runner)
+    logger.debug("Подключена очередь задач: %s", settings.JOBS.BACKEND)
+
+    app.mount("/", static_files)
     logger.debug("Подключены статические файлы")
 
     logger.info(f"Приложение {settings.PROJECT_NAME} успешно создано")
@@ -0,0 +1,94 @@
+"""Массовый импорт твитов из JSON Lines для миграций и нагрузочных тестов.
+
+Запуск:
+    python -m microblog.bulk_import tweets.jsonl --batch 5000 --fan-out
+    cat tweets.jsonl | python -m microblog.bulk_import -
+
+Одна строка - один твит:
+    {"author_id": 1, "content": "...", "created_at": "2024-01-01T12:00:00"}
+created_at и like_count необязательны.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from itertools import islice
+from typing import TextIO
+
+from microblog.core.cache import feed_cache
+from microblog.core.database import AsyncSessionLocal, dispose_engines
+from microblog.logger import get_logger
+from microblog.repositories.repository import TweetRepository
+
+logger = get_logger(__name__)
+
+
+def parse_tweet(line: str) -> dict:
+    """Строка JSON Lines в словарь для TweetRepository.bulk_create_tweets"""
+    tweet: dict = json.loads(line)
+    if tweet.get("created_at"):
+        tweet["created_at"] = datetime.fromisoformat(tweet["created_at"])
+
+    return tweet
+
+
+def read_batches(lines: Iterable[str], size: int) -> Iterator[list[dict]]:
+    """Пачки по size твитов, пустые строки пропускаются"""
+    tweets = (parse_tweet(line) for line in lines if line.strip())
+    while batch := list(islice(tweets, size)):
+        yield batch
+
+
+async def import_tweets(source: TextIO, batch_size: int, fan_out: bool) -> int:
+    """Импорт пачками: каждая пачка - одна транзакция с COPY/executemany"""
+    async with AsyncSessionLocal() as session:
+        repository = TweetRepository(session)
+        last_id = await repository.get_last_tweet_id()
+
+        imported = 0
+        for batch in read_batches(source, batch_size):
+            imported += await repository.bulk_create_tweets(batch)
+            logger.info("Импортировано твитов: %s", imported)
+
+        if fan_out and imported:
+            await repository.fan_out_imported(after_id=last_id)
+            logger.info("Импортированные твиты разложены по лентам")
+
+    # Импорт - отдельный процесс: сброс расходится по воркерам через NOTIFY
+    await feed_cache.start()
+    try:
+        await feed_cache.invalidate()
+    finally:
+        await feed_cache.close()
+    return imported
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="Файл JSON Lines или - для stdin")
+    parser.add_argument("--batch", type=int, default=5000, help="Твитов в пачке")
+    parser.add_argument(
+        "--fan-out",
+        action="store_true",
+        help="Разложить импортированные твиты по домашним лентам подписчиков",
+    )
+    args = parser.parse_args()
+
+    async def run() -> int:
+        try:
+            if args.source == "-":
+                return await import_tweets(sys.stdin, args.batch, args.fan_out)
+            with open(args.source, encoding="utf-8") as source:
+                return await import_tweets(source, args.batch, args.fan_out)
+        finally:
+            await dispose_engines()
+
+    imported = asyncio.run(run())
+    print(f"Импортировано твитов: {imported}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import os
 from pathlib import Path
-from typing import ClassVar
+from typing import ClassVar, Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -12,12 +12,57 @@ class DatabaseSettings(BaseSettings):
     USER: str = "postgres"
     PASSWORD: str = "password"
     DB: str = "microblog_dev"
+    # Пул соединений на один воркер: всего до
+    # UVICORN.uvicorn_workers * (POOL_SIZE + MAX_OVERFLOW) соединений,
+    # сумма должна укладываться в max_connections PostgreSQL
+    POOL_SIZE: int = 5
+    MAX_OVERFLOW: int = 5
+    POOL_TIMEOUT: float = 10.0
+    POOL_PRE_PING: bool = True
+    POOL_RECYCLE: int = 1800
+    POOL_WARMUP: bool = True
+    # Кэш подготовленных выражений asyncpg, 0 - для pgbouncer в режиме transaction
+    STATEMENT_CACHE_SIZE: int = 100
+    CONNECT_TIMEOUT: float = 5.0
+    # Реплики для чтения: хосты через запятую, с теми же USER/PASSWORD/DB
+    REPLICA_SERVERS: str = ""
+    # Сколько секунд после записи чтения пользователя идут в primary
+    STICKY_PRIMARY_SECONDS: float = 5.0
+    # Предупреждения в лог: медленный SQL и один запрос, повторённый
+    # в рамках HTTP-запроса столько раз (признак N+1)
+    SLOW_QUERY_SECONDS: float = 0.5
+    REPEATED_QUERY_WARNING: int = 10
 
     @property
     def DATABASE_URL(self) -> str:
-        return (
-            f"postgresql+asyncpg://{self.USER}:{self.PASSWORD}@{self.SERVER}/{self.DB}"
-        )
+        return self._url(self.SERVER)
+
+    @property
+    def replica_urls(self) -> list[str]:
+        return [
+            self._url(server.strip())
+            for server in self.REPLICA_SERVERS.split(",")
+            if server.strip()
+        ]
+
+    def _url(self, server: str) -> str:
+        return f"postgresql+asyncpg://{self.USER}:{self.PASSWORD}@{server}/{self.DB}"
+
+    @property
+    def engine_options(self) -> dict:
+        """Параметры create_async_engine для пула соединений"""
+        return {
+            "pool_size": self.POOL_SIZE,
+            "max_overflow": self.MAX_OVERFLOW,
+            "pool_timeout": self.POOL_TIMEOUT,
+            "pool_pre_ping": self.POOL_PRE_PING,
+            "pool_recycle": self.POOL_RECYCLE,
+            "connect_args": {
+                "timeout": self.CONNECT_TIMEOUT,
+                "statement_cache_size": self.STATEMENT_CACHE_SIZE,
+                "prepared_statement_cache_size": self.STATEMENT_CACHE_SIZE,
+            },
+        }
 
 
 class UvicornSettings(BaseSettings):
@@ -45,8 +90,19 @@ class MediaSettings(BaseSettings):
     BASE_DIR: ClassVar[Path] = Path(__file__).resolve().parent.parent.parent
     UPLOAD_FOLDER: str = "static/uploads"
     MAX_FILE_SIZE: int = 16 * 1024 * 1024
+    CHUNK_SIZE: int = 64 * 1024
     ALLOWED_EXTENSIONS: str = "jpg,jpeg,png,gif,bmp,webp"
     MEDIA_URL: str = "/uploads/"
+    # Уменьшенные копии изображений: граница по большей стороне, px
+    SMALL_SIZE: int = 320
+    MEDIUM_SIZE: int = 1024
+    VARIANT_QUALITY: int = 80
+    VARIANT_WORKERS: int = 2
+    # Кэш браузера для медиа: путь блоба - хэш содержимого, файл не меняется
+    CACHE_MAX_AGE: int = 365 * 24 * 60 * 60
+    # Отдача файлов прокси: "/protected-uploads/" -> X-Accel-Redirect
+    # на internal location nginx с alias на папку загрузок. Пусто - отдаёт Python
+    ACCEL_REDIRECT_PREFIX: str = ""
 
     @property
     def upload_dir(self) -> Path:
@@ -57,6 +113,97 @@ class MediaSettings(BaseSettings):
     def allowed_extensions(self) -> list:
         return self.ALLOWED_EXTENSIONS.split(",")
 
+    @property
+    def variant_sizes(self) -> dict[str, int]:
+        return {"small": self.SMALL_SIZE, "medium": self.MEDIUM_SIZE}
+
+
+class StaticSettings(BaseSettings):
+    """Настройки отдачи статики фронтенда"""
+
+    BASE_DIR: ClassVar[Path] = Path(__file__).resolve().parent.parent.parent
+    FOLDER: str = "static"
+    # Сжатые копии .gz/.br создаются при сборке образа или при старте,
+    # файлы меньше COMPRESS_MIN_SIZE не сжимаются
+    PRECOMPRESS: bool = True
+    COMPRESS_MIN_SIZE: int = 1024
+    # Файлы с хэшем содержимого в имени (app.ee2cdef2.js) кэшируются навсегда
+    IMMUTABLE_MAX_AGE: int = 365 * 24 * 60 * 60
+
+    @property
+    def static_dir(self) -> Path:
+        """Абсолютный путь к папке статики"""
+        return self.BASE_DIR / self.FOLDER
+
+
+class AuthSettings(BaseSettings):
+    """Настройки кэша аутентификации по API-Key"""
+
+    CACHE_TTL: float = 60.0
+    CACHE_NEGATIVE_TTL: float = 5.0
+    CACHE_MAX_SIZE: int = 10_000
+
+
+class UserSettings(BaseSettings):
+    """Настройки профилей и списков подписок"""
+
+    # Сколько подписчиков и подписок отдаётся в самом профиле
+    PROFILE_PREVIEW_LIMIT: int = 100
+    FOLLOWS_DEFAULT_LIMIT: int = 50
+    FOLLOWS_MAX_LIMIT: int = 200
+
+
+class FeedSettings(BaseSettings):
+    """Настройки ленты твитов"""
+
+    DEFAULT_LIMIT: int = 50
+    MAX_LIMIT: int = 100
+    # Авторы с большим числом подписчиков не раскладываются по лентам при записи,
+    # их твиты подмешиваются в домашнюю ленту при чтении
+    FANOUT_FOLLOWERS_THRESHOLD: int = 10_000
+    # Сколько последних твитов автора добавить в ленту при подписке
+    HOME_TIMELINE_BACKFILL: int = 50
+    # Максимальная длина поискового запроса
+    SEARCH_QUERY_MAX_LENGTH: int = 200
+    # Кэш готовых JSON-ответов ленты, CACHE_TTL=0 отключает кэш
+    CACHE_BACKEND: Literal["memory", "redis"] = "memory"
+    CACHE_REDIS_URL: str | None = None
+    CACHE_TTL: float = 30.0
+    CACHE_MAX_SIZE: int = 1000
+    CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    # Канал NOTIFY увеличения версии in-process кэша при EVENTS__BACKEND=postgres
+    CACHE_CHANNEL: str = "microblog_feed_cache"
+
+
+class EventSettings(BaseSettings):
+    """Настройки потока событий ленты (SSE)"""
+
+    # memory - события видят подписчики своего воркера,
+    # postgres - LISTEN/NOTIFY доставляет их во все воркеры
+    BACKEND: Literal["memory", "postgres"] = "memory"
+    CHANNEL: str = "microblog_events"
+    # Событий в очереди подписчика, при переполнении он отключается
+    QUEUE_SIZE: int = 256
+    HEARTBEAT_SECONDS: float = 15.0
+    # Пауза перед переподключением EventSource, мс
+    RETRY_MS: int = 3000
+
+
+class JobSettings(BaseSettings):
+    """Настройки очереди фоновых задач"""
+
+    # memory - задачи выполняются тем же процессом после отправки ответа,
+    # database - таблица jobs, задачи выполняет python -m microblog.worker
+    BACKEND: Literal["memory", "database"] = "memory"
+    POLL_INTERVAL: float = 1.0
+    BATCH_SIZE: int = 10
+    MAX_ATTEMPTS: int = 5
+    # Пауза перед повтором: BACKOFF_SECONDS * 2 ** (попытка - 1), не больше MAX
+    BACKOFF_SECONDS: float = 2.0
+    BACKOFF_MAX_SECONDS: float = 300.0
+    # Через сколько задача, взятая упавшим воркером, выполняется снова
+    LEASE_SECONDS: float = 300.0
+
 
 class AppSettings(BaseSettings):
     """Класс с общими настройками"""
@@ -67,10 +214,18 @@ class AppSettings(BaseSettings):
     VERSION: str = "1.0.0"
     CONTACT_NAME: str = "Скорик Евгений"
     CONTACT_EMAIL: str = "3653444@bk.ru"
+    # Сколько id принимают пакетные ручки (likes:batch, follow:batch, ?ids=)
+    BATCH_MAX_SIZE: int = 500
 
     POSTGRES: DatabaseSettings = DatabaseSettings()
     UVICORN: UvicornSettings = UvicornSettings()
     MEDIA: MediaSettings = MediaSettings()
+    STATIC: StaticSettings = StaticSettings()
+    FEED: FeedSettings = FeedSettings()
+    USERS: UserSettings = UserSettings()
+    AUTH: AuthSettings = AuthSettings()
+    EVENTS: EventSettings = EventSettings()
+    JOBS: JobSettings = JobSettings()
 
     model_config = SettingsConfigDict(
         env_file=".env.dev",
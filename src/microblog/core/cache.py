@@ -0,0 +1,292 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Callable
+
+from microblog.config import settings
+from microblog.core.events import PostgresEventBridge, listen_dsn
+from microblog.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class CacheBackend(ABC):
+    """Хранилище кэша ответов: байты по строковому ключу и счётчики версий"""
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes | None:
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        pass
+
+    @abstractmethod
+    async def get_counter(self, key: str) -> int:
+        pass
+
+    @abstractmethod
+    async def incr(self, key: str) -> int:
+        pass
+
+    @abstractmethod
+    async def clear(self) -> None:
+        pass
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """In-process LRU с ограничением по числу записей и суммарному размеру.
+    Счётчики версий хранятся отдельно и не вытесняются. И записи, и версии
+    у каждого процесса свои: при нескольких процессах версии согласует
+    FeedCache.start"""
+
+    def __init__(
+        self,
+        max_size: int,
+        max_bytes: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._max_size = max_size
+        self._max_bytes = max_bytes
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._counters: dict[str, int] = {}
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            self._pop(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        if ttl <= 0 or len(value) > self._max_bytes:
+            return
+
+        self._pop(key)
+        self._entries[key] = (self._clock() + ttl, value)
+        self._bytes += len(value)
+        while len(self._entries) > self._max_size or self._bytes > self._max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    async def get_counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+    async def incr(self, key: str) -> int:
+        return self.bump(key)
+
+    def bump(self, key: str) -> int:
+        """Синхронное увеличение счётчика, для колбэков вне корутин"""
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+
+    async def clear(self) -> None:
+        self._entries.clear()
+        self._counters.clear()
+        self._bytes = 0
+
+    def _pop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+
+class RedisCacheBackend(CacheBackend):
+    """Хранилище в Redis (или совместимом по протоколу сервере):
+    кэш и версии общие для всех процессов и инстансов.
+    Объём памяти ограничивается политикой maxmemory самого сервера"""
+
+    def __init__(self, url: str, prefix: str = "microblog:") -> None:
+        try:
+            from redis import asyncio as aioredis
+        except ImportError as exc:
+            raise RuntimeError(
+                "Для FEED__CACHE_BACKEND=redis необходим пакет redis"
+            ) from exc
+
+        self._client = aioredis.from_url(url)
+        self._prefix = prefix
+
+    async def get(self, key: str) -> bytes | None:
+        value: bytes | None = await self._client.get(self._prefix + key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        await self._client.set(self._prefix + key, value, px=int(ttl * 1000))
+
+    async def get_counter(self, key: str) -> int:
+        value = await self._client.get(self._prefix + key)
+        return int(value) if value is not None else 0
+
+    async def incr(self, key: str) -> int:
+        version: int = await self._client.incr(self._prefix + key)
+        return version
+
+    async def clear(self) -> None:
+        async for key in self._client.scan_iter(match=f"{self._prefix}*"):
+            await self._client.delete(key)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class FeedCache:
+    """Кэш готовых JSON-ответов ленты по (вид ленты, пользователь, страница).
+    Ключ содержит версии ленты: запись увеличивает версии затронутых лент,
+    и старые ответы больше не читаются, вытесняясь по LRU/TTL.
+    Версии раздельные: общей ленты, всех домашних лент и домашней ленты
+    каждого пользователя. Твит и его удаление сбрасывают все ленты, лайк -
+    общую ленту и домашнюю ленту лайкнувшего, подписка - только домашнюю
+    ленту подписчика. Число лайков в чужих домашних лентах отстаёт не дольше
+    CACHE_TTL, живая лента присылает его событием like.
+    Версии читаются до запроса к БД, поэтому ответ, собранный во время записи,
+    сохраняется под устаревшей версией и не будет отдан"""
+
+    GLOBAL_VERSION_KEY = "feed:version:all"
+    HOMES_VERSION_KEY = "feed:version:home"
+    # Число областей, для которых помнится момент смены версии (settled)
+    MAX_TRACKED_SCOPES = 10_000
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.backend = backend
+        self._ttl = ttl
+        self._clock = clock
+        self.bridge: PostgresEventBridge | None = None
+        self._seen_at: dict[str, float] = {}
+
+    @staticmethod
+    def home_version_key(user_id: int) -> str:
+        return f"feed:version:home:{user_id}"
+
+    async def start(self) -> None:
+        """Согласование версий между процессами. В Redis версии общие сами по
+        себе. In-process хранилище при EVENTS__BACKEND=postgres рассылает
+        увеличение версии через NOTIFY, и каждый процесс увеличивает свою.
+        Без этого запись в одном процессе не сбрасывает кэш других, поэтому
+        in-process кэш не запускается при UVICORN__WORKERS > 1 и при
+        JOBS__BACKEND=database: раскладка твитов по лентам идёт в воркере"""
+        if not isinstance(self.backend, InMemoryCacheBackend) or self._ttl <= 0:
+            return
+        if settings.EVENTS.BACKEND == "postgres":
+            self.bridge = PostgresEventBridge(
+                listen_dsn(), settings.FEED.CACHE_CHANNEL, self._on_remote_invalidate
+            )
+            await self.bridge.start()
+            return
+        if settings.UVICORN.WORKERS > 1 or settings.JOBS.BACKEND == "database":
+            raise RuntimeError(
+                "In-process кэш ленты не сбрасывается в других процессах: "
+                "задайте FEED__CACHE_BACKEND=redis, EVENTS__BACKEND=postgres "
+                "или FEED__CACHE_TTL=0"
+            )
+
+    async def close(self) -> None:
+        if self.bridge is not None:
+            await self.bridge.close()
+            self.bridge = None
+
+    async def make_key(
+        self,
+        all_tweets: bool,
+        user_id: int,
+        cursor: str | None,
+        limit: int,
+        with_likes: bool,
+    ) -> str:
+        """Ключ страницы ленты для текущих версий.
+        Общая лента одинакова для всех, поэтому пользователь в ключ не входит"""
+        if all_tweets:
+            version = await self.backend.get_counter(self.GLOBAL_VERSION_KEY)
+            scope = f"feed:v{version}:all"
+        else:
+            homes = await self.backend.get_counter(self.HOMES_VERSION_KEY)
+            own = await self.backend.get_counter(self.home_version_key(user_id))
+            scope = f"feed:v{homes}.{own}:home-{user_id}"
+        if scope not in self._seen_at:
+            if len(self._seen_at) >= self.MAX_TRACKED_SCOPES:
+                self._seen_at.clear()
+            self._seen_at[scope] = self._clock()
+        return f"{scope}:{cursor or ''}:{limit}:{int(with_likes)}"
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.backend.get(key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        await self.backend.set(key, value, self._ttl)
+
+    def settled(self, key: str, seconds: float) -> bool:
+        """Версии ключа, выданного make_key, не менялись последние seconds
+        секунд. Время считается с момента, когда процесс увидел версии, -
+        не раньше самого изменения"""
+        # Область ключа - до третьего двоеточия: feed:v<версии>:<лента>
+        seen_at = self._seen_at.get(":".join(key.split(":", 3)[:3]))
+        return seen_at is not None and self._clock() - seen_at >= seconds
+
+    async def invalidate(self) -> None:
+        """Сброс всех лент: общей и домашних лент всех пользователей"""
+        await self._bump(self.GLOBAL_VERSION_KEY, self.HOMES_VERSION_KEY)
+
+    async def invalidate_global(self) -> None:
+        """Сброс общей ленты"""
+        await self._bump(self.GLOBAL_VERSION_KEY)
+
+    async def invalidate_home(self, *user_ids: int) -> None:
+        """Сброс домашних лент пользователей"""
+        await self._bump(*(self.home_version_key(user_id) for user_id in user_ids))
+
+    async def _bump(self, *keys: str) -> None:
+        """Увеличение версий. Свой процесс видит новые версии сразу,
+        остальные - по NOTIFY"""
+        for key in keys:
+            version = await self.backend.incr(key)
+            logger.debug("Версия кэша %s увеличена до %s", key, version)
+        if self.bridge is None:
+            return
+        try:
+            for key in keys:
+                await self.bridge.publish(key)
+        except Exception:
+            # Другие процессы отдадут устаревшие ленты не дольше CACHE_TTL
+            logger.exception("Не удалось разослать сброс кэша ленты")
+
+    def _on_remote_invalidate(self, payload: str) -> None:
+        # Своё уведомление тоже приходит: лишний сброс только стоит промаха
+        if isinstance(self.backend, InMemoryCacheBackend):
+            self.backend.bump(payload)
+
+
+def create_backend() -> CacheBackend:
+    """Хранилище кэша по настройкам FEED"""
+    if settings.FEED.CACHE_BACKEND == "redis":
+        if not settings.FEED.CACHE_REDIS_URL:
+            raise RuntimeError("Не задан FEED__CACHE_REDIS_URL")
+        return RedisCacheBackend(settings.FEED.CACHE_REDIS_URL)
+
+    return InMemoryCacheBackend(
+        max_size=settings.FEED.CACHE_MAX_SIZE, max_bytes=settings.FEED.CACHE_MAX_BYTES
+    )
+
+
+feed_cache = FeedCache(backend=create_backend(), ttl=settings.FEED.CACHE_TTL)
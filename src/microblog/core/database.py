@@ -1,21 +1,244 @@
+import asyncio
+import math
+import random
+import time
 from collections.abc import AsyncGenerator
+from contextvars import ContextVar
+from typing import Any
 
+from fastapi import Request
+from sqlalchemy import Select, event, exc, text
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from microblog.config import settings
+from microblog.core.metrics import (
+    DB_POOL_CHECKOUT_SECONDS,
+    DB_POOL_CHECKOUT_TIMEOUTS,
+    DB_POOL_CONNECTIONS,
+    DB_POOL_SATURATION,
+)
 from microblog.db.base import Base
 from microblog.logger import get_logger
 
 logger = get_logger(__name__)
 
-AsyncEngine = create_async_engine(settings.POSTGRES.DATABASE_URL, echo=False)
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Пул соединений, публикующий время ожидания соединения и загрузку пула.
+    Метки метрик - по pool_logging_name движка (primary, replica-1, ...)"""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # create_async_engine передаёт pool_logging_name как logging_name,
+        # пересоздание пула после dispose - тоже
+        self.label: str = kwargs.get("logging_name") or "primary"
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            DB_POOL_CHECKOUT_TIMEOUTS.labels(pool=self.label).inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.labels(pool=self.label).observe(
+                time.perf_counter() - started
+            )
+        self.report()
+        return connection
+
+    def _do_return_conn(self, record) -> None:
+        super()._do_return_conn(record)
+        self.report()
+
+    def report(self) -> None:
+        """Обновление метрик состояния пула"""
+        checked_out = self.checkedout()
+        connections = DB_POOL_CONNECTIONS
+        connections.labels(pool=self.label, state="checked_out").set(checked_out)
+        connections.labels(pool=self.label, state="idle").set(self.checkedin())
+        connections.labels(pool=self.label, state="overflow").set(
+            max(self.overflow(), 0)
+        )
+        capacity = self.size() + max(self._max_overflow, 0)
+        DB_POOL_SATURATION.labels(pool=self.label).set(
+            checked_out / capacity if capacity else 0
+        )
+
+
+def _create_engine(url: str, name: str):
+    """Движок PostgreSQL с инструментированным пулом по настройкам POSTGRES"""
+    return create_async_engine(
+        url,
+        echo=False,
+        poolclass=InstrumentedPool,
+        pool_logging_name=name,
+        **settings.POSTGRES.engine_options,
+    )
+
+
+AsyncEngine = _create_engine(settings.POSTGRES.DATABASE_URL, "primary")
+ReplicaEngines = [
+    _create_engine(url, f"replica-{number}")
+    for number, url in enumerate(settings.POSTGRES.replica_urls, start=1)
+]
+
+# Ключи Session.info, по которым RoutingSession выбирает движок
+USE_PRIMARY = "use_primary"
+HAS_WRITES = "has_writes"
+REPLICA = "replica"
+
+# Cookie окна чтения из primary: до какого времени (unix) читать из primary
+STICKY_COOKIE = "microblog_primary_until"
+
+# Окна чтения из primary по API-Key для клиентов без cookie (API, нагрузочный
+# драйвер). Хранятся в памяти процесса: видны только воркеру, принявшему запись
+_primary_until: dict[str, float] = {}
+_PRIMARY_UNTIL_MAX_KEYS = 10_000
+
+# Состояние текущего HTTP-запроса: был ли коммит с записью
+_request_writes: ContextVar[dict[str, bool] | None] = ContextVar(
+    "request_writes", default=None
+)
+
+
+class RoutingSession(Session):
+    """Сессия с выбором движка на каждый запрос: чтения уходят на реплику,
+    запись и всё, что выполняется в сессии после неё, - на primary.
+    Реплика выбирается случайно один раз на сессию: все чтения запроса
+    видят один снимок, а не разные отставания разных реплик.
+    Сессии с info[USE_PRIMARY] и сессии без настроенных реплик работают с primary.
+    Flush отмечает запись в before_flush, до выбора движка для своих выражений"""
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if (
+            not ReplicaEngines
+            or self.info.get(USE_PRIMARY)
+            or self.info.get(HAS_WRITES)
+            or not isinstance(clause, Select)
+        ):
+            return AsyncEngine.sync_engine
+        replica = self.info.get(REPLICA)
+        if replica is None:
+            replica = self.info[REPLICA] = random.choice(ReplicaEngines)
+        return replica.sync_engine
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _mark_orm_write(orm_execute_state) -> None:
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info[HAS_WRITES] = True
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def _mark_flush_write(session, flush_context, instances) -> None:
+    session.info[HAS_WRITES] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _mark_request_write(session) -> None:
+    writes = _request_writes.get()
+    if writes is not None and session.info.get(HAS_WRITES):
+        writes["committed"] = True
+
+
+class PrimaryStickinessMiddleware:
+    """Окно после записи, в течение которого чтения пользователя идут в primary:
+    реплика может ещё не получить его изменения (read-your-writes).
+    Ответ на запрос с записью ставит cookie со сроком окна, клиент возвращает
+    её с каждым запросом - окно видят все воркеры и инстансы.
+    Для клиентов, не хранящих cookie, окно запоминается и по API-Key, но только
+    в воркере, принявшем запись: чтение в другом воркере может уйти на реплику"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.window = settings.POSTGRES.STICKY_PRIMARY_SECONDS
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.window <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        writes = {"committed": False}
+        token = _request_writes.set(writes)
+
+        async def send_with_cookie(message: Message) -> None:
+            if message["type"] == "http.response.start" and writes["committed"]:
+                self.remember(Headers(scope=scope).get("api-key"))
+                headers = list(message.get("headers", []))
+                headers.append((b"set-cookie", self.cookie().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            _request_writes.reset(token)
+
+    def remember(self, api_key: str | None) -> None:
+        """Окно чтения из primary для ключа в памяти процесса"""
+        if not api_key:
+            return
+        now = time.time()
+        if len(_primary_until) >= _PRIMARY_UNTIL_MAX_KEYS:
+            for key, until in list(_primary_until.items()):
+                if until <= now:
+                    del _primary_until[key]
+        _primary_until[api_key] = now + self.window
+
+    def cookie(self) -> str:
+        until = math.ceil(time.time() + self.window)
+        max_age = math.ceil(self.window)
+        return (
+            f"{STICKY_COOKIE}={until}; Max-Age={max_age}; Path=/; "
+            "HttpOnly; SameSite=Lax"
+        )
+
+
+def sticks_to_primary(request: Request) -> bool:
+    """Открыто ли окно чтения из primary по cookie запроса или по записи
+    с тем же API-Key в этом процессе. Срок в cookie дальше
+    STICKY_PRIMARY_SECONDS не принимается"""
+    api_key = request.headers.get("api-key")
+    if api_key and _primary_until.get(api_key, 0) > time.time():
+        return True
+    value = request.cookies.get(STICKY_COOKIE)
+    if value is None:
+        return False
+    try:
+        remaining = float(value) - time.time()
+    except ValueError:
+        return False
+    # Срок в cookie округлён вверх до секунды
+    return 0 < remaining <= settings.POSTGRES.STICKY_PRIMARY_SECONDS + 1
+
+
+def reads_from_replica(session: AsyncSession) -> bool:
+    """Чтения сессии могут уйти на реплику"""
+    return bool(ReplicaEngines) and not session.info.get(USE_PRIMARY)
+
+
 AsyncSessionLocal = async_sessionmaker(
-    bind=AsyncEngine, expire_on_commit=False, class_=AsyncSession
+    bind=AsyncEngine,
+    expire_on_commit=False,
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    info={USE_PRIMARY: True},
+)
+ReadSessionLocal = async_sessionmaker(
+    expire_on_commit=False,
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
 )
 
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
-    """Генерирует асинхронную сессию для каждого запроса."""
+    """Генерирует асинхронную сессию к primary для каждого запроса:
+    запись и чтение собственных изменений."""
     async with AsyncSessionLocal() as session:
         try:
             yield session
@@ -23,6 +246,18 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """Генерирует сессию для ручек чтения: запросы идут на реплики,
+    кроме окна после записи этого же пользователя."""
+    factory = AsyncSessionLocal if sticks_to_primary(request) else ReadSessionLocal
+
+    async with factory() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
 async def create_tables():
     async with AsyncEngine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
@@ -33,3 +268,35 @@ async def delete_tables():
     async with AsyncEngine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
         logger.info("Удаление таблиц из БД")
+
+
+async def warm_up_pool() -> None:
+    """Открытие POOL_SIZE соединений к primary и каждой реплике при старте,
+    чтобы первые запросы не платили за установку соединения"""
+    if not settings.POSTGRES.POOL_WARMUP:
+        return
+
+    async def ping(engine) -> None:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    for engine in (AsyncEngine, *ReplicaEngines):
+        try:
+            # Соединения берутся одновременно, иначе пул отдаст одно и то же
+            await asyncio.gather(
+                *(ping(engine) for _ in range(settings.POSTGRES.POOL_SIZE))
+            )
+        except (OSError, exc.SQLAlchemyError) as error:
+            logger.warning("Не удалось прогреть пул %s: %s", engine.pool.label, error)
+            continue
+        logger.info(
+            "Пул %s прогрет: %s соединений",
+            engine.pool.label,
+            settings.POSTGRES.POOL_SIZE,
+        )
+
+
+async def dispose_engines() -> None:
+    """Закрытие соединений всех пулов"""
+    for engine in (AsyncEngine, *ReplicaEngines):
+        await engine.dispose()
@@ -0,0 +1,202 @@
+import asyncio
+import json
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any
+
+import asyncpg
+from sqlalchemy.engine import make_url
+
+from microblog.config import settings
+from microblog.core.metrics import EVENT_SUBSCRIBERS
+from microblog.logger import get_logger
+
+logger = get_logger(__name__)
+
+TWEET_CREATED = "tweet_created"
+TWEET_DELETED = "tweet_deleted"
+LIKE = "like"
+
+
+@dataclass(frozen=True)
+class FeedEvent:
+    """Изменение ленты: новый или удалённый твит, delta - изменение числа лайков"""
+
+    type: str
+    tweet_id: int
+    author_id: int | None = None
+    delta: int | None = None
+
+    def to_json(self) -> str:
+        data = {key: value for key, value in asdict(self).items() if value is not None}
+        return json.dumps(data, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, payload: str) -> "FeedEvent":
+        return cls(**json.loads(payload))
+
+
+class Subscription:
+    """Очередь событий одного подписчика. Медленный подписчик, переполнивший
+    очередь, отключается: вместо событий получает None и переподключается,
+    перечитав ленту, - публикация не ждёт читателей"""
+
+    def __init__(self, queue_size: int) -> None:
+        self.queue: asyncio.Queue[FeedEvent | None] = asyncio.Queue(queue_size)
+        self.closed = False
+
+    def offer(self, event: FeedEvent) -> None:
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.close()
+            logger.warning("Подписчик событий не успевает читать и отключён")
+
+    def close(self) -> None:
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+def listen_dsn() -> str:
+    """DSN основной БД для отдельного соединения asyncpg"""
+    dsn = make_url(settings.POSTGRES.DATABASE_URL).set(drivername="postgresql")
+    return dsn.render_as_string(hide_password=False)
+
+
+class PostgresEventBridge:
+    """Доставка сообщений канала всем воркерам через LISTEN/NOTIFY PostgreSQL.
+    Отдельное соединение asyncpg вне пула: слушает канал и публикует в него,
+    при обрыве переподключается"""
+
+    RECONNECT_SECONDS = 1.0
+
+    def __init__(self, dsn: str, channel: str, deliver: Callable[[str], None]):
+        self._dsn = dsn
+        self._channel = channel
+        self._deliver = deliver
+        self._connection: Any = None
+        self._lock = asyncio.Lock()
+        self._reconnect_task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._connection = await asyncpg.connect(self._dsn)
+        self._connection.add_termination_listener(self._on_termination)
+        await self._connection.add_listener(self._channel, self._on_notify)
+        logger.info("Подписка на канал событий PostgreSQL %s", self._channel)
+
+    async def publish(self, payload: str) -> None:
+        # Одно соединение не выполняет запросы параллельно
+        async with self._lock:
+            await self._connection.execute(
+                "SELECT pg_notify($1, $2)", self._channel, payload
+            )
+
+    async def close(self) -> None:
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        if self._connection is not None and not self._connection.is_closed():
+            self._connection.remove_termination_listener(self._on_termination)
+            await self._connection.close()
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str) -> None:
+        self._deliver(payload)
+
+    def _on_termination(self, connection) -> None:
+        logger.error("Соединение канала событий PostgreSQL потеряно")
+        self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        delay = self.RECONNECT_SECONDS
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.start()
+                return
+            except (OSError, asyncpg.PostgresError) as exc:
+                logger.warning("Переподключение к каналу событий: %s", exc)
+                delay = min(delay * 2, 30.0)
+
+
+class EventBus:
+    """In-process pub/sub событий ленты. С мостом PostgreSQL событие уходит
+    в NOTIFY и возвращается всем воркерам, включая отправителя;
+    без моста - только подписчикам текущего процесса"""
+
+    def __init__(self, queue_size: int) -> None:
+        self._queue_size = queue_size
+        self._subscriptions: set[Subscription] = set()
+        self.bridge: PostgresEventBridge | None = None
+
+    @contextmanager
+    def subscribe(self) -> Iterator[Subscription]:
+        subscription = Subscription(self._queue_size)
+        self._subscriptions.add(subscription)
+        EVENT_SUBSCRIBERS.inc()
+        try:
+            yield subscription
+        finally:
+            self._subscriptions.discard(subscription)
+            EVENT_SUBSCRIBERS.dec()
+
+    def deliver(self, event: FeedEvent) -> None:
+        """Раздача события подписчикам этого процесса"""
+        for subscription in list(self._subscriptions):
+            subscription.offer(event)
+
+    async def publish(self, event: FeedEvent) -> None:
+        """Публикация после коммита. Ошибка моста не ломает запрос:
+        событие теряется, клиенты догонят ленту при переподключении"""
+        if self.bridge is None:
+            self.deliver(event)
+            return
+        try:
+            await self.bridge.publish(event.to_json())
+        except Exception:
+            logger.exception("Не удалось опубликовать событие %s", event.type)
+
+    async def start(self) -> None:
+        if settings.EVENTS.BACKEND != "postgres":
+            return
+        self.bridge = PostgresEventBridge(
+            listen_dsn(), settings.EVENTS.CHANNEL, self._deliver_payload
+        )
+        await self.bridge.start()
+
+    def _deliver_payload(self, payload: str) -> None:
+        try:
+            event = FeedEvent.from_json(payload)
+        except (TypeError, ValueError):
+            logger.warning("Некорректное событие в канале событий: %s", payload)
+            return
+        self.deliver(event)
+
+    async def close(self) -> None:
+        for subscription in list(self._subscriptions):
+            subscription.close()
+        if self.bridge is not None:
+            await self.bridge.close()
+            self.bridge = None
+
+
+async def sse_stream(bus: EventBus, heartbeat: float) -> AsyncIterator[str]:
+    """Поток text/event-stream: события ленты и комментарии-пинги, чтобы
+    прокси не закрывали простаивающее соединение"""
+    with bus.subscribe() as subscription:
+        yield f"retry: {settings.EVENTS.RETRY_MS}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if event is None:
+                return
+            yield f"event: {event.type}\ndata: {event.to_json()}\n\n"
+
+
+event_bus = EventBus(queue_size=settings.EVENTS.QUEUE_SIZE)
@@ -0,0 +1,58 @@
+import time
+
+from prometheus_client import make_asgi_app
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from microblog.core.metrics import (
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS_IN_PROGRESS,
+    HTTP_RESPONSE_SIZE,
+    metrics_registry,
+)
+
+# Метка запросов вне ручек API: статика, /metrics, 404 на неизвестные пути.
+# Сырые пути в метки не попадают, иначе число рядов не ограничено
+OTHER_ROUTE = "other"
+
+
+class MetricsMiddleware:
+    """ASGI-middleware метрик HTTP: время обработки по ручке и статусу,
+    запросы в обработке и размер тела ответа"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        size = 0
+
+        async def send_with_metrics(message: Message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method=method)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            in_progress.dec()
+            route = getattr(scope.get("route"), "path", OTHER_ROUTE)
+            HTTP_REQUEST_DURATION.labels(
+                method=method, route=route, status=str(status)
+            ).observe(time.perf_counter() - started)
+            HTTP_RESPONSE_SIZE.labels(method=method, route=route).observe(size)
+
+
+def metrics_app() -> ASGIApp:
+    """ASGI-приложение /metrics в текстовом формате Prometheus"""
+    return make_asgi_app(registry=metrics_registry())
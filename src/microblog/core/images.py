@@ -0,0 +1,120 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+from microblog.config import settings
+from microblog.logger import get_logger
+
+logger = get_logger(__name__)
+
+ORIGINAL = "original"
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def variant_name(filename: str, size: str) -> str:
+    """Имя уменьшенной копии рядом с оригиналом: photo.jpg -> photo.small.jpg"""
+    if size == ORIGINAL:
+        return filename
+    path = Path(filename)
+    return str(path.with_name(f"{path.stem}.{size}{path.suffix}"))
+
+
+def _link_original(source: str, target: str) -> None:
+    """Копия, совпадающая с оригиналом, - жёсткая ссылка без расхода места"""
+    try:
+        os.link(source, target)
+    except FileExistsError:
+        pass
+
+
+def render_variants(source: str, targets: list[tuple[str, int]], quality: int) -> int:
+    """Генерация уменьшенных копий изображения, выполняется в процессе пула.
+    Уменьшается только то, что больше границы; маленькие изображения,
+    анимации и нераспознанные файлы отдаются оригиналом через ссылку"""
+    created = 0
+    try:
+        image = Image.open(source)
+    except (OSError, Image.DecompressionBombError):
+        for target, _ in targets:
+            _link_original(source, target)
+        return created
+
+    with image:
+        for target, bound in targets:
+            if getattr(image, "is_animated", False) or max(image.size) <= bound:
+                _link_original(source, target)
+                continue
+
+            variant = image.copy()
+            variant.thumbnail((bound, bound), Image.Resampling.LANCZOS)
+            if image.format == "JPEG" and variant.mode not in ("RGB", "L"):
+                variant = variant.convert("RGB")
+
+            tmp_path = f"{target}.{os.getpid()}.part"
+            variant.save(tmp_path, format=image.format, quality=quality, optimize=True)
+            os.replace(tmp_path, target)
+            created += 1
+
+    return created
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Пул процессов для обработки изображений вне event loop"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.MEDIA.VARIANT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+
+async def build_variants(filename: str) -> None:
+    """Генерация всех уменьшенных копий загруженного изображения"""
+    upload_dir = settings.MEDIA.upload_dir
+    targets = [
+        (str(upload_dir / variant_name(filename, size)), bound)
+        for size, bound in settings.MEDIA.variant_sizes.items()
+    ]
+    loop = asyncio.get_running_loop()
+    try:
+        created = await loop.run_in_executor(
+            get_executor(),
+            render_variants,
+            str(upload_dir / filename),
+            targets,
+            settings.MEDIA.VARIANT_QUALITY,
+        )
+    except Exception as exc:
+        logger.warning("Не удалось создать копии %s: %s", filename, exc)
+        return
+    logger.debug("Создано копий %s для %s", created, filename)
+
+
+async def resolve_variant(filename: str, size: str) -> Path | None:
+    """Путь к файлу нужного размера, None - файла нет.
+    Отсутствующая копия создаётся лениво, при неудаче отдаётся оригинал"""
+    upload_dir = settings.MEDIA.upload_dir.resolve()
+    original = (upload_dir / filename).resolve()
+    if not original.is_relative_to(upload_dir) or not original.is_file():
+        return None
+    if size not in settings.MEDIA.variant_sizes:
+        return original
+
+    variant = upload_dir / variant_name(filename, size)
+    if not variant.exists():
+        await build_variants(filename)
+
+    return variant if variant.exists() else original
@@ -0,0 +1,272 @@
+import asyncio
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable, Iterable
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from microblog.config import settings
+from microblog.core.metrics import JOB_DURATION, JOBS_PROCESSED
+from microblog.db.models import Job
+from microblog.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Виды задач, обработчики - в microblog.services.jobs
+FAN_OUT = "feed.fan_out"
+BUILD_VARIANTS = "media.build_variants"
+COLLECT_BLOB = "media.collect_blob"
+
+# Задачи режима memory, ожидающие коммита сессии
+PENDING_JOBS = "pending_jobs"
+
+JobHandler = Callable[[AsyncSession, dict], Awaitable[None]]
+
+
+@dataclass
+class QueuedJob:
+    """Задача в работе. id - строка таблицы jobs, None в режиме memory"""
+
+    kind: str
+    payload: dict
+    attempts: int = 0
+    id: int | None = None
+    run_at: float = 0.0
+
+
+def backoff(attempts: int) -> float:
+    """Пауза перед повтором после attempts неудачных попыток"""
+    delay: float = settings.JOBS.BACKOFF_SECONDS * 2 ** (attempts - 1)
+    return min(delay, settings.JOBS.BACKOFF_MAX_SECONDS)
+
+
+async def enqueue(session: AsyncSession, kind: str, payload: dict) -> None:
+    """Постановка задачи в транзакции session. Задача появляется в очереди
+    только после коммита и пропадает при откате: в режиме database это
+    строка jobs в той же транзакции, в режиме memory - после события коммита"""
+    if settings.JOBS.BACKEND == "database":
+        now = datetime.now()
+        await session.execute(
+            insert(Job).values(kind=kind, payload=payload, run_at=now, created_at=now)
+        )
+        return
+
+    session.info.setdefault(PENDING_JOBS, []).append(QueuedJob(kind, payload))
+
+
+class MemoryJobQueue:
+    """Очередь режима memory: задачи текущего процесса, для dev и тестов"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        self._jobs: deque[QueuedJob] = deque()
+        self._clock = clock
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def extend(self, jobs: Iterable[QueuedJob]) -> None:
+        for job in jobs:
+            job.run_at = self._clock()
+            self._jobs.append(job)
+
+    def retry(self, job: QueuedJob, delay: float) -> None:
+        job.run_at = self._clock() + delay
+        self._jobs.append(job)
+
+    def take_due(self) -> list[QueuedJob]:
+        """Забрать задачи, время которых пришло; отложенные повторы остаются"""
+        now = self._clock()
+        due = [job for job in self._jobs if job.run_at <= now]
+        self._jobs = deque(job for job in self._jobs if job.run_at > now)
+        return due
+
+
+memory_queue = MemoryJobQueue()
+
+# Задачи режима memory, закоммиченные текущим HTTP-запросом
+_request_jobs: ContextVar[list[QueuedJob] | None] = ContextVar(
+    "request_jobs", default=None
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _push_pending_jobs(session: Session) -> None:
+    jobs = session.info.pop(PENDING_JOBS, None)
+    if not jobs:
+        return
+    request_jobs = _request_jobs.get()
+    if request_jobs is not None:
+        request_jobs.extend(jobs)
+    else:
+        memory_queue.extend(jobs)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_pending_jobs(session: Session, previous_transaction) -> None:
+    session.info.pop(PENDING_JOBS, None)
+
+
+async def claim_jobs(session: AsyncSession, limit: int) -> list[QueuedJob]:
+    """Взять до limit готовых задач. SKIP LOCKED: параллельные воркеры
+    берут разные строки, не дожидаясь друг друга. Взятая задача сдвигается
+    на LEASE_SECONDS и не видна остальным, пока выполняется"""
+    now = datetime.now()
+    due = (
+        select(Job.id)
+        .where(Job.run_at <= now, Job.failed_at.is_(None))
+        .order_by(Job.run_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    rows = (
+        await session.execute(
+            update(Job)
+            .where(Job.id.in_(due.scalar_subquery()))
+            .values(
+                run_at=now + timedelta(seconds=settings.JOBS.LEASE_SECONDS),
+                attempts=Job.attempts + 1,
+            )
+            .returning(Job.id, Job.kind, Job.payload, Job.attempts)
+            .execution_options(synchronize_session=False)
+        )
+    ).all()
+    await session.commit()
+
+    return [
+        QueuedJob(kind=kind, payload=payload, attempts=attempts, id=job_id)
+        for job_id, kind, payload, attempts in rows
+    ]
+
+
+class JobRunner:
+    """Выполнение задач: своя сессия на задачу. Строка задачи удаляется в той же
+    транзакции, что и изменения обработчика, - при ошибке задача остаётся и
+    повторяется с экспоненциальной паузой до MAX_ATTEMPTS попыток"""
+
+    def __init__(
+        self,
+        handlers: dict[str, JobHandler],
+        session_factory: async_sessionmaker[AsyncSession],
+    ) -> None:
+        self.handlers = handlers
+        self.session_factory = session_factory
+
+    async def execute(self, job: QueuedJob) -> None:
+        started = time.perf_counter()
+        async with self.session_factory() as session:
+            if job.id is not None:
+                await session.execute(delete(Job).where(Job.id == job.id))
+            await self.handlers[job.kind](session, job.payload)
+            await session.commit()
+        JOB_DURATION.labels(kind=job.kind).observe(time.perf_counter() - started)
+
+    async def run_memory(self, queue: MemoryJobQueue) -> int:
+        """Выполнить готовые задачи режима memory, вернуть число успешных"""
+        return await self.run_jobs(queue.take_due(), queue)
+
+    async def run_jobs(self, jobs: list[QueuedJob], queue: MemoryJobQueue) -> int:
+        """Выполнить задачи режима memory, неудачные - в queue на повтор"""
+        done = 0
+        for job in jobs:
+            job.attempts += 1
+            try:
+                await self.execute(job)
+            except Exception as exc:
+                if self._give_up(job, exc):
+                    continue
+                queue.retry(job, backoff(job.attempts))
+            else:
+                JOBS_PROCESSED.labels(kind=job.kind, outcome="done").inc()
+                done += 1
+        return done
+
+    async def poll_memory(self, queue: MemoryJobQueue) -> None:
+        """Фоновый цикл режима memory: повторы и задачи, поставленные вне
+        HTTP-запросов. Запускается один на процесс из lifespan"""
+        while True:
+            try:
+                await self.run_memory(queue)
+            except Exception:
+                logger.exception("Ошибка разбора очереди задач")
+            await asyncio.sleep(settings.JOBS.POLL_INTERVAL)
+
+    async def run_database(self, limit: int) -> int:
+        """Взять и выполнить пачку задач из таблицы, вернуть число взятых"""
+        async with self.session_factory() as session:
+            jobs = await claim_jobs(session, limit)
+
+        for job in jobs:
+            try:
+                await self.execute(job)
+            except Exception as exc:
+                failed = self._give_up(job, exc)
+                await self._reschedule(job, exc, failed)
+            else:
+                JOBS_PROCESSED.labels(kind=job.kind, outcome="done").inc()
+        return len(jobs)
+
+    async def _reschedule(self, job: QueuedJob, exc: Exception, failed: bool) -> None:
+        now = datetime.now()
+        values: dict = {"last_error": repr(exc)[:1000]}
+        if failed:
+            values["failed_at"] = now
+        else:
+            values["run_at"] = now + timedelta(seconds=backoff(job.attempts))
+        async with self.session_factory() as session:
+            await session.execute(update(Job).where(Job.id == job.id).values(**values))
+            await session.commit()
+
+    @staticmethod
+    def _give_up(job: QueuedJob, exc: Exception) -> bool:
+        if job.attempts >= settings.JOBS.MAX_ATTEMPTS:
+            JOBS_PROCESSED.labels(kind=job.kind, outcome="failed").inc()
+            logger.error(
+                "Задача %s %s не выполнена за %s попыток: %r",
+                job.kind,
+                job.payload,
+                job.attempts,
+                exc,
+            )
+            return True
+
+        JOBS_PROCESSED.labels(kind=job.kind, outcome="retry").inc()
+        logger.warning(
+            "Задача %s %s, попытка %s: %r", job.kind, job.payload, job.attempts, exc
+        )
+        return False
+
+
+class JobsMiddleware:
+    """Режим memory: задачи, поставленные запросом, выполняются тем же
+    процессом после отправки ответа - клиент ждёт только записи в БД.
+    Запрос выполняет только свои задачи; повторы и чужие задачи остаются
+    в memory_queue для JobRunner.poll_memory"""
+
+    def __init__(self, app: ASGIApp, runner: JobRunner) -> None:
+        self.app = app
+        self.runner = runner
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or settings.JOBS.BACKEND != "memory":
+            await self.app(scope, receive, send)
+            return
+
+        jobs: list[QueuedJob] = []
+        token = _request_jobs.set(jobs)
+        try:
+            await self.app(scope, receive, send)
+        except BaseException:
+            # Закоммиченные задачи не теряются, их выполнит фоновый цикл
+            memory_queue.extend(jobs)
+            raise
+        finally:
+            _request_jobs.reset(token)
+
+        if jobs:
+            await self.runner.run_jobs(jobs, memory_queue)
@@ -1,14 +1,20 @@
+import asyncio
 import os
 from collections.abc import AsyncIterator
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI
 
 from microblog.config import settings
-from microblog.core.database import (
-    create_tables,
-)
+from microblog.core.cache import feed_cache
+from microblog.core.database import dispose_engines, warm_up_pool
+from microblog.core.events import event_bus
+from microblog.core.images import shutdown_executor
+from microblog.core.jobs import memory_queue
+from microblog.core.metrics import MULTIPROC_DIR_ENV, mark_process_dead
+from microblog.core.static import precompress
 from microblog.logger import get_logger
+from microblog.services.jobs import job_runner
 
 logger = get_logger(__name__)
 
@@ -20,5 +26,45 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
 
     os.makedirs(settings.MEDIA.upload_dir, exist_ok=True)
     logger.info(f"Создание папки для медиа - {settings.MEDIA.upload_dir}, если её нет")
+
+    if settings.STATIC.PRECOMPRESS:
+        # После сжатия при сборке образа здесь только сверка mtime
+        await asyncio.to_thread(
+            precompress,
+            settings.STATIC.static_dir,
+            settings.STATIC.COMPRESS_MIN_SIZE,
+        )
+
+    if settings.UVICORN.WORKERS > 1 and MULTIPROC_DIR_ENV not in os.environ:
+        # Воркеров запускает и каталог метрик готовит только python -m microblog.main
+        logger.warning(
+            "UVICORN__WORKERS=%s, но приложение запущено не через microblog.main: "
+            "метрики не суммируются по воркерам",
+            settings.UVICORN.WORKERS,
+        )
+
+    await warm_up_pool()
+    await event_bus.start()
+    await feed_cache.start()
+    jobs_task = None
+    if settings.JOBS.BACKEND == "memory":
+        # Повторы задач и задачи вне HTTP-запросов, см. JobsMiddleware
+        jobs_task = asyncio.create_task(job_runner.poll_memory(memory_queue))
+    logger.info(
+        "Лимит соединений с каждой БД: %s воркеров x (%s + %s), реплик: %s",
+        settings.UVICORN.uvicorn_workers,
+        settings.POSTGRES.POOL_SIZE,
+        settings.POSTGRES.MAX_OVERFLOW,
+        len(settings.POSTGRES.replica_urls),
+    )
     yield
+    if jobs_task is not None:
+        jobs_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await jobs_task
+    await feed_cache.close()
+    await event_bus.close()
+    shutdown_executor()
+    await dispose_engines()
+    mark_process_dead()
     print("Завершение FastAPI")
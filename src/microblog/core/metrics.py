@@ -0,0 +1,131 @@
+import os
+import tempfile
+from pathlib import Path
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    multiprocess,
+)
+
+# Каталог файлов метрик воркеров, общий для всех процессов uvicorn.
+# Переменная окружения должна быть задана до запуска воркеров
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+# Пул соединений с БД
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "microblog_db_pool_checkout_seconds",
+    "Время получения соединения из пула",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    "microblog_db_pool_checkout_timeouts_total",
+    "Запросы, не дождавшиеся свободного соединения за POOL_TIMEOUT",
+    ["pool"],
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "microblog_db_pool_connections",
+    "Соединения пула по состоянию",
+    ["pool", "state"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_SATURATION = Gauge(
+    "microblog_db_pool_saturation_ratio",
+    "Доля занятых соединений от POOL_SIZE + MAX_OVERFLOW",
+    ["pool"],
+    multiprocess_mode="livemax",
+)
+
+# SQL на один HTTP-запрос, по шаблону пути ручки
+DB_QUERIES_PER_REQUEST = Histogram(
+    "microblog_db_queries_per_request",
+    "Число SQL-запросов на один HTTP-запрос",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "microblog_db_time_per_request_seconds",
+    "Суммарное время SQL-запросов одного HTTP-запроса",
+    ["method", "route"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+# HTTP-запросы, по шаблону пути ручки
+HTTP_REQUEST_DURATION = Histogram(
+    "microblog_http_request_duration_seconds",
+    "Время обработки HTTP-запроса",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "microblog_http_requests_in_progress",
+    "HTTP-запросы в обработке",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+HTTP_RESPONSE_SIZE = Histogram(
+    "microblog_http_response_size_bytes",
+    "Размер тела HTTP-ответа",
+    ["method", "route"],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000),
+)
+
+# Загрузки медиа
+MEDIA_UPLOAD_BYTES = Counter(
+    "microblog_media_upload_bytes_total",
+    "Объём принятых загрузок медиа",
+    ["stored"],
+)
+
+# Фоновые задачи: outcome - done, retry или failed
+JOBS_PROCESSED = Counter(
+    "microblog_jobs_processed_total",
+    "Выполненные попытки фоновых задач",
+    ["kind", "outcome"],
+)
+JOB_DURATION = Histogram(
+    "microblog_job_duration_seconds",
+    "Время успешного выполнения фоновой задачи",
+    ["kind"],
+)
+
+# Живая лента: открытые потоки событий
+EVENT_SUBSCRIBERS = Gauge(
+    "microblog_event_subscribers",
+    "Открытые потоки событий ленты",
+    multiprocess_mode="livesum",
+)
+
+
+def prepare_multiprocess_dir(workers: int) -> None:
+    """Подготовка каталога метрик перед запуском нескольких воркеров:
+    по умолчанию - во временном каталоге, файлы прошлого запуска удаляются"""
+    if workers <= 1 and MULTIPROC_DIR_ENV not in os.environ:
+        return
+
+    default = Path(tempfile.gettempdir()) / "microblog-metrics"
+    path = Path(os.environ.setdefault(MULTIPROC_DIR_ENV, str(default)))
+    path.mkdir(parents=True, exist_ok=True)
+    for stale in path.glob("*.db"):
+        stale.unlink()
+
+
+def metrics_registry() -> CollectorRegistry:
+    """Реестр для /metrics: в многопроцессном режиме - сумма по файлам
+    всех воркеров, иначе - реестр текущего процесса"""
+    if MULTIPROC_DIR_ENV not in os.environ:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def mark_process_dead() -> None:
+    """Удаление live-gauge завершающегося воркера из общих метрик"""
+    if MULTIPROC_DIR_ENV in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,57 @@
+import base64
+import binascii
+import json
+import math
+from datetime import datetime
+from typing import Any
+
+
+class InvalidCursorError(ValueError):
+    """Курсор пагинации повреждён или не соответствует ленте"""
+
+
+def encode_cursor(*values: Any) -> str:
+    """Упаковка ключа сортировки последней записи страницы в непрозрачный курсор"""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list[Any]:
+    """Распаковка курсора в список значений ключа сортировки заданной длины"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise InvalidCursorError("Некорректный курсор") from exc
+
+    if not isinstance(payload, list) or len(payload) != size:
+        raise InvalidCursorError("Курсор не соответствует ленте")
+
+    return payload
+
+
+def parse_cursor_datetime(value: Any) -> datetime:
+    """Восстановление даты из значения курсора"""
+    if not isinstance(value, str):
+        raise InvalidCursorError("Некорректная дата в курсоре")
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError as exc:
+        raise InvalidCursorError("Некорректная дата в курсоре") from exc
+
+
+def parse_cursor_int(value: Any) -> int:
+    """Восстановление целого числа из значения курсора"""
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise InvalidCursorError("Некорректное число в курсоре")
+    return value
+
+
+def parse_cursor_float(value: Any) -> float:
+    """Восстановление конечного вещественного числа из значения курсора"""
+    if not isinstance(value, int | float) or isinstance(value, bool):
+        raise InvalidCursorError("Некорректное число в курсоре")
+    if not math.isfinite(value):
+        raise InvalidCursorError("Некорректное число в курсоре")
+    return float(value)
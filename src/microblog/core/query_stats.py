@@ -0,0 +1,138 @@
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from microblog.config import settings
+from microblog.core.metrics import DB_QUERIES_PER_REQUEST, DB_TIME_PER_REQUEST
+from microblog.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class QueryStats:
+    """SQL-запросы одного HTTP-запроса: число, суммарное время и самый медленный"""
+
+    count: int = 0
+    total: float = 0.0
+    slowest: float = 0.0
+    slowest_statement: str | None = None
+    statements: Counter[str] = field(default_factory=Counter)
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.statements[statement] += 1
+        if seconds >= self.slowest:
+            self.slowest = seconds
+            self.slowest_statement = statement
+
+    @property
+    def repeated(self) -> tuple[str, int] | None:
+        """Чаще всего повторённый запрос - признак N+1"""
+        if not self.statements:
+            return None
+        return self.statements.most_common(1)[0]
+
+    def server_timing(self) -> str:
+        """Значение заголовка Server-Timing, время в миллисекундах"""
+        return (
+            f'db;dur={self.total * 1000:.2f};desc="{self.count} queries", '
+            f"db-slowest;dur={self.slowest * 1000:.2f}"
+        )
+
+
+_current: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+def current_query_stats() -> QueryStats | None:
+    return _current.get()
+
+
+def start_query_stats() -> QueryStats:
+    """Начать учёт запросов в текущем контексте, например на время HTTP-запроса"""
+    stats = QueryStats()
+    _current.set(stats)
+    return stats
+
+
+# Слушатели на классе Engine получают события всех движков: primary, реплик
+# и тестовых. Контекст asyncio-задачи SQLAlchemy передаёт в greenlet драйвера
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current.get() is not None:
+        context.query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = getattr(context, "query_started", None)
+    if stats is not None and started is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+class QueryStatsMiddleware:
+    """ASGI-middleware учёта SQL на запрос. В dev добавляет заголовок
+    Server-Timing, всегда пишет метрики по шаблону пути ручки
+    и предупреждает в лог о медленных и многократно повторённых запросах"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.server_timing = settings.ENVIRONMENT == "dev"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = start_query_stats()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start" and self.server_timing:
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", stats.server_timing().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            self.report(scope, stats)
+
+    @staticmethod
+    def report(scope: Scope, stats: QueryStats) -> None:
+        route = scope.get("route")
+        path = getattr(route, "path", None)
+        if path is None:
+            return
+
+        DB_QUERIES_PER_REQUEST.labels(method=scope["method"], route=path).observe(
+            stats.count
+        )
+        DB_TIME_PER_REQUEST.labels(method=scope["method"], route=path).observe(
+            stats.total
+        )
+
+        if stats.slowest >= settings.POSTGRES.SLOW_QUERY_SECONDS:
+            logger.warning(
+                "Медленный запрос %s %s: %.3f с: %s",
+                scope["method"],
+                path,
+                stats.slowest,
+                stats.slowest_statement,
+            )
+        repeated = stats.repeated
+        if repeated and repeated[1] >= settings.POSTGRES.REPEATED_QUERY_WARNING:
+            logger.warning(
+                "Возможный N+1 в %s %s: запрос выполнен %s раз: %s",
+                scope["method"],
+                path,
+                repeated[1],
+                repeated[0],
+            )
@@ -0,0 +1,74 @@
+import functools
+import inspect
+from collections.abc import Callable
+from typing import Any
+
+from fastapi.datastructures import Default, DefaultPlaceholder
+from fastapi.dependencies.utils import get_typed_return_annotation
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import to_json
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON-ответ, сериализуемый pydantic-core сразу в байты.
+    Модели Pydantic отдаются по alias, как и в стандартном ответе FastAPI"""
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content, by_alias=True)
+
+
+class FastJSONRoute(APIRoute):
+    """Маршрут, у которого возвращённый экземпляр модели ответа сериализуется
+    по response_model сразу в байты, без повторной валидации и jsonable_encoder.
+    Лишние поля подкласса отбрасываются так же, как в стандартном ответе.
+    Прочие значения, а также ручки с response_model_include/exclude/exclude_*,
+    проходят обычную валидацию FastAPI. Ручки, которым нужны заголовки
+    через параметр Response, должны возвращать Response сами"""
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any) -> None:
+        response_model = kwargs.get("response_model", Default(None))
+        if isinstance(response_model, DefaultPlaceholder):
+            response_model = get_typed_return_annotation(endpoint)
+        if (
+            inspect.iscoroutinefunction(endpoint)
+            and inspect.isclass(response_model)
+            and issubclass(response_model, BaseModel)
+            and kwargs.get("response_model_by_alias", True)
+            and not any(kwargs.get(option) for option in _FILTER_OPTIONS)
+        ):
+            endpoint = _respond_with_bytes(
+                endpoint, response_model, kwargs.get("status_code")
+            )
+        super().__init__(path, endpoint, **kwargs)
+
+
+_FILTER_OPTIONS = (
+    "response_model_include",
+    "response_model_exclude",
+    "response_model_exclude_unset",
+    "response_model_exclude_defaults",
+    "response_model_exclude_none",
+)
+
+
+def _respond_with_bytes(
+    endpoint: Callable[..., Any],
+    response_model: type[BaseModel],
+    status_code: int | None,
+) -> Callable[..., Any]:
+    adapter = TypeAdapter(response_model)
+
+    @functools.wraps(endpoint)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        content = await endpoint(*args, **kwargs)
+        if isinstance(content, response_model):
+            return Response(
+                content=adapter.dump_json(content, by_alias=True),
+                status_code=status_code or 200,
+                media_type="application/json",
+            )
+        return content
+
+    return wrapper
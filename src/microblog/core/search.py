@@ -0,0 +1,68 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+# Конфигурация полнотекстового поиска PostgreSQL: та же, что в генерируемом
+# столбце tweets.search_vector (миграция e6a9d2c4b7f1)
+TS_CONFIG = "russian"
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Слова текста в нижнем регистре"""
+    return _WORD.findall(text.lower())
+
+
+def combined_score(rank: float, like_count: int) -> float:
+    """Итоговый вес результата: релевантность, усиленная логарифмом числа
+    лайков. Та же формула считается в SQL для PostgreSQL"""
+    return rank * (1 + math.log1p(like_count))
+
+
+class InMemorySearchIndex:
+    """Инвертированный индекс твитов в памяти процесса - замена tsvector и GIN
+    для SQLite в тестах и dev. Слова не приводятся к основе, запрос - все слова
+    через AND, без синтаксиса websearch_to_tsquery. Индекс дополняется твитами
+    с id больше last_id, удалённые твиты вычищаются при поиске"""
+
+    def __init__(self) -> None:
+        self.last_id = 0
+        self._postings: dict[str, dict[int, int]] = defaultdict(dict)
+        self._lengths: dict[int, int] = {}
+
+    def add(self, tweet_id: int, content: str) -> None:
+        tokens = tokenize(content)
+        for token, count in Counter(tokens).items():
+            self._postings[token][tweet_id] = count
+        self._lengths[tweet_id] = len(tokens)
+        self.last_id = max(self.last_id, tweet_id)
+
+    def discard(self, tweet_ids: set[int]) -> None:
+        for postings in self._postings.values():
+            for tweet_id in tweet_ids:
+                postings.pop(tweet_id, None)
+        for tweet_id in tweet_ids:
+            self._lengths.pop(tweet_id, None)
+
+    def search(self, query: str) -> dict[int, float]:
+        """id твитов, содержащих все слова запроса, с релевантностью:
+        доля слов запроса среди слов твита"""
+        terms = set(tokenize(query))
+        if not terms:
+            return {}
+
+        postings = sorted((self._postings.get(term, {}) for term in terms), key=len)
+        # Пересечение от самого короткого списка
+        matched = set(postings[0])
+        for posting in postings[1:]:
+            matched &= posting.keys()
+
+        return {
+            tweet_id: sum(posting[tweet_id] for posting in postings)
+            / self._lengths[tweet_id]
+            for tweet_id in matched
+        }
+
+
+search_index = InMemorySearchIndex()
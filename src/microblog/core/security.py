@@ -0,0 +1,100 @@
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+
+from sqlalchemy import event
+from sqlalchemy.orm import attributes
+
+from microblog.api.schemas import AuthUserSchema
+from microblog.config import settings
+from microblog.db.models import User
+from microblog.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class AuthCache:
+    """In-process LRU-кэш аутентификации по API-Key.
+    Хранит и найденных пользователей (TTL), и неверные ключи (negative TTL)"""
+
+    def __init__(
+        self,
+        ttl: float,
+        negative_ttl: float,
+        max_size: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._max_size = max_size
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, AuthUserSchema | None]] = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, api_key: str) -> tuple[bool, AuthUserSchema | None]:
+        """Поиск ключа в кэше: (найден ли в кэше, пользователь или None)"""
+        entry = self._entries.get(api_key)
+        if entry is None:
+            return False, None
+
+        expires_at, user = entry
+        if expires_at <= self._clock():
+            del self._entries[api_key]
+            return False, None
+
+        self._entries.move_to_end(api_key)
+        return True, user
+
+    def set(self, api_key: str, user: AuthUserSchema | None) -> None:
+        """Запись результата проверки ключа, None - ключ неверный"""
+        ttl = self._ttl if user is not None else self._negative_ttl
+        if ttl <= 0:
+            return
+
+        self._entries[api_key] = (self._clock() + ttl, user)
+        self._entries.move_to_end(api_key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, api_key: str) -> None:
+        """Сброс записи по ключу"""
+        self._entries.pop(api_key, None)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Сброс всех записей пользователя"""
+        stale = [
+            key
+            for key, (_, user) in self._entries.items()
+            if user is not None and user.id == user_id
+        ]
+        for key in stale:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        """Полная очистка кэша"""
+        self._entries.clear()
+
+
+auth_cache = AuthCache(
+    ttl=settings.AUTH.CACHE_TTL,
+    negative_ttl=settings.AUTH.CACHE_NEGATIVE_TTL,
+    max_size=settings.AUTH.CACHE_MAX_SIZE,
+)
+
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_auth_cache(mapper, connection, target: User) -> None:
+    """Сброс кэша при изменении пользователя через ORM.
+    Массовые update()/delete() в обход ORM кэш не сбрасывают - только TTL"""
+    history = attributes.get_history(target, "api_key")
+    for api_key in (*history.added, *history.unchanged, *history.deleted):
+        auth_cache.invalidate(api_key)
+    if target.id is not None:
+        auth_cache.invalidate_user(target.id)
+    logger.debug("Сброс кэша авторизации пользователя %s", target.id)
@@ -0,0 +1,180 @@
+"""Отдача статики фронтенда: сжатые заранее копии и долгий кэш.
+
+Сжатие при сборке образа:
+    python -m microblog.core.static
+"""
+
+import gzip
+import mimetypes
+import os
+import re
+from pathlib import Path
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from microblog.config import settings
+from microblog.logger import get_logger
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli необязателен, остаётся gzip
+    brotli = None
+
+logger = get_logger(__name__)
+
+# Хэш содержимого в имени от сборщика фронтенда: app.ee2cdef2.js
+FINGERPRINTED = re.compile(r"\.[0-9a-f]{8,}\.[a-z0-9]+$")
+COMPRESSIBLE = {".js", ".css", ".html", ".svg", ".json", ".ico", ".txt"}
+# Порядок - предпочтение при равных q в Accept-Encoding
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+
+def _compress(encoding: str, data: bytes) -> bytes:
+    if encoding == "br":
+        compressed: bytes = brotli.compress(data, quality=11)
+        return compressed
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def available_encodings() -> list[str]:
+    return [encoding for encoding in ENCODINGS if encoding != "br" or brotli]
+
+
+def precompress(directory: Path, min_size: int, skip: Path | None = None) -> int:
+    """Сжатые копии файлов статики рядом с оригиналами: app.js.gz, app.js.br.
+    Копия получает mtime оригинала: неизменённые файлы повторно не сжимаются.
+    Папка skip (по умолчанию загрузки пользователей) не обходится вовсе.
+    Запись через временный файл - воркеры могут сжимать одновременно"""
+    created = 0
+    skip = (skip or settings.MEDIA.upload_dir).resolve()
+    encodings = available_encodings()
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [name for name in dirs if Path(root, name).resolve() != skip]
+        for name in files:
+            path = Path(root, name)
+            if path.suffix not in COMPRESSIBLE:
+                continue
+            created += _precompress_file(path, min_size, encodings)
+
+    logger.info("Сжато файлов статики: %s (%s)", created, ", ".join(encodings))
+    return created
+
+
+def _precompress_file(path: Path, min_size: int, encodings: list[str]) -> int:
+    """Сжатые копии одного файла, число записанных"""
+    source = path.stat()
+    if source.st_size < min_size:
+        return 0
+
+    created = 0
+    data = None
+    for encoding in encodings:
+        target = path.with_name(path.name + ENCODINGS[encoding])
+        if target.exists() and target.stat().st_mtime == source.st_mtime:
+            continue
+        data = data if data is not None else path.read_bytes()
+        compressed = _compress(encoding, data)
+        if len(compressed) >= len(data):
+            continue
+
+        tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(compressed)
+        os.utime(tmp, (source.st_atime, source.st_mtime))
+        os.replace(tmp, target)
+        created += 1
+
+    return created
+
+
+def accepted_encodings(header: str) -> list[str]:
+    """Поддерживаемые кодировки из Accept-Encoding по убыванию q"""
+    weights: dict[str, float] = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+        weights[name.strip().lower()] = quality
+
+    ranked = []
+    for encoding in ENCODINGS:
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > 0:
+            ranked.append((quality, encoding))
+    # sorted устойчив: при равных q остаётся порядок ENCODINGS
+    return [encoding for _, encoding in sorted(ranked, key=lambda x: -x[0])]
+
+
+class AssetFiles(StaticFiles):
+    """StaticFiles с выбором сжатой копии по Accept-Encoding, Cache-Control
+    immutable для файлов с хэшем в имени и скрытыми source map в prod.
+    ETag и 304 по If-None-Match/If-Modified-Since - из StaticFiles,
+    у каждой копии свой ETag"""
+
+    def __init__(self, *args, source_maps: bool | None = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.source_maps = (
+            settings.ENVIRONMENT != "prod" if source_maps is None else source_maps
+        )
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if not self.source_maps and path.endswith(".map"):
+            raise HTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        path = os.fspath(full_path)
+        name = os.path.basename(path)
+        headers = {
+            "Cache-Control": (
+                f"public, max-age={settings.STATIC.IMMUTABLE_MAX_AGE}, immutable"
+                if FINGERPRINTED.search(name)
+                else "no-cache"
+            )
+        }
+
+        served_path = path
+        if os.path.splitext(name)[1] in COMPRESSIBLE:
+            headers["Vary"] = "Accept-Encoding"
+            for candidate in accepted_encodings(
+                request_headers.get("accept-encoding", "")
+            ):
+                try:
+                    stat_result = os.stat(path + ENCODINGS[candidate])
+                except FileNotFoundError:
+                    continue
+                served_path = path + ENCODINGS[candidate]
+                headers["Content-Encoding"] = candidate
+                break
+
+        response = FileResponse(
+            served_path,
+            status_code=status_code,
+            headers=headers,
+            media_type=mimetypes.guess_type(name)[0] or "text/plain",
+            stat_result=stat_result,
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+static_files = AssetFiles(directory=settings.STATIC.static_dir, check_dir=False)
+
+
+if __name__ == "__main__":
+    precompress(settings.STATIC.static_dir, settings.STATIC.COMPRESS_MIN_SIZE)
@@ -0,0 +1,231 @@
+import hashlib
+import os
+import uuid
+from collections.abc import Awaitable, Callable, Coroutine
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any, NamedTuple
+from urllib.parse import quote
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, Request, UploadFile, status
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.types import Message
+
+from microblog.config import settings
+from microblog.core.images import variant_name
+from microblog.core.metrics import MEDIA_UPLOAD_BYTES
+from microblog.core.responses import FastJSONRoute
+from microblog.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Запас на границы и заголовки частей multipart сверх размера файла
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Сигнатуры (magic bytes) поддерживаемых изображений
+IMAGE_SIGNATURES: tuple[tuple[bytes, str], ...] = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+)
+
+
+class StoredFile(NamedTuple):
+    """Результат сохранения загрузки"""
+
+    path: str
+    content_hash: str
+    created: bool
+
+
+def sniff_image_type(head: bytes) -> str | None:
+    """Определение типа изображения по первым байтам файла"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return None
+
+
+def content_path(content_hash: str, extension: str) -> str:
+    """Относительный путь блоба по хэшу содержимого: ab/cd/abcd....jpg"""
+    return f"{content_hash[:2]}/{content_hash[2:4]}/{content_hash}.{extension}"
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail="Превышен максимальный размер файла",
+    )
+
+
+class UploadRoute(FastJSONRoute):
+    """Маршрут загрузки файлов. Тело больше MAX_FILE_SIZE отклоняется с 413
+    до разбора формы: по Content-Length сразу, без него - как только
+    прочитанный поток превысит предел. Иначе Starlette успевает сохранить
+    всё тело во временный файл, и лишь затем save_upload видит размер"""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def limited_handler(request: Request) -> Response:
+            limit = settings.MEDIA.MAX_FILE_SIZE + MULTIPART_OVERHEAD
+            length = request.headers.get("content-length")
+            if length is not None:
+                if length.isdigit() and int(length) > limit:
+                    raise _too_large()
+                return await handler(request)
+
+            received = 0
+
+            async def limited_receive() -> Message:
+                nonlocal received
+                message = await request.receive()
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise _too_large()
+                return message
+
+            return await handler(Request(request.scope, limited_receive))
+
+        return limited_handler
+
+
+async def save_upload(
+    file: UploadFile, lock: Callable[[str], Awaitable[None]] | None = None
+) -> StoredFile | None:
+    """Сохранение загрузки в контентно-адресуемое хранилище.
+    Первый проход по кускам CHUNK_SIZE считает sha256 и проверяет размер
+    и тип (по magic bytes) без записи на диск. Уже известное содержимое
+    сразу возвращается, новое копируется во временный файл и атомарно
+    переименовывается на место. None - не поддерживаемое изображение,
+    при превышении MAX_FILE_SIZE - 413.
+    lock(content_hash) вызывается до проверки наличия файла: пока он держится,
+    сборщик блобов не удалит файл, на который сошлётся загрузка"""
+    chunk = await file.read(settings.MEDIA.CHUNK_SIZE)
+    extension = sniff_image_type(chunk)
+    if extension is None or extension not in settings.MEDIA.allowed_extensions:
+        logger.debug("Загрузка отклонена: неподдерживаемый тип файла")
+        return None
+
+    digest = hashlib.sha256()
+    size = 0
+    while chunk:
+        size += len(chunk)
+        if size > settings.MEDIA.MAX_FILE_SIZE:
+            raise _too_large()
+        digest.update(chunk)
+        chunk = await file.read(settings.MEDIA.CHUNK_SIZE)
+
+    content_hash = digest.hexdigest()
+    if lock is not None:
+        await lock(content_hash)
+    relative_path = content_path(content_hash, extension)
+    final_path = settings.MEDIA.upload_dir / relative_path
+    if await aiofiles.os.path.exists(final_path):
+        MEDIA_UPLOAD_BYTES.labels(stored="duplicate").inc(size)
+        logger.debug("Медиа %s уже в хранилище, запись пропущена", relative_path)
+        return StoredFile(relative_path, content_hash, created=False)
+
+    await file.seek(0)
+    await aiofiles.os.makedirs(final_path.parent, exist_ok=True)
+    tmp_path = final_path.parent / f".{uuid.uuid4().hex}.part"
+    try:
+        async with aiofiles.open(tmp_path, "wb") as f:
+            while chunk := await file.read(settings.MEDIA.CHUNK_SIZE):
+                await f.write(chunk)
+
+        await aiofiles.os.replace(tmp_path, final_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            await aiofiles.os.remove(tmp_path)
+        raise
+
+    MEDIA_UPLOAD_BYTES.labels(stored="new").inc(size)
+    logger.debug("Медиа %s сохранено, %s байт", relative_path, size)
+    return StoredFile(relative_path, content_hash, created=True)
+
+
+async def remove_blob(relative_path: str) -> None:
+    """Удаление блоба и его копий, когда на него не осталось ссылок"""
+    upload_dir = settings.MEDIA.upload_dir
+    names = [relative_path]
+    names.extend(
+        variant_name(relative_path, size) for size in settings.MEDIA.variant_sizes
+    )
+    for name in names:
+        path = upload_dir / name
+        if await aiofiles.os.path.exists(path):
+            await aiofiles.os.remove(path)
+    logger.debug("Медиа %s удалено из хранилища", relative_path)
+
+
+class MediaFileResponse(FileResponse):
+    """FileResponse с крупными чтениями: меньше переходов в поток на файл.
+    Range и If-Range - из FileResponse, при поддержке сервером
+    расширения http.response.pathsend файл отдаётся сервером без чтения"""
+
+    chunk_size = 1024 * 1024
+
+
+def is_not_modified(response_headers: Headers, request_headers: Headers) -> bool:
+    """Условный запрос по RFC 9110: If-None-Match важнее If-Modified-Since"""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = response_headers["etag"]
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+        modified = parsedate_to_datetime(response_headers["last-modified"])
+    except (TypeError, ValueError):
+        return False
+    return modified <= since
+
+
+def media_response(
+    file_path: Path, filename: str, size: str, request_headers: Headers
+) -> Response:
+    """Ответ с файлом медиа. Путь блоба - хэш содержимого, поэтому файл по
+    этому адресу не меняется и кэшируется навсегда. Исключение - оригинал,
+    отданный вместо ещё не созданной копии: его кэш короткий.
+    С ACCEL_REDIRECT_PREFIX файл отдаёт прокси (nginx X-Accel-Redirect),
+    приложение только проверяет путь и выбирает копию"""
+    exact = file_path.name == Path(variant_name(filename, size)).name
+    headers = {
+        "Cache-Control": (
+            f"public, max-age={settings.MEDIA.CACHE_MAX_AGE}, immutable"
+            if exact
+            else "public, max-age=60"
+        )
+    }
+
+    if settings.MEDIA.ACCEL_REDIRECT_PREFIX:
+        relative = file_path.relative_to(settings.MEDIA.upload_dir.resolve())
+        headers["X-Accel-Redirect"] = quote(
+            settings.MEDIA.ACCEL_REDIRECT_PREFIX + relative.as_posix()
+        )
+        return Response(headers=headers)
+
+    response = MediaFileResponse(
+        file_path, headers=headers, stat_result=file_path.stat()
+    )
+    if is_not_modified(response.headers, request_headers):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={
+                name: response.headers[name]
+                for name in ("cache-control", "etag", "last-modified")
+            },
+        )
+    return response
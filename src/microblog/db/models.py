@@ -1,11 +1,25 @@
-import os
 from datetime import UTC, datetime
 from typing import Optional
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Table, Text
+from sqlalchemy import (
+    DDL,
+    JSON,
+    BigInteger,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Table,
+    Text,
+    event,
+    text,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from microblog.config import settings
+from microblog.core.search import TS_CONFIG
 from microblog.db.base import Base
 
 
@@ -15,6 +29,8 @@ class User(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(50))
     api_key: Mapped[str] = mapped_column(String(100), unique=True, index=True)
+    # Денормализованный счётчик подписчиков, поддерживается follow/unfollow_user
+    followers_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
 
     tweets: Mapped[list["Tweet"]] = relationship(
         back_populates="author",
@@ -44,10 +60,19 @@ class User(Base):
 
 class Tweet(Base):
     __tablename__ = "tweets"
+    __table_args__ = (
+        Index("ix_tweets_created_at_id", "created_at", "id"),
+        # Последние твиты автора: подмешивание и дозаполнение домашней ленты
+        Index("ix_tweets_author_id_id", "author_id", "id"),
+        # Ключ сортировки ленты по популярности, по нему идёт keyset-пагинация
+        Index("ix_tweets_like_count_created_at_id", "like_count", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     content: Mapped[str] = mapped_column(Text)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now(UTC))
+    # Денормализованный счётчик лайков, поддерживается like/unlike_tweet
+    like_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
 
     author_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
 
@@ -62,14 +87,35 @@ class Tweet(Base):
     )
 
 
+# Поисковый вектор tweets.search_vector существует только в PostgreSQL и не
+# отображается в модели: SQLite не знает tsvector, а ORM незачем его читать.
+# Запросы обращаются к столбцу по имени, в SQLite поиск идёт по индексу в памяти
+for statement in (
+    "ALTER TABLE tweets ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+    f"(to_tsvector('{TS_CONFIG}', content)) STORED",
+    "CREATE INDEX ix_tweets_search_vector ON tweets USING gin (search_vector)",
+):
+    event.listen(
+        Tweet.__table__,
+        "after_create",
+        DDL(statement).execute_if(dialect="postgresql"),
+    )
+
+
 class Media(Base):
     __tablename__ = "medias"
 
     id: Mapped[int] = mapped_column(primary_key=True)
     path: Mapped[str] = mapped_column(String(300))
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    # sha256 содержимого: одинаковые файлы хранятся одним блобом,
+    # число ссылок на блоб - число строк medias с этим хэшем
+    content_hash: Mapped[str | None] = mapped_column(String(64), index=True)
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), index=True
+    )
+    # Вложения твита агрегируются в ленте коррелированным подзапросом по tweet_id
     tweet_id: Mapped[int | None] = mapped_column(
-        ForeignKey("tweets.id", ondelete="CASCADE")
+        ForeignKey("tweets.id", ondelete="CASCADE"), index=True
     )
 
     user: Mapped["User"] = relationship()
@@ -79,7 +125,32 @@ class Media(Base):
 
     @property
     def url(self) -> str:
-        return f"{settings.MEDIA.MEDIA_URL}{os.path.basename(self.path)}"
+        return f"{settings.MEDIA.MEDIA_URL}{self.path}"
+
+
+class Job(Base):
+    """Фоновая задача: добавляется в транзакции запроса и видна воркеру после
+    коммита. run_at - когда задачу можно взять; взятая задача сдвигается на
+    LEASE_SECONDS вперёд, и упавший воркер не теряет её"""
+
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index(
+            "ix_jobs_run_at",
+            "run_at",
+            postgresql_where=text("failed_at IS NULL"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    kind: Mapped[str] = mapped_column(String(100))
+    payload: Mapped[dict] = mapped_column(JSON)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    run_at: Mapped[datetime] = mapped_column(DateTime)
+    created_at: Mapped[datetime] = mapped_column(DateTime)
+    last_error: Mapped[str | None] = mapped_column(Text)
+    # Задачи, исчерпавшие попытки, остаются в таблице для разбора
+    failed_at: Mapped[datetime | None] = mapped_column(DateTime)
 
 
 user_followers_association = Table(
@@ -102,6 +173,8 @@ user_followers_association = Table(
         DateTime(timezone=True),
         default=datetime.now(UTC),
     ),
+    # Обратная сторона связи: подписчики пользователя и раскладка твита по лентам
+    Index("ix_user_followers_following_id_follower_id", "following_id", "follower_id"),
 )
 
 tweet_like_association = Table(
@@ -124,4 +197,34 @@ tweet_like_association = Table(
         DateTime(timezone=True),
         default=datetime.now(UTC),
     ),
+    Index("ix_tweet_likes_tweet_id", "tweet_id"),
+)
+
+# Материализованная домашняя лента: твиты авторов, на которых подписан user_id.
+# score - ранг записи в ленте, сейчас это id твита (хронологический порядок)
+home_timeline_table = Table(
+    "home_timeline",
+    Base.metadata,
+    Column(
+        "user_id",
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    Column(
+        "tweet_id",
+        Integer,
+        ForeignKey("tweets.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    Column(
+        "author_id",
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    ),
+    Column("score", BigInteger, nullable=False),
+    Index("ix_home_timeline_user_id_score_tweet_id", "user_id", "score", "tweet_id"),
+    Index("ix_home_timeline_user_id_author_id", "user_id", "author_id"),
+    Index("ix_home_timeline_tweet_id", "tweet_id"),
 )
@@ -2,10 +2,13 @@ import uvicorn
 
 from microblog.app import create_app
 from microblog.config import settings
+from microblog.core.metrics import prepare_multiprocess_dir
 
 app = create_app()
 
 if __name__ == "__main__":
+    # Воркеры пишут метрики в общий каталог, /metrics любого воркера их суммирует
+    prepare_multiprocess_dir(settings.UVICORN.WORKERS)
     uvicorn.run(
         "microblog.main:app",
         host=settings.UVICORN.HOST,
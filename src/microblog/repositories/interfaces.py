@@ -1,28 +1,53 @@
 from abc import ABC, abstractmethod
-from typing import List
 
 from fastapi import UploadFile
 
-from microblog.db.models import User, Tweet
+from microblog.api.schemas import AuthUserSchema
 
 
 class IUserRepository(ABC):
     """Интерфейс для работы с пользователями (бизнес-уровень)"""
 
     @abstractmethod
-    async def get_user_by_api_key(self, api_key: str) -> User | None:
+    async def get_user_by_api_key(self, api_key: str) -> AuthUserSchema | None:
         pass
 
     @abstractmethod
-    async def get_user_profile(self, user_id: int) -> User | None:
+    async def get_user_profile(
+        self, user_id: int, viewer: AuthUserSchema | None = None
+    ) -> dict | None:
         pass
 
     @abstractmethod
-    async def follow_user(self, user: User, target_user_id: int) -> bool:
+    async def get_followers(
+        self, user_id: int, cursor: str | None, limit: int
+    ) -> tuple[list[dict], str | None]:
         pass
 
     @abstractmethod
-    async def unfollow_user(self, user: User, target_user_id: int) -> bool:
+    async def get_following(
+        self, user_id: int, cursor: str | None, limit: int
+    ) -> tuple[list[dict], str | None]:
+        pass
+
+    @abstractmethod
+    async def follow_user(self, user: AuthUserSchema, target_user_id: int) -> bool:
+        pass
+
+    @abstractmethod
+    async def unfollow_user(self, user: AuthUserSchema, target_user_id: int) -> bool:
+        pass
+
+    @abstractmethod
+    async def follow_users(
+        self, user: AuthUserSchema, target_user_ids: list[int]
+    ) -> list[int]:
+        pass
+
+    @abstractmethod
+    async def unfollow_users(
+        self, user: AuthUserSchema, target_user_ids: list[int]
+    ) -> list[int]:
         pass
 
 
@@ -30,23 +55,56 @@ class ITweetRepository(ABC):
     """Интерфейс для работы с твитами (бизнес-уровень)"""
 
     @abstractmethod
-    async def create_tweet(self, user: User, data: str, media_ids: list[int] | None = None) -> int:
+    async def create_tweet(
+        self, user: AuthUserSchema, data: str, media_ids: list[int] | None = None
+    ) -> int:
+        pass
+
+    @abstractmethod
+    async def get_tweets(
+        self,
+        user: AuthUserSchema,
+        all_tweets: bool,
+        cursor: str | None,
+        limit: int,
+        with_likes: bool = True,
+    ) -> tuple[list[dict], str | None]:
+        pass
+
+    @abstractmethod
+    async def get_tweets_by_ids(
+        self, tweet_ids: list[int], with_likes: bool = True
+    ) -> list[dict]:
+        pass
+
+    @abstractmethod
+    async def search_tweets(
+        self, query: str, cursor: str | None, limit: int, with_likes: bool = True
+    ) -> tuple[list[dict], str | None]:
+        pass
+
+    @abstractmethod
+    async def delete_tweet(self, user: AuthUserSchema, tweet_id: int) -> bool:
         pass
 
     @abstractmethod
-    async def get_tweets(self, user: User, all_tweets: bool) -> List[Tweet]:
+    async def like_tweet(self, user: AuthUserSchema, tweet_id: int) -> bool:
         pass
 
     @abstractmethod
-    async def delete_tweet(self, user: User, tweet_id: int) -> bool:
+    async def unlike_tweet(self, user: AuthUserSchema, tweet_id: int) -> bool:
         pass
 
     @abstractmethod
-    async def like_tweet(self, user: User, tweet_id: int) -> bool:
+    async def like_tweets(
+        self, user: AuthUserSchema, tweet_ids: list[int]
+    ) -> list[int]:
         pass
 
     @abstractmethod
-    async def unlike_tweet(self, user: User, tweet_id: int) -> bool:
+    async def unlike_tweets(
+        self, user: AuthUserSchema, tweet_ids: list[int]
+    ) -> list[int]:
         pass
 
 
@@ -54,5 +112,5 @@ class IMediaRepository(ABC):
     """Интерфейс для работы с медиа (бизнес-уровень)"""
 
     @abstractmethod
-    async def upload_media(self, user: User, file: UploadFile) -> int:
+    async def upload_media(self, user: AuthUserSchema, file: UploadFile) -> int | None:
         pass
@@ -1,15 +1,55 @@
+from collections.abc import Sequence
 from datetime import datetime
-from typing import TypeVar, List
+from functools import partial
+from typing import Any, TypeVar
 
-import aiofiles
 from fastapi import UploadFile
-from sqlalchemy import select
+from sqlalchemy import (
+    JSON,
+    Column,
+    ColumnClause,
+    ColumnElement,
+    Row,
+    Select,
+    Table,
+    any_,
+    bindparam,
+    cast,
+    delete,
+    func,
+    insert,
+    literal,
+    literal_column,
+    null,
+    select,
+    tuple_,
+    union,
+    update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import InstrumentedAttribute, aliased
 
-from microblog.api.schemas import TweetShemaOut
+from microblog.api.schemas import AuthUserSchema
 from microblog.config import settings
-from microblog.db.models import Media, Tweet, User
+from microblog.core.jobs import BUILD_VARIANTS, COLLECT_BLOB, FAN_OUT, enqueue
+from microblog.core.pagination import (
+    decode_cursor,
+    encode_cursor,
+    parse_cursor_datetime,
+    parse_cursor_float,
+    parse_cursor_int,
+)
+from microblog.core.search import TS_CONFIG, combined_score, search_index
+from microblog.core.storage import save_upload
+from microblog.db.models import (
+    Media,
+    Tweet,
+    User,
+    home_timeline_table,
+    tweet_like_association,
+    user_followers_association,
+)
 from microblog.logger import get_logger
 from microblog.repositories.interfaces import (
     IMediaRepository,
@@ -22,6 +62,65 @@ T = TypeVar("T")
 logger = get_logger(__name__)
 
 
+def insert_ignore(
+    session: AsyncSession, table: Table, columns: list[str], source: Select
+) -> postgresql.Insert | sqlite.Insert:
+    """INSERT ... SELECT ... ON CONFLICT DO NOTHING в диалекте текущей БД.
+    Строки, уже существующие по первичному ключу, пропускаются без ошибки"""
+    stmt: postgresql.Insert | sqlite.Insert
+    if session.get_bind().dialect.name == "postgresql":
+        stmt = postgresql.insert(table)
+    else:
+        stmt = sqlite.insert(table)
+
+    return stmt.from_select(columns, source).on_conflict_do_nothing()
+
+
+def match_any(
+    session: AsyncSession, column: InstrumentedAttribute[int], values: list[int]
+) -> ColumnElement[bool]:
+    """column = ANY(:values) в PostgreSQL: один параметр-массив для списка
+    любой длины, т.е. одно подготовленное выражение в кэше asyncpg.
+    В остальных БД - обычный IN (...)"""
+    if session.get_bind().dialect.name == "postgresql":
+        array = bindparam(None, values, type_=postgresql.ARRAY(column.type))
+        return column == any_(array)
+
+    return column.in_(values)
+
+
+async def bulk_insert(
+    session: AsyncSession, table: Table, columns: list[str], records: list[tuple]
+) -> None:
+    """Массовая вставка кортежей: COPY в PostgreSQL (asyncpg), executemany
+    в остальных БД. Выполняется в текущей транзакции сессии"""
+    if session.get_bind().dialect.name == "postgresql":
+        connection = await session.connection()
+        raw = await connection.get_raw_connection()
+        driver = raw.driver_connection
+        if driver is None:
+            raise RuntimeError("Соединение asyncpg уже закрыто")
+        await driver.copy_records_to_table(table.name, records=records, columns=columns)
+        return
+
+    await session.execute(
+        insert(table),
+        [dict(zip(columns, record, strict=True)) for record in records],
+    )
+
+
+async def lock_content(session: AsyncSession, content_hash: str) -> None:
+    """Блокировка содержимого медиа до конца транзакции session.
+    Загрузка и сборка блобов с тем же хэшем выполняются по очереди: сборщик
+    не удалит файл между проверкой его наличия загрузкой и вставкой её строки.
+    В PostgreSQL - advisory-блокировка по хэшу, в SQLite (тесты и dev)
+    блокировок нет"""
+    if session.get_bind().dialect.name == "postgresql":
+        await session.execute(
+            select(func.pg_advisory_xact_lock(func.hashtextextended(content_hash, 0)))
+        )
+
+
 class BaseRepository[T]:
     """Базовый абстрактный класс для взаимодействия модели и БД"""
 
@@ -53,74 +152,441 @@ class BaseRepository[T]:
         return True
 
 
+class HomeTimelineRepository:
+    """Репозиторий материализованной домашней ленты (fan-out-on-write).
+    Твиты авторов с числом подписчиков выше FANOUT_FOLLOWERS_THRESHOLD
+    не раскладываются по лентам, а подмешиваются при чтении (fan-out-on-read)"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.threshold = settings.FEED.FANOUT_FOLLOWERS_THRESHOLD
+
+    async def _is_celebrity(self, author_id: int) -> bool:
+        followers_count = await self.session.scalar(
+            select(User.followers_count).where(User.id == author_id)
+        )
+        return (followers_count or 0) > self.threshold
+
+    async def fan_out(self, author_id: int, tweet_id: int) -> None:
+        """Раскладка нового твита по лентам подписчиков автора одним запросом.
+        Твит берётся из tweets: удалённый до запуска задачи не даёт строк.
+        Записи, уже добавленные backfill_author при гонке с подпиской,
+        пропускаются"""
+        if await self._is_celebrity(author_id):
+            logger.debug(f"Твит {tweet_id} будет подмешан в ленты при чтении")
+            return
+
+        await self.session.execute(
+            insert_ignore(
+                self.session,
+                home_timeline_table,
+                ["user_id", "tweet_id", "author_id", "score"],
+                select(
+                    user_followers_association.c.follower_id,
+                    Tweet.id,
+                    Tweet.author_id,
+                    Tweet.id,
+                )
+                .join(
+                    user_followers_association,
+                    user_followers_association.c.following_id == Tweet.author_id,
+                )
+                .where(Tweet.id == tweet_id),
+            )
+        )
+        logger.debug(f"Твит {tweet_id} разложен по лентам подписчиков")
+
+    async def backfill_author(self, user_id: int, author_id: int) -> None:
+        """Добавление последних твитов автора в ленту нового подписчика"""
+        if await self._is_celebrity(author_id):
+            return
+
+        latest = (
+            select(literal(user_id), Tweet.id, Tweet.author_id, Tweet.id)
+            .where(Tweet.author_id == author_id)
+            .order_by(Tweet.id.desc())
+            .limit(settings.FEED.HOME_TIMELINE_BACKFILL)
+        )
+        await self.session.execute(
+            insert_ignore(
+                self.session,
+                home_timeline_table,
+                ["user_id", "tweet_id", "author_id", "score"],
+                latest,
+            )
+        )
+
+    async def backfill_authors(self, user_id: int, author_ids: Sequence[int]) -> None:
+        """Пакетный вариант backfill_author: последние твиты всех авторов
+        одной вставкой, ранжирование по автору оконной функцией"""
+        authors = (
+            await self.session.scalars(
+                select(User.id).where(
+                    User.id.in_(author_ids), User.followers_count <= self.threshold
+                )
+            )
+        ).all()
+        if not authors:
+            return
+
+        ranked = (
+            select(
+                Tweet.id,
+                Tweet.author_id,
+                func.row_number()
+                .over(partition_by=Tweet.author_id, order_by=Tweet.id.desc())
+                .label("position"),
+            )
+            .where(Tweet.author_id.in_(authors))
+            .subquery()
+        )
+        await self.session.execute(
+            insert_ignore(
+                self.session,
+                home_timeline_table,
+                ["user_id", "tweet_id", "author_id", "score"],
+                select(
+                    literal(user_id), ranked.c.id, ranked.c.author_id, ranked.c.id
+                ).where(ranked.c.position <= settings.FEED.HOME_TIMELINE_BACKFILL),
+            )
+        )
+
+    async def retract_tweet(self, tweet_id: int) -> None:
+        """Удаление твита из всех лент"""
+        await self.session.execute(
+            delete(home_timeline_table).where(
+                home_timeline_table.c.tweet_id == tweet_id
+            )
+        )
+
+    async def retract_author(self, user_id: int, author_id: int) -> None:
+        """Удаление твитов автора из ленты отписавшегося пользователя"""
+        await self.session.execute(
+            delete(home_timeline_table).where(
+                home_timeline_table.c.user_id == user_id,
+                home_timeline_table.c.author_id == author_id,
+            )
+        )
+
+    async def retract_authors(self, user_id: int, author_ids: Sequence[int]) -> None:
+        """Удаление твитов нескольких авторов из ленты одним запросом"""
+        await self.session.execute(
+            delete(home_timeline_table).where(
+                home_timeline_table.c.user_id == user_id,
+                home_timeline_table.c.author_id.in_(author_ids),
+            )
+        )
+
+    async def get_page(
+        self, user_id: int, cursor: str | None, limit: int
+    ) -> tuple[list[int], str | None]:
+        """Страница id твитов домашней ленты: диапазонное чтение по индексу
+        (user_id, score, tweet_id) плюс свежие твиты авторов-знаменитостей"""
+        materialized = select(
+            home_timeline_table.c.tweet_id, home_timeline_table.c.score
+        ).where(home_timeline_table.c.user_id == user_id)
+
+        # Знаменитостей среди подписок единицы, их id выбираются отдельно:
+        # с подзапросом в IN планировщик обходит все твиты по убыванию id
+        celebrity_ids = (
+            await self.session.scalars(
+                select(user_followers_association.c.following_id)
+                .join(User, User.id == user_followers_association.c.following_id)
+                .where(
+                    user_followers_association.c.follower_id == user_id,
+                    User.followers_count > self.threshold,
+                )
+            )
+        ).all()
+        pulled = select(Tweet.id.label("tweet_id"), Tweet.id.label("score")).where(
+            Tweet.author_id.in_(celebrity_ids)
+        )
+
+        if cursor:
+            last_score, last_id = decode_cursor(cursor, size=2)
+            boundary = tuple_(
+                literal(parse_cursor_int(last_score)),
+                literal(parse_cursor_int(last_id)),
+            )
+            materialized = materialized.where(
+                tuple_(home_timeline_table.c.score, home_timeline_table.c.tweet_id)
+                < boundary
+            )
+            pulled = pulled.where(tuple_(Tweet.id, Tweet.id) < boundary)
+
+        page = materialized.order_by(
+            home_timeline_table.c.score.desc(), home_timeline_table.c.tweet_id.desc()
+        ).limit(limit + 1)
+
+        if celebrity_ids:
+            pulled_page = pulled.order_by(Tweet.id.desc()).limit(limit + 1)
+            # union убирает дубли твитов автора, ставшего знаменитостью
+            candidates = union(
+                select(page.subquery()), select(pulled_page.subquery())
+            ).subquery()
+            page = (
+                select(candidates.c.tweet_id, candidates.c.score)
+                .order_by(candidates.c.score.desc(), candidates.c.tweet_id.desc())
+                .limit(limit + 1)
+            )
+
+        rows = (await self.session.execute(page)).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].score, rows[-1].tweet_id)
+
+        return [row.tweet_id for row in rows], next_cursor
+
+
 class UserRepository(BaseRepository[User], IUserRepository):
     """Репозиторий взаимодействия Пользователя с БД"""
 
     def __init__(self, session: AsyncSession):
         super().__init__(session, User)
+        self.timeline_repo = HomeTimelineRepository(session)
 
-    async def get_user_by_api_key(self, api_key) -> User | None:
-        """Получение из БД информации о валидности ключа доступа пользователя"""
+    async def get_user_by_api_key(self, api_key) -> AuthUserSchema | None:
+        """Получение из БД информации о валидности ключа доступа пользователя,
+        загружаются только колонки, нужные ручкам"""
         if not api_key:
             return None
 
         result = await self.session.execute(
-            select(User)
-            .options(selectinload(User.followers), selectinload(User.following))
-            .where(User.api_key == api_key)
+            select(User.id, User.name).where(User.api_key == api_key)
         )
         logger.debug("Запрос пользователя по ключу к БД")
 
-        return result.scalar_one_or_none()
-
-    async def get_user_profile(self, user_id: int) -> User | None:
-        """Получение из БД подробной информации по пользователю"""
-        result = await self.session.execute(
-            select(User)
-            .options(
-                selectinload(User.followers),
-                selectinload(User.following),
-                selectinload(User.tweets),
-                selectinload(User.liked_tweets),
-            )
-            .where(User.id == user_id)
+        row = result.one_or_none()
+        return AuthUserSchema(id=row.id, name=row.name) if row else None
+
+    async def get_user_profile(
+        self, user_id: int, viewer: AuthUserSchema | None = None
+    ) -> dict | None:
+        """Профиль пользователя: только колонки и счётчики, из связей -
+        первые PROFILE_PREVIEW_LIMIT подписчиков и подписок.
+        Подписанный зритель всегда попадает в превью подписчиков,
+        по нему фронт определяет состояние кнопки подписки"""
+        following_count = (
+            select(func.count())
+            .select_from(user_followers_association)
+            .where(user_followers_association.c.follower_id == User.id)
+            .correlate(User)
+            .scalar_subquery()
         )
+        row = (
+            await self.session.execute(
+                select(
+                    User.id,
+                    User.name,
+                    User.followers_count,
+                    following_count.label("following_count"),
+                ).where(User.id == user_id)
+            )
+        ).one_or_none()
         logger.debug("Запрос пользователя по ID к БД")
+        if row is None:
+            return None
 
-        return result.scalar_one_or_none()
+        limit = settings.USERS.PROFILE_PREVIEW_LIMIT
+        followers, _ = await self.get_followers(user_id, None, limit)
+        following, _ = await self.get_following(user_id, None, limit)
+
+        if (
+            viewer is not None
+            and viewer.id != user_id
+            and all(follower["id"] != viewer.id for follower in followers)
+            and await self._is_following(viewer.id, user_id)
+        ):
+            followers.insert(0, {"id": viewer.id, "name": viewer.name})
+
+        return {
+            "id": row.id,
+            "name": row.name,
+            "followers_count": row.followers_count,
+            "following_count": row.following_count,
+            "followers": followers,
+            "following": following,
+        }
+
+    async def get_followers(
+        self, user_id: int, cursor: str | None, limit: int
+    ) -> tuple[list[dict], str | None]:
+        """Страница подписчиков пользователя по индексу (following_id, follower_id)"""
+        return await self._get_follows_page(
+            user_followers_association.c.following_id,
+            user_followers_association.c.follower_id,
+            user_id,
+            cursor,
+            limit,
+        )
+
+    async def get_following(
+        self, user_id: int, cursor: str | None, limit: int
+    ) -> tuple[list[dict], str | None]:
+        """Страница подписок пользователя
+        по первичному ключу (follower_id, following_id)"""
+        return await self._get_follows_page(
+            user_followers_association.c.follower_id,
+            user_followers_association.c.following_id,
+            user_id,
+            cursor,
+            limit,
+        )
+
+    async def _get_follows_page(
+        self,
+        owner_column: Column,
+        other_column: Column,
+        user_id: int,
+        cursor: str | None,
+        limit: int,
+    ) -> tuple[list[dict], str | None]:
+        """Keyset-страница связей пользователя в порядке id второй стороны"""
+        query = (
+            select(User.id, User.name)
+            .join(user_followers_association, other_column == User.id)
+            .where(owner_column == user_id)
+        )
+        if cursor:
+            (last_id,) = decode_cursor(cursor, size=1)
+            query = query.where(other_column > parse_cursor_int(last_id))
+
+        rows = (
+            await self.session.execute(query.order_by(other_column).limit(limit + 1))
+        ).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].id)
+
+        return [{"id": row.id, "name": row.name} for row in rows], next_cursor
+
+    async def _is_following(self, follower_id: int, following_id: int) -> bool:
+        """Проверка подписки по первичному ключу user_followers"""
+        return bool(
+            await self.session.scalar(
+                select(literal(True)).where(
+                    user_followers_association.c.follower_id == follower_id,
+                    user_followers_association.c.following_id == following_id,
+                )
+            )
+        )
 
-    async def follow_user(self, user: User, target_user_id: int) -> bool:
-        """Получение из БД пользователя, подписка"""
-        await self.session.refresh(user, ["following", "followers"])
-        target_user = await self.get_by_id(target_user_id)
-        if not target_user or user.id == target_user.id:
+    async def follow_user(self, user: AuthUserSchema, target_user_id: int) -> bool:
+        """Подписка одной вставкой в user_followers без загрузки списков подписок.
+        Повторная подписка и гонка двойного клика гасятся ON CONFLICT DO NOTHING"""
+        if user.id == target_user_id:
             return False
 
-        if target_user in user.following:
+        target = select(literal(user.id), User.id).where(User.id == target_user_id)
+        followed = await self.session.scalar(
+            insert_ignore(
+                self.session,
+                user_followers_association,
+                ["follower_id", "following_id"],
+                target,
+            ).returning(user_followers_association.c.following_id)
+        )
+        if followed is None:
             return False
 
-        user.following.append(target_user)
+        await self._change_followers_count([target_user_id], 1)
+        await self.timeline_repo.backfill_author(user.id, target_user_id)
 
         await self.session.commit()
-        logger.debug(f"{user.name} подписался на {target_user.name}")
+        logger.debug(f"{user.name} подписался на {target_user_id}")
 
         return True
 
-    async def unfollow_user(self, user: User, target_user_id: int) -> bool:
-        """Получение из БД пользователя, отписка"""
-        await self.session.refresh(user, ["following", "followers"])
-        target_user = await self.get_by_id(target_user_id)
-        if not target_user or user.id == target_user.id:
-            return False
-        if target_user in user.followers:
+    async def unfollow_user(self, user: AuthUserSchema, target_user_id: int) -> bool:
+        """Отписка одним DELETE ... RETURNING: счётчик и лента меняются,
+        только если связь действительно была удалена этим запросом"""
+        unfollowed = await self.session.scalar(
+            delete(user_followers_association)
+            .where(
+                user_followers_association.c.follower_id == user.id,
+                user_followers_association.c.following_id == target_user_id,
+            )
+            .returning(user_followers_association.c.following_id)
+        )
+        if unfollowed is None:
             return False
-        user.following.remove(target_user)
+
+        await self._change_followers_count([target_user_id], -1)
+        await self.timeline_repo.retract_author(user.id, target_user_id)
 
         await self.session.commit()
-        logger.debug(f"{user.name} отписался от {target_user.name}")
+        logger.debug(f"{user.name} отписался от {target_user_id}")
 
         return True
 
+    async def follow_users(
+        self, user: AuthUserSchema, target_user_ids: list[int]
+    ) -> list[int]:
+        """Пакетная подписка в одной транзакции: одна вставка для всех
+        существующих пользователей, счётчики и ленты - по реально добавленным"""
+        targets = select(literal(user.id), User.id).where(
+            User.id.in_(target_user_ids), User.id != user.id
+        )
+        followed = (
+            await self.session.scalars(
+                insert_ignore(
+                    self.session,
+                    user_followers_association,
+                    ["follower_id", "following_id"],
+                    targets,
+                ).returning(user_followers_association.c.following_id)
+            )
+        ).all()
+        if not followed:
+            return []
+
+        await self._change_followers_count(followed, 1)
+        await self.timeline_repo.backfill_authors(user.id, followed)
+
+        await self.session.commit()
+        logger.debug(f"{user.name} подписался на {len(followed)} пользователей")
+
+        return sorted(followed)
+
+    async def unfollow_users(
+        self, user: AuthUserSchema, target_user_ids: list[int]
+    ) -> list[int]:
+        """Пакетная отписка одним DELETE ... RETURNING в одной транзакции"""
+        unfollowed = (
+            await self.session.scalars(
+                delete(user_followers_association)
+                .where(
+                    user_followers_association.c.follower_id == user.id,
+                    user_followers_association.c.following_id.in_(target_user_ids),
+                )
+                .returning(user_followers_association.c.following_id)
+            )
+        ).all()
+        if not unfollowed:
+            return []
+
+        await self._change_followers_count(unfollowed, -1)
+        await self.timeline_repo.retract_authors(user.id, unfollowed)
+
+        await self.session.commit()
+        logger.debug(f"{user.name} отписался от {len(unfollowed)} пользователей")
+
+        return sorted(unfollowed)
+
+    async def _change_followers_count(
+        self, user_ids: Sequence[int], delta: int
+    ) -> None:
+        """Атомарное изменение счётчиков подписчиков в транзакции подписки"""
+        await self.session.execute(
+            update(User)
+            .where(User.id.in_(user_ids))
+            .values(followers_count=User.followers_count + delta)
+        )
+
 
 class TweetRepository(BaseRepository[Tweet], ITweetRepository):
     """Репозиторий взаимодействия Твита с БД"""
@@ -128,106 +594,462 @@ class TweetRepository(BaseRepository[Tweet], ITweetRepository):
     def __init__(self, session: AsyncSession):
         super().__init__(session, Tweet)
         self.user_repo = UserRepository(session)
+        self.timeline_repo = HomeTimelineRepository(session)
 
     async def create_tweet(
-            self,
-            user: User,
-            data: str,
-            media_ids: list[int] | None = None
+        self, user: AuthUserSchema, data: str, media_ids: list[int] | None = None
     ) -> int:
-        """Создание твита в БД"""
-        tweet: Tweet = await self.create(
-            content=data, created_at=datetime.now(), author_id=user.id
-        )
-
-        self.session.add(tweet)
-        await self.session.flush()
+        """Создание твита в БД: INSERT ... RETURNING id и одно UPDATE для всех
+        вложений. Прикрепляются только свои, ещё не прикреплённые медиа.
+        Раскладка по лентам подписчиков - фоновой задачей после коммита"""
+        tweet_id = (
+            await self.session.execute(
+                insert(Tweet)
+                .values(content=data, created_at=datetime.now(), author_id=user.id)
+                .returning(Tweet.id)
+            )
+        ).scalar_one()
 
         if media_ids:
-            for media_id in media_ids:
-                media = await self.session.get(Media, media_id)
-                if media:
-                    media.tweet_id = tweet.id
+            await self.session.execute(
+                update(Media)
+                .where(
+                    match_any(self.session, Media.id, media_ids),
+                    Media.user_id == user.id,
+                    Media.tweet_id.is_(None),
+                )
+                .values(tweet_id=tweet_id)
+            )
 
-        await self.session.commit()
-        logger.debug(f"{user.name} опубликовал твит: {tweet.id}")
+        await enqueue(
+            self.session, FAN_OUT, {"author_id": user.id, "tweet_id": tweet_id}
+        )
 
-        return tweet.id
+        await self.session.commit()
+        logger.debug(f"{user.name} опубликовал твит: {tweet_id}")
+
+        return tweet_id
+
+    async def bulk_create_tweets(self, tweets: list[dict]) -> int:
+        """Массовая вставка твитов для миграций и нагрузочных тестов:
+        COPY в PostgreSQL, executemany в остальных БД.
+        Словари с ключами content, author_id, created_at и like_count (опционально).
+        Ленты подписчиков не заполняются, см. fan_out_imported"""
+        if not tweets:
+            return 0
+
+        columns = ["content", "author_id", "created_at", "like_count"]
+        records = [
+            (
+                tweet["content"],
+                tweet["author_id"],
+                tweet.get("created_at") or datetime.now(),
+                tweet.get("like_count", 0),
+            )
+            for tweet in tweets
+        ]
 
-    async def get_tweets(self, user: User, all_tweets: bool) -> List[TweetShemaOut]:
-        """Получение серриализованного списка твитов из БД,
-        его сортировка по подписчикам при all_tweets=False"""
-        query = select(Tweet).options(
-            selectinload(Tweet.author),
-            selectinload(Tweet.attachments),
-            selectinload(Tweet.likes),
+        tweets_table = Tweet.metadata.tables[Tweet.__tablename__]
+        await bulk_insert(self.session, tweets_table, columns, records)
+        await self.session.commit()
+        logger.debug(f"Импортировано твитов: {len(records)}")
+
+        return len(records)
+
+    async def fan_out_imported(self, after_id: int) -> None:
+        """Раскладка импортированных твитов (id > after_id) по лентам подписчиков
+        одной вставкой, твиты знаменитостей подмешиваются при чтении.
+        Записи, уже добавленные подписками во время импорта, пропускаются"""
+        await self.session.execute(
+            insert_ignore(
+                self.session,
+                home_timeline_table,
+                ["user_id", "tweet_id", "author_id", "score"],
+                select(
+                    user_followers_association.c.follower_id,
+                    Tweet.id,
+                    Tweet.author_id,
+                    Tweet.id,
+                )
+                .join(
+                    user_followers_association,
+                    user_followers_association.c.following_id == Tweet.author_id,
+                )
+                .join(User, User.id == Tweet.author_id)
+                .where(
+                    Tweet.id > after_id,
+                    User.followers_count <= self.timeline_repo.threshold,
+                ),
+            )
         )
+        await self.session.commit()
+
+    async def get_last_tweet_id(self) -> int:
+        """Наибольший id твита, граница для fan_out_imported"""
+        return await self.session.scalar(select(func.max(Tweet.id))) or 0
+
+    async def get_tweets(
+        self,
+        user: AuthUserSchema,
+        all_tweets: bool,
+        cursor: str | None,
+        limit: int,
+        with_likes: bool = True,
+    ) -> tuple[list[dict], str | None]:
+        """Получение страницы твитов из БД в виде словарей ответа.
+        При all_tweets=True - общая лента: сортировка (лайки, дата, id)
+        и keyset-пагинация выполняются в SQL.
+        При all_tweets=False - домашняя лента из материализованного home_timeline.
+        Список лайкнувших загружается только при with_likes=True"""
+        query = self._feed_projection(with_likes)
 
         if not all_tweets:
-            following_ids = [followed.id for followed in user.following]
-            if not following_ids:
-                tweets_shema: list = []
-                return tweets_shema
+            tweet_ids, next_cursor = await self.timeline_repo.get_page(
+                user.id, cursor, limit
+            )
+            if not tweet_ids:
+                return [], None
+
+            by_id = {
+                row.id: row
+                for row in await self.session.execute(
+                    query.where(Tweet.id.in_(tweet_ids))
+                )
+            }
+            rows = [by_id[tweet_id] for tweet_id in tweet_ids if tweet_id in by_id]
+        else:
+            rows, next_cursor = await self._get_global_page(query, cursor, limit)
 
-            query = query.where(Tweet.author_id.in_(following_ids))
+        logger.debug("Запрос пользователя твитов к БД")
 
-        tweets = (
-            (await self.session.execute(query.order_by(Tweet.created_at.desc())))
-            .scalars()
+        return self._to_dicts(rows), next_cursor
+
+    async def get_tweets_by_ids(
+        self, tweet_ids: list[int], with_likes: bool = True
+    ) -> list[dict]:
+        """Твиты по списку id одной выборкой, в порядке запрошенных id.
+        Несуществующие id пропускаются"""
+        query = self._feed_projection(with_likes).where(Tweet.id.in_(tweet_ids))
+        by_id = {row.id: row for row in await self.session.execute(query)}
+        logger.debug("Запрос твитов по id к БД")
+
+        # dict.fromkeys убирает повторы id, сохраняя порядок запроса
+        requested = dict.fromkeys(tweet_ids)
+        rows = [by_id[tweet_id] for tweet_id in requested if tweet_id in by_id]
+        return self._to_dicts(rows)
+
+    async def search_tweets(
+        self, query: str, cursor: str | None, limit: int, with_likes: bool = True
+    ) -> tuple[list[dict], str | None]:
+        """Полнотекстовый поиск твитов. Сортировка по релевантности, усиленной
+        числом лайков, keyset-пагинация по (вес, id).
+        PostgreSQL: websearch_to_tsquery по GIN-индексу tweets.search_vector,
+        остальные БД - инвертированный индекс в памяти процесса"""
+        boundary = None
+        if cursor:
+            last_score, last_id = decode_cursor(cursor, size=2)
+            boundary = (parse_cursor_float(last_score), parse_cursor_int(last_id))
+
+        if self.session.get_bind().dialect.name == "postgresql":
+            page = await self._search_page(query, boundary, limit)
+        else:
+            page = await self._search_page_in_memory(query, boundary, limit)
+        logger.debug("Поиск твитов в БД")
+
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_cursor(*page[-1])
+
+        tweets = await self.get_tweets_by_ids(
+            [tweet_id for _, tweet_id in page], with_likes=with_likes
+        )
+        return tweets, next_cursor
+
+    async def _search_page(
+        self, query: str, boundary: tuple[float, int] | None, limit: int
+    ) -> list[tuple[float, int]]:
+        """До limit + 1 пар (вес, id). Вес считается только для твитов,
+        отобранных по индексу, - без сканирования content"""
+        vector: ColumnClause[str] = literal_column("tweets.search_vector")
+        ts_query = func.websearch_to_tsquery(
+            cast(TS_CONFIG, postgresql.REGCONFIG), query
+        )
+        ranked = (
+            select(
+                Tweet.id,
+                (
+                    func.ts_rank(vector, ts_query) * (1 + func.ln(1 + Tweet.like_count))
+                ).label("score"),
+            )
+            .where(vector.op("@@")(ts_query))
+            .subquery()
+        )
+
+        page = select(ranked.c.score, ranked.c.id)
+        if boundary:
+            score, tweet_id = boundary
+            page = page.where(
+                tuple_(ranked.c.score, ranked.c.id)
+                < tuple_(literal(score), literal(tweet_id))
+            )
+        page = page.order_by(ranked.c.score.desc(), ranked.c.id.desc()).limit(limit + 1)
+        rows = await self.session.execute(page)
+        return [(score, tweet_id) for score, tweet_id in rows]
+
+    async def _search_page_in_memory(
+        self, query: str, boundary: tuple[float, int] | None, limit: int
+    ) -> list[tuple[float, int]]:
+        """Тот же отбор по индексу в памяти. Индекс дочитывает новые твиты,
+        лайки кандидатов берутся из БД, удалённые твиты выпадают из индекса"""
+        new_tweets = await self.session.execute(
+            select(Tweet.id, Tweet.content)
+            .where(Tweet.id > search_index.last_id)
+            .order_by(Tweet.id)
+        )
+        for tweet_id, content in new_tweets:
+            search_index.add(tweet_id, content)
+
+        ranks = search_index.search(query)
+        if not ranks:
+            return []
+
+        like_counts: dict[int, int] = dict(
+            (
+                await self.session.execute(
+                    select(Tweet.id, Tweet.like_count).where(
+                        match_any(self.session, Tweet.id, list(ranks))
+                    )
+                )
+            )
+            .tuples()
             .all()
         )
+        search_index.discard(ranks.keys() - like_counts.keys())
 
-        tweets_shema = [
-            TweetShemaOut.model_validate(tweet, from_attributes=True)
-            for tweet in tweets
+        scored = [
+            (combined_score(ranks[tweet_id], like_count), tweet_id)
+            for tweet_id, like_count in like_counts.items()
         ]
-        tweets_shema.sort(key=lambda t: len(t.likes), reverse=True)
-        logger.debug("Запрос пользователя твитов к БД")
+        if boundary:
+            scored = [key for key in scored if key < boundary]
+        return sorted(scored, reverse=True)[: limit + 1]
+
+    @staticmethod
+    def _to_dicts(rows) -> list[dict]:
+        """Строки проекции ленты в словари ответа"""
+        return [
+            {
+                "id": row.id,
+                "content": row.content,
+                "created_at": row.created_at,
+                "author": {"id": row.author_id, "name": row.author_name},
+                "attachments": row.attachments or [],
+                "likes": row.likes or [],
+                "like_count": row.like_count,
+            }
+            for row in rows
+        ]
+
+    def _feed_projection(self, with_likes: bool) -> Select:
+        """Запрос ленты одной выборкой: только нужные колонки, вложения и лайки
+        агрегируются в JSON на стороне БД (json_agg в PostgreSQL,
+        json_group_array в SQLite), без ORM-объектов"""
+        if self.session.get_bind().dialect.name == "postgresql":
+            json_agg, json_object = func.json_agg, func.json_build_object
+        else:
+            json_agg, json_object = func.json_group_array, func.json_object
+
+        attachments = (
+            select(json_agg(Media.path, type_=JSON))
+            .where(Media.tweet_id == Tweet.id)
+            .correlate(Tweet)
+            .scalar_subquery()
+        )
+        likes: ColumnElement[Any]
+        if with_likes:
+            liker = aliased(User)
+            likes = (
+                select(
+                    json_agg(
+                        json_object("id", liker.id, "name", liker.name), type_=JSON
+                    )
+                )
+                .select_from(tweet_like_association)
+                .join(liker, liker.id == tweet_like_association.c.user_id)
+                .where(tweet_like_association.c.tweet_id == Tweet.id)
+                .correlate(Tweet)
+                .scalar_subquery()
+            )
+        else:
+            likes = null()
+
+        return select(
+            Tweet.id,
+            Tweet.content,
+            Tweet.created_at,
+            Tweet.like_count,
+            User.id.label("author_id"),
+            User.name.label("author_name"),
+            attachments.label("attachments"),
+            likes.label("likes"),
+        ).join(User, User.id == Tweet.author_id)
+
+    async def _get_global_page(
+        self, query: Select, cursor: str | None, limit: int
+    ) -> tuple[list[Row], str | None]:
+        """Страница общей ленты по индексу (like_count, created_at, id)"""
+        if cursor:
+            last_likes, last_created_at, last_id = decode_cursor(cursor, size=3)
+            query = query.where(
+                tuple_(Tweet.like_count, Tweet.created_at, Tweet.id)
+                < tuple_(
+                    literal(parse_cursor_int(last_likes)),
+                    literal(parse_cursor_datetime(last_created_at)),
+                    literal(parse_cursor_int(last_id)),
+                )
+            )
+
+        query = query.order_by(
+            Tweet.like_count.desc(), Tweet.created_at.desc(), Tweet.id.desc()
+        ).limit(limit + 1)
+        rows = list((await self.session.execute(query)).all())
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_row = rows[-1]
+            next_cursor = encode_cursor(
+                last_row.like_count, last_row.created_at, last_row.id
+            )
 
-        return tweets_shema
+        return rows, next_cursor
 
-    async def delete_tweet(self, user: User, tweet_id: int) -> bool:
-        """Удаление твита из БД"""
+    async def delete_tweet(self, user: AuthUserSchema, tweet_id: int) -> bool:
+        """Удаление твита из БД и из домашних лент"""
         tweet = await self.get_by_id(tweet_id)
         if not tweet:
             return False
         logger.debug(f"Запрос {user.id} удаления твита {tweet_id} к БД")
+        if user.id != tweet.author_id:
+            return False
 
-        return await self.delete(tweet_id) if user.id == tweet.author_id else False
-
-    async def like_tweet(self, user: User, tweet_id: int) -> bool:
-        """Добавление записи о лайке в БД"""
-        await self.session.refresh(user, ["liked_tweets"])
-        tweet = await self.get_by_id(tweet_id)
+        attachments = (
+            await self.session.execute(
+                select(Media.path, Media.content_hash).where(
+                    Media.tweet_id == tweet_id, Media.content_hash.is_not(None)
+                )
+            )
+        ).all()
+
+        await self.timeline_repo.retract_tweet(tweet_id)
+        # Файлы без оставшихся ссылок удаляются фоновой задачей после коммита
+        for path, content_hash in attachments:
+            await enqueue(
+                self.session,
+                COLLECT_BLOB,
+                {"path": path, "content_hash": content_hash},
+            )
 
-        if not tweet:
-            return False
+        return await self.delete(tweet_id)
 
-        if tweet in user.liked_tweets:
+    async def like_tweet(self, user: AuthUserSchema, tweet_id: int) -> bool:
+        """Добавление лайка одной вставкой в tweet_likes, если твит существует.
+        Повторный лайк не меняет счётчик: ON CONFLICT DO NOTHING ничего не вернёт"""
+        tweet = select(literal(user.id), Tweet.id).where(Tweet.id == tweet_id)
+        liked = await self.session.scalar(
+            insert_ignore(
+                self.session, tweet_like_association, ["user_id", "tweet_id"], tweet
+            ).returning(tweet_like_association.c.tweet_id)
+        )
+        if liked is None:
             return False
 
-        user.liked_tweets.append(tweet)
+        await self._change_like_count([tweet_id], 1)
 
         await self.session.commit()
         logger.debug("Запрос доб-я лайка к БД")
 
         return True
 
-    async def unlike_tweet(self, user: User, tweet_id: int):
-        """Удаление записи по лайку из БД"""
-        await self.session.refresh(user, ["liked_tweets"])
-        tweet = await self.get_by_id(tweet_id)
-
-        if tweet not in user.liked_tweets:
+    async def unlike_tweet(self, user: AuthUserSchema, tweet_id: int) -> bool:
+        """Удаление лайка одним DELETE ... RETURNING"""
+        unliked = await self.session.scalar(
+            delete(tweet_like_association)
+            .where(
+                tweet_like_association.c.user_id == user.id,
+                tweet_like_association.c.tweet_id == tweet_id,
+            )
+            .returning(tweet_like_association.c.tweet_id)
+        )
+        if unliked is None:
             return False
 
-        user.liked_tweets.remove(tweet)
+        await self._change_like_count([tweet_id], -1)
 
         await self.session.commit()
         logger.debug("Запрос удал-я лайка к БД")
 
         return True
 
+    async def like_tweets(
+        self, user: AuthUserSchema, tweet_ids: list[int]
+    ) -> list[int]:
+        """Пакетный лайк в одной транзакции: одна вставка для всех существующих
+        твитов, счётчики увеличиваются только у реально лайкнутых"""
+        tweets = select(literal(user.id), Tweet.id).where(Tweet.id.in_(tweet_ids))
+        liked = (
+            await self.session.scalars(
+                insert_ignore(
+                    self.session,
+                    tweet_like_association,
+                    ["user_id", "tweet_id"],
+                    tweets,
+                ).returning(tweet_like_association.c.tweet_id)
+            )
+        ).all()
+        if not liked:
+            return []
+
+        await self._change_like_count(liked, 1)
+
+        await self.session.commit()
+        logger.debug("Запрос пакетного доб-я лайков к БД")
+
+        return sorted(liked)
+
+    async def unlike_tweets(
+        self, user: AuthUserSchema, tweet_ids: list[int]
+    ) -> list[int]:
+        """Пакетное удаление лайков одним DELETE ... RETURNING"""
+        unliked = (
+            await self.session.scalars(
+                delete(tweet_like_association)
+                .where(
+                    tweet_like_association.c.user_id == user.id,
+                    tweet_like_association.c.tweet_id.in_(tweet_ids),
+                )
+                .returning(tweet_like_association.c.tweet_id)
+            )
+        ).all()
+        if not unliked:
+            return []
+
+        await self._change_like_count(unliked, -1)
+
+        await self.session.commit()
+        logger.debug("Запрос пакетного удал-я лайков к БД")
+
+        return sorted(unliked)
+
+    async def _change_like_count(self, tweet_ids: Sequence[int], delta: int) -> None:
+        """Атомарное изменение счётчиков лайков в транзакции лайка"""
+        await self.session.execute(
+            update(Tweet)
+            .where(Tweet.id.in_(tweet_ids))
+            .values(like_count=Tweet.like_count + delta)
+        )
+
 
 class MediaRepository(BaseRepository[Media], IMediaRepository):
     """Репозиторий взаимодействия Медиа с БД"""
@@ -235,37 +1057,24 @@ class MediaRepository(BaseRepository[Media], IMediaRepository):
     def __init__(self, session: AsyncSession):
         super().__init__(session, Media)
 
-    async def upload_media(self, user: User, file: UploadFile):
+    async def upload_media(self, user: AuthUserSchema, file: UploadFile):
         """Добавление медиа в БД"""
 
-        unique_filename = await self._validate_and_save_file(file, user.id)
-
-        media = Media(path=unique_filename, user_id=user.id, tweet_id=None)
+        stored = await save_upload(file, partial(lock_content, self.session))
+        if not stored:
+            return None
+        if stored.created:
+            await enqueue(self.session, BUILD_VARIANTS, {"path": stored.path})
+
+        media = Media(
+            path=stored.path,
+            content_hash=stored.content_hash,
+            user_id=user.id,
+            tweet_id=None,
+        )
 
         self.session.add(media)
         await self.session.commit()
         logger.debug("Запрос доб-я медиа к БД")
 
         return media.id
-
-    async def _validate_and_save_file(self, file, user_id):
-        """Валидация файла, генерация имени, запись"""
-        if not (
-            "." in file.filename
-            and file.filename.rsplit(".", 1)[1].lower()
-            in settings.MEDIA.ALLOWED_EXTENSIONS
-        ):
-            return False
-
-        unique_filename = (
-            f"{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
-        )
-        file_path = settings.MEDIA.upload_dir / unique_filename
-
-        contents = await file.read()
-
-        async with aiofiles.open(file_path, "wb") as f:
-            await f.write(contents)
-        logger.debug("Валидация медиа успешна")
-
-        return unique_filename
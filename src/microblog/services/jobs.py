@@ -0,0 +1,56 @@
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from microblog.core.cache import feed_cache
+from microblog.core.database import AsyncSessionLocal
+from microblog.core.images import build_variants
+from microblog.core.jobs import (
+    BUILD_VARIANTS,
+    COLLECT_BLOB,
+    FAN_OUT,
+    JobHandler,
+    JobRunner,
+)
+from microblog.core.storage import remove_blob
+from microblog.db.models import Media
+from microblog.logger import get_logger
+from microblog.repositories.repository import HomeTimelineRepository, lock_content
+
+logger = get_logger(__name__)
+
+
+async def fan_out_tweet(session: AsyncSession, payload: dict) -> None:
+    """Раскладка твита по домашним лентам подписчиков автора"""
+    await HomeTimelineRepository(session).fan_out(
+        payload["author_id"], payload["tweet_id"]
+    )
+    await session.commit()
+    # Домашние ленты изменились уже после ответа на публикацию. Из воркера
+    # сброс доходит до веб-процессов через Redis или NOTIFY, см. FeedCache.start
+    await feed_cache.invalidate()
+
+
+async def render_media_variants(session: AsyncSession, payload: dict) -> None:
+    """Уменьшенные копии загруженного изображения"""
+    await build_variants(payload["path"])
+
+
+async def collect_blob(session: AsyncSession, payload: dict) -> None:
+    """Удаление файла медиа, если на его содержимое не осталось ссылок.
+    Блокировка хэша держится до коммита: загрузка того же содержимого
+    дождётся удаления и запишет файл заново"""
+    await lock_content(session, payload["content_hash"])
+    references = await session.scalar(
+        select(func.count()).where(Media.content_hash == payload["content_hash"])
+    )
+    if not references:
+        await remove_blob(payload["path"])
+
+
+JOB_HANDLERS: dict[str, JobHandler] = {
+    FAN_OUT: fan_out_tweet,
+    BUILD_VARIANTS: render_media_variants,
+    COLLECT_BLOB: collect_blob,
+}
+
+job_runner = JobRunner(JOB_HANDLERS, AsyncSessionLocal)
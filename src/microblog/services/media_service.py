@@ -1,16 +1,31 @@
-from microblog.api.schemas import MediaResponseSchema
-from microblog.db.models import User
+from pathlib import Path
+
+from fastapi import HTTPException, status
+
+from microblog.api.schemas import AuthUserSchema, MediaResponseSchema
+from microblog.core.images import resolve_variant
 from microblog.logger import get_logger
 from microblog.repositories.interfaces import IMediaRepository
 
 logger = get_logger(__name__)
 
 
+async def get_media_file(path: str, size: str) -> Path:
+    """Файл медиа нужного размера (small/medium/original).
+    Путь проверяется по папке загрузок, без обращения к БД"""
+    file_path = await resolve_variant(path, size)
+    if not file_path:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Медиа не найдено"
+        )
+    return file_path
+
+
 class MediaService:
     def __init__(self, media_repository: IMediaRepository):
         self._media_repo = media_repository
 
-    async def upload_media(self, user: User, file) -> MediaResponseSchema:
+    async def upload_media(self, user: AuthUserSchema, file) -> MediaResponseSchema:
         """Загрузка файлов из твита"""
         media_id = await self._media_repo.upload_media(user=user, file=file)
         logger.debug("Пользователь %s подгрузил файл %s", user.id, media_id)
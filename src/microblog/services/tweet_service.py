@@ -1,12 +1,23 @@
-from fastapi import HTTPException, status
+from fastapi import HTTPException, Response, status
 
 from microblog.api.schemas import (
+    AuthUserSchema,
+    BatchSuccessSchema,
     CreateTweetSchema,
     TweetsResponseSchema,
     TweetSuccessSchema,
     UserResponseSchema,
 )
-from microblog.db.models import User
+from microblog.config import settings
+from microblog.core.cache import FeedCache
+from microblog.core.events import (
+    LIKE,
+    TWEET_CREATED,
+    TWEET_DELETED,
+    EventBus,
+    FeedEvent,
+)
+from microblog.core.pagination import InvalidCursorError
 from microblog.logger import get_logger
 from microblog.repositories.interfaces import ITweetRepository
 
@@ -14,11 +25,21 @@ logger = get_logger(__name__)
 
 
 class TweetService:
-    def __init__(self, tweet_repository: ITweetRepository) -> None:
+    def __init__(
+        self,
+        tweet_repository: ITweetRepository,
+        feed_cache: FeedCache,
+        event_bus: EventBus,
+        replica_lag: float = 0.0,
+    ) -> None:
         self._tweet_repo = tweet_repository
+        self._feed_cache = feed_cache
+        self._events = event_bus
+        # Сколько после записи реплика может её не содержать; 0 - чтение из primary
+        self._replica_lag = replica_lag
 
     async def create_tweet(
-        self, user: User, data: str, media_ids=None
+        self, user: AuthUserSchema, data: str, media_ids=None
     ) -> UserResponseSchema | CreateTweetSchema:
         """Создание твита"""
         if not user:
@@ -30,19 +51,100 @@ class TweetService:
         if not tweet_id:
             return CreateTweetSchema(result=False, tweet_id=None)
         logger.info("Пользователь %s опубликовал твит %s", user.id, tweet_id)
+        # Домашние ленты подписчиков сбросит задача раскладки
+        await self._feed_cache.invalidate_global()
+        await self._feed_cache.invalidate_home(user.id)
+        await self._events.publish(FeedEvent(TWEET_CREATED, tweet_id, user.id))
 
         return CreateTweetSchema(result=True, tweet_id=tweet_id)
 
-    async def get_tweets(self, user: User, all_tweets: bool) -> TweetsResponseSchema:
-        """Получения списка твитов"""
-        tweets = await self._tweet_repo.get_tweets(user=user, all_tweets=all_tweets)
+    async def get_tweets(
+        self,
+        user: AuthUserSchema,
+        all_tweets: bool,
+        cursor: str | None = None,
+        limit: int | None = None,
+        with_likes: bool = True,
+    ) -> Response:
+        """Получения страницы твитов готовым JSON-ответом.
+        Повторные запросы той же страницы отдаются из кэша без БД и Pydantic"""
+        limit = min(limit or settings.FEED.DEFAULT_LIMIT, settings.FEED.MAX_LIMIT)
+        cache_key = await self._feed_cache.make_key(
+            all_tweets=all_tweets,
+            user_id=user.id,
+            cursor=cursor,
+            limit=limit,
+            with_likes=with_likes,
+        )
+        body = await self._feed_cache.get(cache_key)
+        if body is not None:
+            logger.debug("Лента для пользователя %s отдана из кэша", user.id)
+            return Response(content=body, media_type="application/json")
+
+        try:
+            tweets, next_cursor = await self._tweet_repo.get_tweets(
+                user=user,
+                all_tweets=all_tweets,
+                cursor=cursor,
+                limit=limit,
+                with_likes=with_likes,
+            )
+        except InvalidCursorError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректный курсор"
+            ) from None
+        if not tweets:
+            response = TweetsResponseSchema(result=False, tweets=None)
+        else:
+            logger.info("Пользователь %s получил список твитов", user.id)
+            response = TweetsResponseSchema.from_rows(tweets, next_cursor)
+
+        body = response.model_dump_json(by_alias=True).encode()
+        # Страница с реплики вскоре после записи может её не содержать:
+        # в кэше её получили бы все, включая автора записи
+        lag = self._replica_lag
+        if not lag or self._feed_cache.settled(cache_key, lag):
+            await self._feed_cache.set(cache_key, body)
+
+        return Response(content=body, media_type="application/json")
+
+    async def get_tweets_by_ids(
+        self, tweet_ids: list[int], with_likes: bool = True
+    ) -> TweetsResponseSchema:
+        """Получение твитов по списку id, без кэша и пагинации"""
+        tweets = await self._tweet_repo.get_tweets_by_ids(
+            tweet_ids=tweet_ids, with_likes=with_likes
+        )
+        if not tweets:
+            return TweetsResponseSchema(result=False, tweets=None)
+
+        return TweetsResponseSchema.from_rows(tweets)
+
+    async def search_tweets(
+        self,
+        query: str,
+        cursor: str | None = None,
+        limit: int | None = None,
+        with_likes: bool = True,
+    ) -> TweetsResponseSchema:
+        """Полнотекстовый поиск твитов постранично, без кэша"""
+        limit = min(limit or settings.FEED.DEFAULT_LIMIT, settings.FEED.MAX_LIMIT)
+        try:
+            tweets, next_cursor = await self._tweet_repo.search_tweets(
+                query=query, cursor=cursor, limit=limit, with_likes=with_likes
+            )
+        except InvalidCursorError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректный курсор"
+            ) from None
         if not tweets:
             return TweetsResponseSchema(result=False, tweets=None)
-        logger.info("Пользователь %s получил список твитов", user.id)
 
-        return TweetsResponseSchema(result=True, tweets=tweets)
+        return TweetsResponseSchema.from_rows(tweets, next_cursor)
 
-    async def delete_tweet(self, user: User, tweet_id: int) -> TweetSuccessSchema:
+    async def delete_tweet(
+        self, user: AuthUserSchema, tweet_id: int
+    ) -> TweetSuccessSchema:
         """Удаление твита по ID"""
         success = await self._tweet_repo.delete_tweet(user=user, tweet_id=tweet_id)
 
@@ -52,12 +154,16 @@ class TweetService:
                 detail="Твит не найден или нет прав для удаления",
             )
         logger.info("Пользователь %s удалил твит %s", user.id, tweet_id)
+        await self._feed_cache.invalidate()
+        await self._events.publish(FeedEvent(TWEET_DELETED, tweet_id, user.id))
 
         return TweetSuccessSchema(
             result=success, message="Ok delete" if success else "Oops"
         )
 
-    async def like_tweet(self, user: User, tweet_id: int) -> TweetSuccessSchema:
+    async def like_tweet(
+        self, user: AuthUserSchema, tweet_id: int
+    ) -> TweetSuccessSchema:
         """Отметить лайка на твите по ID"""
         success = await self._tweet_repo.like_tweet(user=user, tweet_id=tweet_id)
 
@@ -66,12 +172,16 @@ class TweetService:
                 status_code=status.HTTP_404_NOT_FOUND, detail="Ошибка снятия отметки"
             )
         logger.info("Пользователь %s лайкнул твит %s", user.id, tweet_id)
+        await self._invalidate_likes(user)
+        await self._events.publish(FeedEvent(LIKE, tweet_id, delta=1))
 
         return TweetSuccessSchema(
             result=success, message="Ok like" if success else "Oops"
         )
 
-    async def unlike_tweet(self, user: User, tweet_id: int) -> TweetSuccessSchema:
+    async def unlike_tweet(
+        self, user: AuthUserSchema, tweet_id: int
+    ) -> TweetSuccessSchema:
         """Снять отметку лайка с твита по ID"""
         success = await self._tweet_repo.unlike_tweet(user=user, tweet_id=tweet_id)
 
@@ -80,7 +190,51 @@ class TweetService:
                 status_code=status.HTTP_404_NOT_FOUND, detail="Ошибка снятия отметки"
             )
         logger.info("Пользователь %s снял лайк с твита %s", user.id, tweet_id)
+        await self._invalidate_likes(user)
+        await self._events.publish(FeedEvent(LIKE, tweet_id, delta=-1))
 
         return TweetSuccessSchema(
             result=success, message="Ok unlike" if success else "Oops"
         )
+
+    async def like_tweets(
+        self, user: AuthUserSchema, tweet_ids: list[int]
+    ) -> BatchSuccessSchema:
+        """Пакетный лайк: в ответе id твитов, лайкнутых этим запросом"""
+        liked = await self._tweet_repo.like_tweets(user=user, tweet_ids=tweet_ids)
+        logger.info(
+            "Пользователь %s лайкнул %s твитов из %s",
+            user.id,
+            len(liked),
+            len(tweet_ids),
+        )
+        if liked:
+            await self._invalidate_likes(user)
+        for tweet_id in liked:
+            await self._events.publish(FeedEvent(LIKE, tweet_id, delta=1))
+
+        return BatchSuccessSchema(result=True, ids=liked)
+
+    async def unlike_tweets(
+        self, user: AuthUserSchema, tweet_ids: list[int]
+    ) -> BatchSuccessSchema:
+        """Пакетное снятие лайков: в ответе id твитов, с которых лайк снят"""
+        unliked = await self._tweet_repo.unlike_tweets(user=user, tweet_ids=tweet_ids)
+        logger.info(
+            "Пользователь %s снял лайк с %s твитов из %s",
+            user.id,
+            len(unliked),
+            len(tweet_ids),
+        )
+        if unliked:
+            await self._invalidate_likes(user)
+        for tweet_id in unliked:
+            await self._events.publish(FeedEvent(LIKE, tweet_id, delta=-1))
+
+        return BatchSuccessSchema(result=True, ids=unliked)
+
+    async def _invalidate_likes(self, user: AuthUserSchema) -> None:
+        """Лайки меняют общую ленту (порядок по лайкам) и ленту лайкнувшего.
+        Счётчики в чужих домашних лентах обновляет событие like"""
+        await self._feed_cache.invalidate_global()
+        await self._feed_cache.invalidate_home(user.id)
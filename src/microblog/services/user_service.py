@@ -1,5 +1,16 @@
-from microblog.api.schemas import FollUnfollowSchema, UserResponseSchema, UserSchemaOut
-from microblog.db.models import User
+from fastapi import HTTPException, status
+
+from microblog.api.schemas import (
+    AuthUserSchema,
+    BatchSuccessSchema,
+    FollowsResponseSchema,
+    FollUnfollowSchema,
+    UserResponseSchema,
+    UserSchemaOut,
+)
+from microblog.config import settings
+from microblog.core.cache import FeedCache
+from microblog.core.pagination import InvalidCursorError
 from microblog.logger import get_logger
 from microblog.repositories.interfaces import IUserRepository
 
@@ -7,34 +18,111 @@ logger = get_logger(__name__)
 
 
 class UserService:
-    def __init__(self, user_repository: IUserRepository) -> None:
+    def __init__(self, user_repository: IUserRepository, feed_cache: FeedCache) -> None:
         self._user_repo = user_repository
+        self._feed_cache = feed_cache
 
-    async def get_user_profile(self, user_id: int) -> UserResponseSchema:
+    async def get_user_profile(
+        self, user_id: int, viewer: AuthUserSchema | None = None
+    ) -> UserResponseSchema:
         """Получение профиля пользователя"""
         logger.info("Запрос профиля пользователя %s", user_id)
-        user = await self._user_repo.get_user_profile(user_id=user_id)
+        user = await self._user_repo.get_user_profile(user_id=user_id, viewer=viewer)
         if not user:
             return UserResponseSchema(result=False, user=None)
 
-        user_schema = UserSchemaOut.model_validate(user, from_attributes=True)
+        user_schema = UserSchemaOut.model_validate(user)
 
         return UserResponseSchema(result=True, user=user_schema)
 
-    async def follow_user(self, user_id: int, user: User) -> FollUnfollowSchema:
+    async def get_followers(
+        self, user_id: int, cursor: str | None = None, limit: int | None = None
+    ) -> FollowsResponseSchema:
+        """Страница подписчиков пользователя"""
+        return await self._get_follows_page(
+            self._user_repo.get_followers, user_id, cursor, limit
+        )
+
+    async def get_following(
+        self, user_id: int, cursor: str | None = None, limit: int | None = None
+    ) -> FollowsResponseSchema:
+        """Страница подписок пользователя"""
+        return await self._get_follows_page(
+            self._user_repo.get_following, user_id, cursor, limit
+        )
+
+    async def _get_follows_page(
+        self, get_page, user_id: int, cursor: str | None, limit: int | None
+    ) -> FollowsResponseSchema:
+        limit = min(
+            limit or settings.USERS.FOLLOWS_DEFAULT_LIMIT,
+            settings.USERS.FOLLOWS_MAX_LIMIT,
+        )
+        try:
+            users, next_cursor = await get_page(user_id, cursor, limit)
+        except InvalidCursorError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректный курсор"
+            ) from None
+        if not users:
+            return FollowsResponseSchema(result=False, users=None)
+
+        return FollowsResponseSchema(result=True, users=users, next_cursor=next_cursor)
+
+    async def follow_user(
+        self, user_id: int, user: AuthUserSchema
+    ) -> FollUnfollowSchema:
         """Подписка на пользователя"""
         logger.info("Пользователь %s подписывается на %s", user.id, user_id)
         success = await self._user_repo.follow_user(user, user_id)
+        if success:
+            # Подписка меняет состав домашней ленты подписчика
+            await self._feed_cache.invalidate_home(user.id)
         return FollUnfollowSchema(
             result=success,
             message="Успешно оформлена" if success else "Ошибка повторного подписания",
         )
 
-    async def unfollow_user(self, user_id: int, user: User) -> FollUnfollowSchema:
+    async def unfollow_user(
+        self, user_id: int, user: AuthUserSchema
+    ) -> FollUnfollowSchema:
         """Отписка от пользователя"""
         logger.info("Пользователь %s отписывается от %s", user.id, user_id)
         success = await self._user_repo.unfollow_user(user, user_id)
+        if success:
+            # Подписка меняет состав домашней ленты подписчика
+            await self._feed_cache.invalidate_home(user.id)
         return FollUnfollowSchema(
             result=success,
             message="Успешно удалена" if success else "Ошибка повторного удаления",
         )
+
+    async def follow_users(
+        self, user_ids: list[int], user: AuthUserSchema
+    ) -> BatchSuccessSchema:
+        """Пакетная подписка: в ответе id, на которые подписка оформлена сейчас"""
+        followed = await self._user_repo.follow_users(user, user_ids)
+        logger.info(
+            "Пользователь %s подписался на %s из %s",
+            user.id,
+            len(followed),
+            len(user_ids),
+        )
+        if followed:
+            await self._feed_cache.invalidate_home(user.id)
+        return BatchSuccessSchema(result=True, ids=followed)
+
+    async def unfollow_users(
+        self, user_ids: list[int], user: AuthUserSchema
+    ) -> BatchSuccessSchema:
+        """Пакетная отписка: в ответе id, от которых отписка выполнена сейчас"""
+        unfollowed = await self._user_repo.unfollow_users(user, user_ids)
+        logger.info(
+            "Пользователь %s отписался от %s из %s",
+            user.id,
+            len(unfollowed),
+            len(user_ids),
+        )
+        if unfollowed:
+            await self._feed_cache.invalidate_home(user.id)
+        return BatchSuccessSchema(result=True, ids=unfollowed)
@@ -0,0 +1,56 @@
+"""Воркер фоновых задач из таблицы jobs (JOBS__BACKEND=database).
+
+Запуск:
+    python -m microblog.worker
+Воркеров можно запускать сколько угодно: задачи разбираются через
+SELECT ... FOR UPDATE SKIP LOCKED и не выполняются дважды.
+"""
+
+import asyncio
+import signal
+from contextlib import suppress
+
+from microblog.config import settings
+from microblog.core.cache import feed_cache
+from microblog.core.database import dispose_engines
+from microblog.core.images import shutdown_executor
+from microblog.logger import get_logger
+from microblog.services.jobs import job_runner
+
+logger = get_logger(__name__)
+
+
+async def run_worker(stop: asyncio.Event) -> None:
+    """Разбор задач пачками по BATCH_SIZE; пустая очередь - пауза POLL_INTERVAL"""
+    logger.info("Воркер задач запущен, пачка %s", settings.JOBS.BATCH_SIZE)
+    while not stop.is_set():
+        try:
+            taken = await job_runner.run_database(settings.JOBS.BATCH_SIZE)
+        except Exception:
+            logger.exception("Ошибка разбора очереди задач")
+            taken = 0
+        if not taken:
+            with suppress(TimeoutError):
+                await asyncio.wait_for(stop.wait(), settings.JOBS.POLL_INTERVAL)
+    logger.info("Воркер задач остановлен")
+
+
+async def main() -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    # Кэш лент веб-процессов сбрасывается из воркера после раскладки твитов
+    await feed_cache.start()
+    try:
+        await run_worker(stop)
+    finally:
+        await feed_cache.close()
+        shutdown_executor()
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    if settings.JOBS.BACKEND != "database":
+        raise SystemExit("Воркер работает с JOBS__BACKEND=database")
+    asyncio.run(main())
@@ -1,19 +1,28 @@
 import asyncio
+from contextlib import contextmanager
 
 import pytest
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
-from sqlalchemy import StaticPool
+from sqlalchemy import StaticPool, event
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
-from microblog.core.database import get_db
+from microblog.core.database import PrimaryStickinessMiddleware, get_db, get_read_db
+from microblog.core.http_metrics import MetricsMiddleware, metrics_app
+from microblog.core.jobs import JobsMiddleware
+from microblog.core.query_stats import QueryStats, QueryStatsMiddleware
 from microblog.db.base import Base
 from microblog.db.models import User
+from microblog.services.jobs import job_runner
 
 TEST_USER_1 = {"id": 1, "name": "Oliver", "api_key": "000"}
 TEST_USER_2 = {"id": 2, "name": "Jenia", "api_key": "123"}
 TEST_USER_3 = {"id": 3, "name": "Kate", "api_key": "222"}
 
+# Содержимое файлов с сигнатурами изображений
+TEST_JPEG = b"\xff\xd8\xff\xe0fake_image_content"
+TEST_PNG = b"\x89PNG\r\n\x1a\nfake_png_content"
+
 
 @pytest.fixture(scope="session")
 def app():
@@ -24,6 +33,7 @@ def app():
         medias_router,
         start_router,
         tweets_router,
+        uploads_router,
         users_router,
     )
 
@@ -31,6 +41,12 @@ def app():
     _app.include_router(users_router)
     _app.include_router(tweets_router)
     _app.include_router(medias_router)
+    _app.include_router(uploads_router)
+    _app.add_middleware(PrimaryStickinessMiddleware)
+    _app.add_middleware(QueryStatsMiddleware)
+    _app.add_middleware(MetricsMiddleware)
+    _app.mount("/metrics", metrics_app())
+    _app.add_middleware(JobsMiddleware, runner=job_runner)
 
     return _app
 
@@ -69,6 +85,9 @@ def setup_database(app):
     asyncio.run(create_test_users())
 
     app.dependency_overrides[get_db] = override_get_db  # type: ignore
+    app.dependency_overrides[get_read_db] = override_get_db  # type: ignore
+    # Фоновые задачи режима memory работают с тестовой БД
+    job_runner.session_factory = TestingSessionLocal
 
     return _engine
 
@@ -78,3 +97,29 @@ def client(app: FastAPI, setup_database):
     """Клиент для тестов"""
     with TestClient(app) as client:
         yield client
+
+
+@pytest.fixture
+def query_budget(setup_database):
+    """Бюджет SQL-запросов ручки: with query_budget(3): client.post(...)
+    Падает, если внутри блока выполнено больше запросов, и печатает их"""
+
+    @contextmanager
+    def budget(max_queries: int):
+        stats = QueryStats()
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            stats.record(statement, 0.0)
+
+        event.listen(setup_database.sync_engine, "after_cursor_execute", count)
+        try:
+            yield stats
+        finally:
+            event.remove(setup_database.sync_engine, "after_cursor_execute", count)
+
+        assert stats.count <= max_queries, (
+            f"{stats.count} SQL-запросов при бюджете {max_queries}:\n"
+            + "\n".join(f"{n} x {sql}" for sql, n in stats.statements.items())
+        )
+
+    return budget
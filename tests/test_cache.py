@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+
+from microblog.config import settings
+from microblog.core.cache import FeedCache, InMemoryCacheBackend
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_memory_backend_bounds():
+    """Тест вытеснения по числу записей, размеру и TTL"""
+
+    async def scenario():
+        clock = FakeClock()
+        backend = InMemoryCacheBackend(max_size=3, max_bytes=10, clock=clock)
+
+        await backend.set("a", b"1234", ttl=10)
+        await backend.set("b", b"1234", ttl=10)
+        await backend.get("a")
+        # Превышен лимит байт - вытесняется давно не читанная запись
+        await backend.set("c", b"1234", ttl=10)
+        assert await backend.get("b") is None
+        assert await backend.get("a") == b"1234"
+        assert backend.size_bytes == 8
+
+        # Запись больше лимита не кэшируется
+        await backend.set("big", b"x" * 11, ttl=10)
+        assert await backend.get("big") is None
+
+        clock.now = 10
+        assert await backend.get("a") is None
+        assert len(backend) == 1
+
+    asyncio.run(scenario())
+
+
+def test_feed_cache_versioning():
+    """Тест сброса закэшированных лент увеличением версии"""
+
+    async def scenario():
+        cache = FeedCache(InMemoryCacheBackend(max_size=10, max_bytes=1024), ttl=60)
+
+        all_key = await cache.make_key(True, 1, None, 50, True)
+        # Общая лента одна для всех пользователей, домашняя - своя
+        assert all_key == await cache.make_key(True, 2, None, 50, True)
+        assert await cache.make_key(False, 1, None, 50, True) != await cache.make_key(
+            False, 2, None, 50, True
+        )
+
+        await cache.set(all_key, b'{"result":true}')
+        assert await cache.get(all_key) == b'{"result":true}'
+
+        await cache.invalidate()
+        new_key = await cache.make_key(True, 1, None, 50, True)
+        assert new_key != all_key
+        assert await cache.get(new_key) is None
+
+    asyncio.run(scenario())
+
+
+def test_feed_cache_scoped_invalidation():
+    """Тест сброса только затронутых лент: лайк не сбрасывает чужие домашние
+    ленты, подписка - общую и чужие домашние"""
+
+    async def scenario():
+        cache = FeedCache(InMemoryCacheBackend(max_size=10, max_bytes=1024), ttl=60)
+
+        async def keys():
+            return [
+                await cache.make_key(True, 1, None, 50, True),
+                await cache.make_key(False, 1, None, 50, True),
+                await cache.make_key(False, 2, None, 50, True),
+            ]
+
+        all_key, home_1, home_2 = await keys()
+
+        # Лайк пользователя 1
+        await cache.invalidate_global()
+        await cache.invalidate_home(1)
+        new_all, new_home_1, new_home_2 = await keys()
+        assert new_all != all_key
+        assert new_home_1 != home_1
+        assert new_home_2 == home_2
+
+        # Подписка пользователя 2
+        await cache.invalidate_home(2)
+        followed = await keys()
+        assert followed[:2] == [new_all, new_home_1]
+        assert followed[2] != new_home_2
+
+        # Новый твит сбрасывает все ленты
+        await cache.invalidate()
+        assert all(a != b for a, b in zip(await keys(), followed, strict=True))
+
+    asyncio.run(scenario())
+
+
+def test_feed_cache_settled_version():
+    """Тест времени с последнего изменения версии: по нему страницы с реплик
+    не кэшируются сразу после записи"""
+
+    async def scenario():
+        clock = FakeClock()
+        cache = FeedCache(
+            InMemoryCacheBackend(max_size=10, max_bytes=1024), ttl=60, clock=clock
+        )
+        key = await cache.make_key(True, 1, None, 50, True)
+        clock.now = 5
+        assert cache.settled(key, 5)
+
+        await cache.invalidate()
+        key = await cache.make_key(True, 1, None, 50, True)
+        assert not cache.settled(key, 5)
+        clock.now = 10
+        key = await cache.make_key(True, 1, None, 50, True)
+        assert cache.settled(key, 5)
+
+    asyncio.run(scenario())
+
+
+def test_feed_cache_multiprocess_versions(monkeypatch):
+    """Тест согласования версий in-process кэша между процессами"""
+
+    async def scenario():
+        cache = FeedCache(InMemoryCacheBackend(max_size=10, max_bytes=1024), ttl=60)
+        key = await cache.make_key(True, 1, None, 50, True)
+
+        # Уведомление о сбросе из другого процесса
+        cache._on_remote_invalidate(FeedCache.GLOBAL_VERSION_KEY)
+        assert await cache.make_key(True, 1, None, 50, True) != key
+
+        # Несколько воркеров без рассылки версий - кэш не запускается
+        monkeypatch.setattr(settings.EVENTS, "BACKEND", "memory")
+        monkeypatch.setattr(settings.UVICORN, "WORKERS", 4)
+        with pytest.raises(RuntimeError):
+            await cache.start()
+
+        # Раскладка по лентам в отдельном воркере - тоже
+        monkeypatch.setattr(settings.UVICORN, "WORKERS", 1)
+        monkeypatch.setattr(settings.JOBS, "BACKEND", "database")
+        with pytest.raises(RuntimeError):
+            await cache.start()
+
+        # Без кэша (TTL=0) согласовывать нечего
+        await FeedCache(cache.backend, ttl=0).start()
+
+    asyncio.run(scenario())
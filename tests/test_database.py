@@ -0,0 +1,221 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+from conftest import TEST_USER_1, TEST_USER_2
+from prometheus_client import REGISTRY
+from sqlalchemy import column, exc, insert, select, table, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.requests import Request
+
+from microblog.core import database
+from microblog.core.database import (
+    STICKY_COOKIE,
+    USE_PRIMARY,
+    InstrumentedPool,
+    PrimaryStickinessMiddleware,
+    RoutingSession,
+    reads_from_replica,
+    sticks_to_primary,
+)
+
+
+def metric(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_pool_metrics(tmp_path):
+    """Тест метрик пула: время ожидания, загрузка и таймауты получения соединения"""
+
+    async def scenario():
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+            poolclass=InstrumentedPool,
+            pool_size=2,
+            max_overflow=0,
+            pool_timeout=0.1,
+            pool_logging_name="test",
+        )
+        checkouts = metric("microblog_db_pool_checkout_seconds_count", pool="test")
+        timeouts = metric("microblog_db_pool_checkout_timeouts_total", pool="test")
+
+        async with engine.connect() as first, engine.connect() as second:
+            await first.execute(text("SELECT 1"))
+            await second.execute(text("SELECT 1"))
+            assert metric("microblog_db_pool_saturation_ratio", pool="test") == 1.0
+            assert (
+                metric(
+                    "microblog_db_pool_connections", pool="test", state="checked_out"
+                )
+                == 2
+            )
+
+            # Пул исчерпан - третий запрос ждёт POOL_TIMEOUT и получает ошибку
+            with pytest.raises(exc.TimeoutError):
+                async with engine.connect():
+                    pass
+
+        assert (
+            metric("microblog_db_pool_checkout_seconds_count", pool="test")
+            == checkouts + 3
+        )
+        assert (
+            metric("microblog_db_pool_checkout_timeouts_total", pool="test")
+            == timeouts + 1
+        )
+        assert metric("microblog_db_pool_saturation_ratio", pool="test") == 0.0
+        assert metric("microblog_db_pool_connections", pool="test", state="idle") == 2
+
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_routing_session(tmp_path, monkeypatch):
+    """Тест маршрутизации: чтения на одну реплику за сессию, запись и чтения после
+    неё - на primary, окно чтения из primary после записи - в cookie и по API-Key"""
+    source = table("source", column("name"))
+
+    async def scenario():
+        engines = {}
+        for name in ("primary", "replica", "replica-2"):
+            engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / name}.db")
+            async with engine.begin() as conn:
+                await conn.execute(text("CREATE TABLE source (name TEXT)"))
+                await conn.execute(insert(source).values(name=name))
+            engines[name] = engine
+
+        monkeypatch.setattr(database, "AsyncEngine", engines["primary"])
+        monkeypatch.setattr(
+            database, "ReplicaEngines", [engines["replica"], engines["replica-2"]]
+        )
+        monkeypatch.setattr(database, "_primary_until", {})
+        factory = async_sessionmaker(sync_session_class=RoutingSession)
+        query = select(source.c.name)
+
+        async def endpoint(scope, receive, send):
+            async with factory() as session:
+                # Все чтения сессии - с одной реплики
+                replicas = {await session.scalar(query) for _ in range(10)}
+                assert len(replicas) == 1 and replicas <= {"replica", "replica-2"}
+                assert reads_from_replica(session)
+                if scope["path"] == "/write":
+                    await session.execute(insert(source).values(name="written"))
+                    # После записи сессия читает только из primary
+                    assert set(await session.scalars(query)) == {"primary", "written"}
+                await session.commit()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def request(path: str) -> dict:
+            messages = []
+
+            async def send(message):
+                messages.append(message)
+
+            scope = {"type": "http", "path": path, "headers": [(b"api-key", b"k1")]}
+            await PrimaryStickinessMiddleware(endpoint)(scope, None, send)
+            return dict(messages[0]["headers"])
+
+        assert b"set-cookie" not in await request("/read")
+        cookie = (await request("/write"))[b"set-cookie"].decode()
+        assert cookie.startswith(f"{STICKY_COOKIE}=")
+
+        # Клиент возвращает cookie - чтения идут в primary в любом воркере
+        sticky = Request(
+            {"type": "http", "headers": [(b"cookie", cookie.split(";")[0].encode())]}
+        )
+        assert sticks_to_primary(sticky)
+        assert not sticks_to_primary(Request({"type": "http", "headers": []}))
+        forged = Request(
+            {"type": "http", "headers": [(b"cookie", f"{STICKY_COOKIE}=1e12".encode())]}
+        )
+        assert not sticks_to_primary(forged)
+
+        # Клиент без cookie - окно по API-Key в этом воркере
+        assert sticks_to_primary(
+            Request({"type": "http", "headers": [(b"api-key", b"k1")]})
+        )
+        assert not sticks_to_primary(
+            Request({"type": "http", "headers": [(b"api-key", b"k2")]})
+        )
+
+        async with factory(info={USE_PRIMARY: True}) as session:
+            assert "primary" in set(await session.scalars(query))
+            assert not reads_from_replica(session)
+
+        for engine in engines.values():
+            await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_http_metrics(client):
+    """Тест метрик HTTP по шаблону пути ручки и их выдачи в /metrics"""
+    route = "/api/users/{id_user}"
+    duration = metric(
+        "microblog_http_request_duration_seconds_count",
+        method="GET",
+        route=route,
+        status="200",
+    )
+    size = metric("microblog_http_response_size_bytes_sum", method="GET", route=route)
+
+    response = client.get(
+        f"/api/users/{TEST_USER_2['id']}",
+        headers={"api-key": TEST_USER_1["api_key"]},
+    )
+
+    assert (
+        metric(
+            "microblog_http_request_duration_seconds_count",
+            method="GET",
+            route=route,
+            status="200",
+        )
+        == duration + 1
+    )
+    assert metric(
+        "microblog_http_response_size_bytes_sum", method="GET", route=route
+    ) == size + len(response.content)
+    assert metric("microblog_http_requests_in_progress", method="GET") == 0
+
+    # Неизвестные пути не порождают новых рядов
+    client.get("/api/unknown/42")
+    assert metric(
+        "microblog_http_request_duration_seconds_count",
+        method="GET",
+        route="other",
+        status="404",
+    )
+
+    body = client.get("/metrics").text
+    assert 'microblog_http_request_duration_seconds_bucket{le="0.005"' in body
+    assert f'route="{route}"' in body
+
+
+def test_multiprocess_metrics(tmp_path):
+    """Тест суммирования метрик нескольких процессов-воркеров"""
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    worker = (
+        "from microblog.core.metrics import MEDIA_UPLOAD_BYTES;"
+        "MEDIA_UPLOAD_BYTES.labels(stored='new').inc(100)"
+    )
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", worker], env=env, check=True)
+
+    reader = (
+        "from prometheus_client import generate_latest;"
+        "from microblog.core.metrics import metrics_registry;"
+        "print(generate_latest(metrics_registry()).decode())"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", reader],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    assert 'microblog_media_upload_bytes_total{stored="new"} 200.0' in output
@@ -0,0 +1,88 @@
+import asyncio
+
+from conftest import TEST_USER_1, TEST_USER_2
+from prometheus_client import REGISTRY
+
+from microblog.core.events import (
+    LIKE,
+    TWEET_CREATED,
+    TWEET_DELETED,
+    EventBus,
+    FeedEvent,
+    event_bus,
+    sse_stream,
+)
+
+
+def subscribers() -> float:
+    return REGISTRY.get_sample_value("microblog_event_subscribers") or 0.0
+
+
+def drain(subscription) -> list[FeedEvent]:
+    events = []
+    while not subscription.queue.empty():
+        events.append(subscription.queue.get_nowait())
+    return events
+
+
+def test_sse_stream():
+    """Тест потока SSE: событие, пинг и отключение медленного подписчика"""
+
+    async def scenario():
+        bus = EventBus(queue_size=2)
+        before = subscribers()
+        stream = sse_stream(bus, heartbeat=0.01)
+
+        assert await anext(stream) == "retry: 3000\n\n"
+        assert subscribers() == before + 1
+
+        await bus.publish(FeedEvent(LIKE, 7, delta=1))
+        assert await anext(stream) == (
+            'event: like\ndata: {"type":"like","tweet_id":7,"delta":1}\n\n'
+        )
+        assert await anext(stream) == ": ping\n\n"
+
+        # Переполнение очереди закрывает поток, клиент переподключится
+        for tweet_id in range(3):
+            await bus.publish(FeedEvent(TWEET_CREATED, tweet_id, author_id=1))
+        assert [chunk async for chunk in stream] == []
+        assert subscribers() == before
+
+    asyncio.run(scenario())
+
+
+def test_feed_event_json():
+    """Тест сериализации события для NOTIFY"""
+    event = FeedEvent(TWEET_DELETED, 3, author_id=2)
+    assert event.to_json() == '{"type":"tweet_deleted","tweet_id":3,"author_id":2}'
+    assert FeedEvent.from_json(event.to_json()) == event
+
+
+def test_tweet_service_publishes_events(client):
+    """Тест публикации событий ленты после записи"""
+    author = {"api-key": TEST_USER_1["api_key"]}
+    reader = {"api-key": TEST_USER_2["api_key"]}
+
+    with event_bus.subscribe() as subscription:
+        tweet_id = client.post(
+            "/api/tweets",
+            json={"tweet_data": "Твит для потока", "tweet_media_ids": []},
+            headers=author,
+        ).json()["tweet_id"]
+        client.post(f"/api/tweets/{tweet_id}/likes", headers=reader)
+        client.delete(f"/api/tweets/{tweet_id}/likes", headers=reader)
+        client.post("/api/tweets/likes:batch", json={"ids": [tweet_id]}, headers=reader)
+        # Повторный лайк ничего не меняет и события не порождает
+        client.post("/api/tweets/likes:batch", json={"ids": [tweet_id]}, headers=reader)
+        client.delete(f"/api/tweets/{tweet_id}", headers=author)
+
+        assert drain(subscription) == [
+            FeedEvent(TWEET_CREATED, tweet_id, author_id=TEST_USER_1["id"]),
+            FeedEvent(LIKE, tweet_id, delta=1),
+            FeedEvent(LIKE, tweet_id, delta=-1),
+            FeedEvent(LIKE, tweet_id, delta=1),
+            FeedEvent(TWEET_DELETED, tweet_id, author_id=TEST_USER_1["id"]),
+        ]
+
+    response = client.get("/api/tweets/stream", headers={"api-key": "unknown"})
+    assert response.status_code == 401
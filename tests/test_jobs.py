@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+from conftest import TEST_USER_1
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from microblog.config import settings
+from microblog.core.jobs import (
+    JobRunner,
+    MemoryJobQueue,
+    QueuedJob,
+    backoff,
+    enqueue,
+    memory_queue,
+)
+from microblog.db.models import Job
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyHandler:
+    """Обработчик, падающий первые failures вызовов"""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls: list[dict] = []
+
+    async def __call__(self, session, payload):
+        self.calls.append(payload)
+        if len(self.calls) <= self.failures:
+            raise RuntimeError("сбой")
+
+
+def test_backoff():
+    """Тест экспоненциальной паузы между попытками с ограничением сверху"""
+    assert [backoff(n) for n in (1, 2, 3)] == [2.0, 4.0, 8.0]
+    assert backoff(100) == settings.JOBS.BACKOFF_MAX_SECONDS
+
+
+def test_enqueue_after_commit(setup_database):
+    """Тест режима memory: задача попадает в очередь только после коммита"""
+    factory = async_sessionmaker(setup_database, class_=AsyncSession)
+
+    async def scenario():
+        before = len(memory_queue)
+        async with factory() as session:
+            await enqueue(session, "test.rolled_back", {"n": 1})
+            await session.rollback()
+        assert len(memory_queue) == before
+
+        async with factory() as session:
+            await enqueue(session, "test.committed", {"n": 2})
+            assert len(memory_queue) == before
+            await session.commit()
+        assert len(memory_queue) == before + 1
+        assert memory_queue.take_due()[-1].kind == "test.committed"
+
+    asyncio.run(scenario())
+
+
+def test_request_runs_only_own_jobs(client):
+    """Тест режима memory: запрос выполняет только поставленные им задачи,
+    остальные ждут фонового цикла"""
+    foreign = QueuedJob("test.foreign", {"n": 3})
+    memory_queue.extend([foreign])
+
+    response = client.get("/api/users/me", headers={"api-key": TEST_USER_1["api_key"]})
+    assert response.status_code == 200
+    assert foreign in memory_queue.take_due()
+
+
+def test_memory_queue_retries(setup_database):
+    """Тест повторов режима memory: пауза перед повтором и отказ после
+    MAX_ATTEMPTS попыток"""
+    clock = FakeClock()
+    queue = MemoryJobQueue(clock=clock)
+    handler = FlakyHandler(failures=1)
+    hopeless = FlakyHandler(failures=100)
+    runner = JobRunner(
+        {"flaky": handler, "hopeless": hopeless},
+        async_sessionmaker(setup_database, class_=AsyncSession),
+    )
+
+    async def scenario():
+        queue.extend([QueuedJob("flaky", {"n": 1}), QueuedJob("hopeless", {})])
+        assert await runner.run_memory(queue) == 0
+        # Повтор ждёт паузу
+        assert await runner.run_memory(queue) == 0
+        assert len(handler.calls) == 1
+
+        for _ in range(settings.JOBS.MAX_ATTEMPTS):
+            clock.now += settings.JOBS.BACKOFF_MAX_SECONDS
+            await runner.run_memory(queue)
+
+        assert len(handler.calls) == 2
+        assert len(hopeless.calls) == settings.JOBS.MAX_ATTEMPTS
+        assert len(queue) == 0
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def database_jobs(setup_database, monkeypatch):
+    monkeypatch.setattr(settings.JOBS, "BACKEND", "database")
+    return async_sessionmaker(setup_database, class_=AsyncSession)
+
+
+def test_database_queue(database_jobs, monkeypatch):
+    """Тест очереди в таблице jobs: выполнение, повтор с паузой и отказ"""
+    monkeypatch.setattr(settings.JOBS, "MAX_ATTEMPTS", 2)
+    handler = FlakyHandler(failures=1)
+    hopeless = FlakyHandler(failures=100)
+    runner = JobRunner({"flaky": handler, "hopeless": hopeless}, database_jobs)
+
+    async def jobs() -> list[Job]:
+        async with database_jobs() as session:
+            return list((await session.scalars(select(Job).order_by(Job.id))).all())
+
+    async def scenario():
+        async with database_jobs() as session:
+            await enqueue(session, "flaky", {"tweet_id": 1})
+            await enqueue(session, "hopeless", {})
+            await session.commit()
+
+        assert await runner.run_database(limit=10) == 2
+        retried, failing = await jobs()
+        assert retried.attempts == 1
+        assert "сбой" in retried.last_error
+        assert retried.run_at > retried.created_at
+        # Отложенные задачи не берутся до наступления run_at
+        assert await runner.run_database(limit=10) == 0
+
+        async with database_jobs() as session:
+            for job in await session.scalars(select(Job)):
+                job.run_at = job.created_at
+            await session.commit()
+
+        assert await runner.run_database(limit=10) == 2
+        # Успешная задача удалена, исчерпавшая попытки - помечена
+        (failed,) = await jobs()
+        assert failed.kind == "hopeless"
+        assert failed.attempts == 2
+        assert failed.failed_at is not None
+        assert handler.calls == [{"tweet_id": 1}, {"tweet_id": 1}]
+        assert await runner.run_database(limit=10) == 0
+
+        async with database_jobs() as session:
+            await session.delete(await session.get(Job, failed.id))
+            await session.commit()
+
+    asyncio.run(scenario())
@@ -1,11 +1,24 @@
-from conftest import TEST_USER_1, TEST_USER_2
+import asyncio
+import hashlib
+import io
+import uuid
+
+from conftest import TEST_JPEG, TEST_PNG, TEST_USER_1, TEST_USER_2
+from fastapi import UploadFile
+from PIL import Image
+from prometheus_client import REGISTRY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from microblog.config import settings
+from microblog.core.storage import content_path, remove_blob, save_upload
+from microblog.db.models import Media
 
 
 def test_upload_media(client):
     """Тест загрузки медиа файла"""
 
     # Успешная загрузка картинки
-    test_file = {"file": ("test_image.jpg", b"fake_image_content", "image/jpeg")}
+    test_file = {"file": ("test_image.jpg", TEST_JPEG, "image/jpeg")}
 
     response = client.post(
         "/api/medias", files=test_file, headers={"api-key": TEST_USER_1["api_key"]}
@@ -17,7 +30,7 @@ def test_upload_media(client):
     assert isinstance(media_id, int)
 
     # Успешная загрузка PNG
-    test_file_png = {"file": ("test_logo.png", b"fake_png_content", "image/png")}
+    test_file_png = {"file": ("test_logo.png", TEST_PNG, "image/png")}
 
     response = client.post(
         "/api/medias", files=test_file_png, headers={"api-key": TEST_USER_1["api_key"]}
@@ -46,3 +59,195 @@ def test_upload_media(client):
 
     assert response.status_code == 200
     assert response.json()["result"]
+
+
+def test_upload_media_validation(client, monkeypatch):
+    """Тест проверки типа по содержимому и ограничения размера"""
+    headers = {"api-key": TEST_USER_1["api_key"]}
+
+    # Расширение картинки, но содержимое - не изображение
+    test_file = {"file": ("fake.jpg", b"fake_image_content", "image/jpeg")}
+    response = client.post("/api/medias", files=test_file, headers=headers)
+    assert response.status_code == 200
+    assert not response.json()["result"]
+    assert response.json()["media_id"] is None
+
+    # Файл больше MAX_FILE_SIZE, читается по кускам и обрывается с 413
+    monkeypatch.setattr(settings.MEDIA, "MAX_FILE_SIZE", 1024)
+    monkeypatch.setattr(settings.MEDIA, "CHUNK_SIZE", 256)
+    big_file = {"file": ("big.png", TEST_PNG + b"0" * 2048, "image/png")}
+    response = client.post("/api/medias", files=big_file, headers=headers)
+    assert response.status_code == 413
+    assert not list(settings.MEDIA.upload_dir.glob(".*.part"))
+
+    # Тело заведомо больше предела отклоняется по Content-Length до разбора
+    # формы и до проверки ключа
+    huge_file = {"file": ("huge.png", TEST_PNG + b"0" * 128 * 1024, "image/png")}
+    response = client.post(
+        "/api/medias", files=huge_file, headers={"api-key": "unknown"}
+    )
+    assert response.status_code == 413
+
+
+def test_media_variants(client, setup_database):
+    """Тест уменьшенных копий изображения по параметру size"""
+    image = Image.new("RGB", (1600, 900), color=(200, 30, 30))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG")
+
+    test_file = {"file": ("photo.jpg", buffer.getvalue(), "image/jpeg")}
+    response = client.post(
+        "/api/medias", files=test_file, headers={"api-key": TEST_USER_1["api_key"]}
+    )
+    media_id = response.json()["media_id"]
+
+    async def get_path():
+        async with AsyncSession(setup_database) as session:
+            return (await session.get(Media, media_id)).path
+
+    path = asyncio.run(get_path())
+
+    sizes = {}
+    for size in ("small", "medium", "original"):
+        response = client.get(f"/uploads/{path}", params={"size": size})
+        assert response.status_code == 200
+        sizes[size] = Image.open(io.BytesIO(response.content)).size
+
+    assert sizes["small"] == (320, 180)
+    assert sizes["medium"] == (1024, 576)
+    assert sizes["original"] == (1600, 900)
+
+    response = client.get(f"/uploads/{path}", params={"size": "huge"})
+    assert response.status_code == 422
+    response = client.get("/uploads/..%2F..%2Fpyproject.toml")
+    assert response.status_code == 404
+    response = client.get("/uploads/missing.jpg", params={"size": "small"})
+    assert response.status_code == 404
+
+
+def test_media_deduplication(client, setup_database):
+    """Тест хранения одинакового содержимого одним файлом и его удаления"""
+    headers = {"api-key": TEST_USER_2["api_key"]}
+    content = TEST_PNG + uuid.uuid4().bytes
+    stored = {
+        label: REGISTRY.get_sample_value(
+            "microblog_media_upload_bytes_total", {"stored": label}
+        )
+        or 0.0
+        for label in ("new", "duplicate")
+    }
+
+    media_ids = []
+    for name in ("first.png", "second.png"):
+        test_file = {"file": (name, content, "image/png")}
+        response = client.post("/api/medias", files=test_file, headers=headers)
+        media_ids.append(response.json()["media_id"])
+
+    async def get_paths():
+        async with AsyncSession(setup_database) as session:
+            return [(await session.get(Media, i)).path for i in media_ids]
+
+    first_path, second_path = asyncio.run(get_paths())
+    assert media_ids[0] != media_ids[1]
+    assert first_path == second_path
+    content_hash = hashlib.sha256(content).hexdigest()
+    assert first_path == f"{content_hash[:2]}/{content_hash[2:4]}/{content_hash}.png"
+    assert (settings.MEDIA.upload_dir / first_path).read_bytes() == content
+    for label in ("new", "duplicate"):
+        assert REGISTRY.get_sample_value(
+            "microblog_media_upload_bytes_total", {"stored": label}
+        ) == stored[label] + len(content)
+
+    # Файл удаляется вместе с последним твитом, который на него ссылается
+    tweet_ids = [
+        client.post(
+            "/api/tweets",
+            json={"tweet_data": "Твит с медиа", "tweet_media_ids": [media_id]},
+            headers=headers,
+        ).json()["tweet_id"]
+        for media_id in media_ids
+    ]
+
+    client.delete(f"/api/tweets/{tweet_ids[0]}", headers=headers)
+    assert (settings.MEDIA.upload_dir / first_path).exists()
+
+    client.delete(f"/api/tweets/{tweet_ids[1]}", headers=headers)
+    assert not (settings.MEDIA.upload_dir / first_path).exists()
+
+
+def test_upload_waits_for_blob_collection(client):
+    """Тест блокировки хэша: наличие файла проверяется после неё, и файл,
+    удалённый сборщиком за это время, записывается заново"""
+    content = TEST_PNG + uuid.uuid4().bytes
+    client.post(
+        "/api/medias",
+        files={"file": ("blob.png", content, "image/png")},
+        headers={"api-key": TEST_USER_1["api_key"]},
+    )
+    content_hash = hashlib.sha256(content).hexdigest()
+    relative_path = content_path(content_hash, "png")
+    locked = []
+
+    async def collected_while_waiting(locked_hash: str) -> None:
+        locked.append(locked_hash)
+        await remove_blob(relative_path)
+
+    async def scenario():
+        upload = UploadFile(io.BytesIO(content), filename="again.png")
+        return await save_upload(upload, collected_while_waiting)
+
+    stored = asyncio.run(scenario())
+    assert locked == [content_hash]
+    assert stored == (relative_path, content_hash, True)
+    assert (settings.MEDIA.upload_dir / relative_path).read_bytes() == content
+
+
+def test_media_conditional_and_range(client, setup_database, monkeypatch):
+    """Тест кэширования медиа: 304, Range и отдача через X-Accel-Redirect"""
+    image = Image.new("RGB", (64, 48), color=(10, 120, 30))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    content = buffer.getvalue()
+
+    response = client.post(
+        "/api/medias",
+        files={"file": ("cached.png", content, "image/png")},
+        headers={"api-key": TEST_USER_1["api_key"]},
+    )
+    media_id = response.json()["media_id"]
+
+    async def get_path():
+        async with AsyncSession(setup_database) as session:
+            return (await session.get(Media, media_id)).path
+
+    url = f"/uploads/{asyncio.run(get_path())}"
+
+    response = client.get(url)
+    assert response.content == content
+    assert response.headers["cache-control"].endswith("immutable")
+    etag = response.headers["etag"]
+
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(url, headers={"If-None-Match": '"other"'}).status_code == 200
+    not_modified = client.get(
+        url, headers={"If-Modified-Since": response.headers["last-modified"]}
+    )
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+
+    partial = client.get(url, headers={"Range": "bytes=0-7"})
+    assert partial.status_code == 206
+    assert partial.content == content[:8]
+    assert partial.headers["content-range"] == f"bytes 0-7/{len(content)}"
+
+    head = client.head(url, params={"size": "small"})
+    assert head.status_code == 200
+    assert head.content == b""
+
+    # Файл отдаёт прокси, приложение только выбирает копию
+    monkeypatch.setattr(settings.MEDIA, "ACCEL_REDIRECT_PREFIX", "/protected/")
+    offloaded = client.get(url, params={"size": "small"})
+    assert offloaded.content == b""
+    assert offloaded.headers["x-accel-redirect"] == (
+        "/protected/" + url.removeprefix("/uploads/").replace(".png", ".small.png")
+    )
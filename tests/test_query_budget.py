@@ -0,0 +1,64 @@
+from conftest import TEST_USER_1, TEST_USER_2, TEST_USER_3
+
+from microblog.core import security
+
+# Запросы к БД на ручку, включая поиск пользователя по API-Key.
+# Рост числа запросов - регрессия: бюджет меняется только осознанно
+BUDGETS = {
+    "post_tweet": 4,
+    "get_tweets": 2,
+    "get_tweets_by_ids": 2,
+    "like": 3,
+    "unlike": 3,
+    "follow": 5,
+    "unfollow": 4,
+    "profile": 5,
+    "delete_tweet": 8,
+}
+
+
+def test_endpoint_query_budgets(client, query_budget, monkeypatch):
+    """Тест бюджетов SQL-запросов ручек"""
+    # Без кэша авторизации: каждая ручка ищет пользователя по ключу
+    monkeypatch.setattr(security.auth_cache, "lookup", lambda key: (False, None))
+    author = {"api-key": TEST_USER_1["api_key"]}
+    reader = {"api-key": TEST_USER_3["api_key"]}
+    target_id = TEST_USER_2["id"]
+
+    with query_budget(BUDGETS["post_tweet"]):
+        response = client.post(
+            "/api/tweets",
+            json={"tweet_data": "Твит для бюджета", "tweet_media_ids": []},
+            headers=author,
+        )
+    tweet_id = response.json()["tweet_id"]
+
+    with query_budget(BUDGETS["get_tweets"]):
+        client.get("/api/tweets", params={"limit": 7}, headers=reader)
+    with query_budget(BUDGETS["get_tweets_by_ids"]):
+        client.get("/api/tweets", params={"ids": [tweet_id, 1, 2]}, headers=reader)
+    with query_budget(BUDGETS["like"]):
+        client.post(f"/api/tweets/{tweet_id}/likes", headers=reader)
+    with query_budget(BUDGETS["unlike"]):
+        client.delete(f"/api/tweets/{tweet_id}/likes", headers=reader)
+    with query_budget(BUDGETS["follow"]):
+        client.post(f"/api/users/{target_id}/follow", headers=reader)
+    with query_budget(BUDGETS["unfollow"]):
+        client.delete(f"/api/users/{target_id}/follow", headers=reader)
+    with query_budget(BUDGETS["profile"]):
+        client.get(f"/api/users/{target_id}", headers=reader)
+    with query_budget(BUDGETS["delete_tweet"]):
+        client.delete(f"/api/tweets/{tweet_id}", headers=author)
+
+
+def test_server_timing_header(client, monkeypatch):
+    """Тест заголовка Server-Timing с числом и временем SQL-запросов"""
+    monkeypatch.setattr(security.auth_cache, "lookup", lambda key: (False, None))
+    response = client.get(
+        f"/api/users/{TEST_USER_2['id']}",
+        headers={"api-key": TEST_USER_1["api_key"]},
+    )
+
+    timing = response.headers["server-timing"]
+    assert f'desc="{BUDGETS["profile"]} queries"' in timing
+    assert "db-slowest;dur=" in timing
@@ -0,0 +1,250 @@
+import asyncio
+import json
+import os
+import random
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from microblog.api.schemas import AuthUserSchema
+from microblog.config import settings
+from microblog.db.base import Base
+from microblog.db.models import (
+    Media,
+    Tweet,
+    User,
+    home_timeline_table,
+    tweet_like_association,
+    user_followers_association,
+)
+from microblog.repositories.repository import TweetRepository, UserRepository
+
+# По умолчанию планы проверяются на SQLite, для PostgreSQL задайте
+# TEST_EXPLAIN_DATABASE_URL=postgresql+asyncpg://... (база будет пересоздана)
+DATABASE_URL = os.getenv("TEST_EXPLAIN_DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+
+USERS = 300
+TWEETS = 5000
+FOLLOWS_PER_USER = 20
+LIKES_PER_TWEET = 3
+MEDIA_EVERY = 3
+CELEBRITY_ID = 2
+
+# Таблицы, которые растут с числом пользователей и твитов
+LARGE_TABLES = {
+    "users",
+    "tweets",
+    "medias",
+    "tweet_likes",
+    "user_followers",
+    "home_timeline",
+}
+
+
+async def seed(session: AsyncSession) -> None:
+    """Наполнение БД данными, на которых планировщик выбирает индексы"""
+    rnd = random.Random(7)
+    start = datetime(2024, 1, 1)
+    await session.execute(
+        insert(User),
+        [
+            {"id": i, "name": f"user{i}", "api_key": f"key{i}", "followers_count": 0}
+            for i in range(1, USERS + 1)
+        ],
+    )
+    await session.execute(
+        insert(Tweet),
+        [
+            {
+                "id": i,
+                "content": f"tweet {i}",
+                "author_id": rnd.randint(1, USERS),
+                "created_at": start + timedelta(seconds=i),
+                "like_count": 0,
+            }
+            for i in range(1, TWEETS + 1)
+        ],
+    )
+    follows = {
+        (follower, following)
+        for follower in range(1, USERS + 1)
+        for following in rnd.sample(range(1, USERS + 1), FOLLOWS_PER_USER)
+        if following != follower
+    }
+    # Пользователь 1 подписан на знаменитость - в ленту подмешиваются её твиты
+    follows.add((1, CELEBRITY_ID))
+    await session.execute(
+        insert(user_followers_association),
+        [
+            {"follower_id": follower, "following_id": following}
+            for follower, following in follows
+        ],
+    )
+    await session.execute(
+        update(User)
+        .where(User.id == CELEBRITY_ID)
+        .values(followers_count=settings.FEED.FANOUT_FOLLOWERS_THRESHOLD + 1)
+    )
+    await session.execute(
+        insert(tweet_like_association),
+        [
+            {"user_id": user_id, "tweet_id": tweet_id}
+            for tweet_id in range(1, TWEETS + 1)
+            for user_id in rnd.sample(range(1, USERS + 1), LIKES_PER_TWEET)
+        ],
+    )
+    await session.execute(
+        insert(Media),
+        [
+            {
+                "path": f"{i:064x}.jpg",
+                "content_hash": f"{i:064x}",
+                "user_id": 1,
+                "tweet_id": i,
+            }
+            for i in range(1, TWEETS + 1, MEDIA_EVERY)
+        ],
+    )
+    await session.execute(
+        insert(home_timeline_table).from_select(
+            ["user_id", "tweet_id", "author_id", "score"],
+            select(
+                user_followers_association.c.follower_id,
+                Tweet.id,
+                Tweet.author_id,
+                Tweet.id,
+            ).join(
+                user_followers_association,
+                user_followers_association.c.following_id == Tweet.author_id,
+            ),
+        )
+    )
+    await session.commit()
+
+
+async def run_repository_queries(session: AsyncSession) -> None:
+    """Горячие запросы репозиториев: ленты, профиль, лайки, подписки, твиты"""
+    user = AuthUserSchema(id=1, name="user1")
+    users = UserRepository(session)
+    tweets = TweetRepository(session)
+
+    await users.get_user_by_api_key("key1")
+    await users.get_user_profile(user_id=2, viewer=user)
+    _, cursor = await users.get_followers(2, None, 5)
+    await users.get_followers(2, cursor, 5)
+    _, cursor = await users.get_following(2, None, 5)
+    await users.get_following(2, cursor, 5)
+
+    for all_tweets in (True, False):
+        _, cursor = await tweets.get_tweets(user, all_tweets, None, 20)
+        await tweets.get_tweets(user, all_tweets, cursor, 20, with_likes=False)
+
+    tweet_id = await tweets.create_tweet(user, "новый твит", media_ids=[1])
+    await tweets.like_tweet(user, tweet_id)
+    await tweets.unlike_tweet(user, tweet_id)
+    await tweets.delete_tweet(user, tweet_id)
+
+    followed = select(user_followers_association.c.following_id).where(
+        user_followers_association.c.follower_id == user.id
+    )
+    target = await session.scalar(
+        select(User.id).where(User.id != user.id, User.id.not_in(followed)).limit(1)
+    )
+    await users.follow_user(user, target)
+    await users.unfollow_user(user, target)
+
+    # Пакетные операции
+    await tweets.get_tweets_by_ids([1, 2, 3])
+    await tweets.like_tweets(user, [1, 2, 3])
+    await tweets.unlike_tweets(user, [1, 2, 3])
+    targets = (
+        await session.scalars(
+            select(User.id).where(User.id != user.id, User.id.not_in(followed)).limit(3)
+        )
+    ).all()
+    await users.follow_users(user, list(targets))
+    await users.unfollow_users(user, list(targets))
+
+
+async def seq_scans(conn, statement: str, parameters) -> list[str]:
+    """Полные сканирования больших таблиц в плане запроса"""
+    if conn.dialect.name == "postgresql":
+        # С запретом seq scan он останется в плане, только если индекса нет
+        await conn.exec_driver_sql("SET enable_seqscan = off")
+        result = await conn.exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {statement}", parameters
+        )
+        plan = result.scalar()
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+
+        def walk(node: dict):
+            yield node
+            for child in node.get("Plans", []):
+                yield from walk(child)
+
+        return [
+            node["Relation Name"]
+            for node in walk(plan[0]["Plan"])
+            if node["Node Type"] == "Seq Scan"
+            and node.get("Relation Name") in LARGE_TABLES
+        ]
+
+    result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+    scans = []
+    for *_, detail in result.all():
+        # "SCAN tweets USING INDEX ..." - упорядоченный обход индекса, не seq scan
+        match = re.fullmatch(r"SCAN (\w+)", detail)
+        if match and re.sub(r"_\d+$", "", match.group(1)) in LARGE_TABLES:
+            scans.append(match.group(1))
+    return scans
+
+
+def test_repository_queries_use_indexes():
+    """Тест планов запросов: ни один запрос репозиториев
+    не должен полностью сканировать большие таблицы"""
+
+    async def scenario():
+        kwargs = {"poolclass": StaticPool} if DATABASE_URL.startswith("sqlite") else {}
+        engine = create_async_engine(DATABASE_URL, **kwargs)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(
+            engine, expire_on_commit=False, class_=AsyncSession
+        )
+
+        async with session_factory() as session:
+            await seed(session)
+        async with engine.begin() as conn:
+            await conn.execute(text("ANALYZE"))
+
+        statements: dict[str, tuple] = {}
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if not executemany and not statement.startswith(("PRAGMA", "EXPLAIN")):
+                statements.setdefault(statement, parameters)
+
+        event.listen(engine.sync_engine, "before_cursor_execute", capture)
+        async with session_factory() as session:
+            await run_repository_queries(session)
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+        violations = {}
+        async with engine.connect() as conn:
+            for statement, parameters in statements.items():
+                scans = await seq_scans(conn, statement, parameters)
+                if scans:
+                    violations[statement] = scans
+
+        await engine.dispose()
+        return statements, violations
+
+    statements, violations = asyncio.run(scenario())
+
+    assert len(statements) > 10
+    assert not violations, "\n\n".join(
+        f"{tables}:\n{statement}" for statement, tables in violations.items()
+    )
@@ -0,0 +1,77 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from microblog.api.schemas import AuthUserSchema
+from microblog.core.security import AuthCache
+from microblog.db.models import User
+
+USER = AuthUserSchema(id=1, name="Oliver")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_auth_cache_ttl():
+    """Тест истечения записей кэша авторизации"""
+    clock = FakeClock()
+    cache = AuthCache(ttl=10, negative_ttl=2, max_size=10, clock=clock)
+
+    assert cache.lookup("000") == (False, None)
+
+    cache.set("000", USER)
+    cache.set("bad", None)
+    assert cache.lookup("000") == (True, USER)
+    assert cache.lookup("bad") == (True, None)
+
+    # Неверный ключ живёт меньше найденного пользователя
+    clock.now = 5
+    assert cache.lookup("bad") == (False, None)
+    assert cache.lookup("000") == (True, USER)
+
+    clock.now = 10
+    assert cache.lookup("000") == (False, None)
+    assert len(cache) == 0
+
+
+def test_auth_cache_lru_and_invalidation():
+    """Тест вытеснения по размеру и явного сброса кэша"""
+    cache = AuthCache(ttl=60, negative_ttl=60, max_size=2)
+
+    cache.set("a", USER)
+    cache.set("b", AuthUserSchema(id=2, name="Jenia"))
+    cache.lookup("a")
+    cache.set("c", None)
+
+    # Вытеснена давно не использованная запись
+    assert cache.lookup("b") == (False, None)
+    assert cache.lookup("a") == (True, USER)
+
+    cache.invalidate_user(USER.id)
+    assert cache.lookup("a") == (False, None)
+
+    cache.invalidate("c")
+    assert len(cache) == 0
+
+
+def test_auth_cache_invalidated_on_user_insert(client, setup_database):
+    """Тест сброса отрицательной записи кэша при создании пользователя"""
+    headers = {"api-key": "new-user-key"}
+    response = client.get("/api/users/me", headers=headers)
+    assert response.status_code == 401
+
+    async def create_user():
+        async with AsyncSession(setup_database) as session:
+            session.add(User(name="Max", api_key="new-user-key"))
+            await session.commit()
+
+    asyncio.run(create_user())
+
+    response = client.get("/api/users/me", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["user"]["name"] == "Max"
@@ -0,0 +1,88 @@
+import gzip
+import os
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from microblog.core.static import AssetFiles, accepted_encodings, precompress
+
+SCRIPT = b"console.log('microblog');" * 200
+
+
+def make_client(directory, source_maps: bool) -> TestClient:
+    app = FastAPI()
+    app.mount("/", AssetFiles(directory=directory, source_maps=source_maps))
+    return TestClient(app)
+
+
+def test_accepted_encodings():
+    """Тест разбора Accept-Encoding: q-значения, * и отказ через q=0"""
+    assert accepted_encodings("gzip, deflate, br") == ["br", "gzip"]
+    assert accepted_encodings("gzip;q=1.0, br;q=0.5") == ["gzip", "br"]
+    assert accepted_encodings("br;q=0, *") == ["gzip"]
+    assert accepted_encodings("identity") == []
+    assert accepted_encodings("") == []
+
+
+def test_precompressed_static(tmp_path):
+    """Тест отдачи сжатой копии, кэширования и 304 по ETag"""
+    (tmp_path / "js").mkdir()
+    script = tmp_path / "js" / "app.ee2cdef2.js"
+    script.write_bytes(SCRIPT)
+    (tmp_path / "index.html").write_text("<html></html>")
+    (tmp_path / "js" / "app.ee2cdef2.js.map").write_text("{}")
+
+    # Папка загрузок не обходится
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    (uploads / "user.js").write_bytes(SCRIPT)
+
+    assert precompress(tmp_path, min_size=1024, skip=uploads) >= 1
+    assert not (uploads / "user.js.gz").exists()
+    compressed = tmp_path / "js" / "app.ee2cdef2.js.gz"
+    assert gzip.decompress(compressed.read_bytes()) == SCRIPT
+    assert compressed.stat().st_mtime == script.stat().st_mtime
+    # Маленькие файлы не сжимаются, повторный запуск ничего не пересжимает
+    assert not (tmp_path / "index.html.gz").exists()
+    assert precompress(tmp_path, min_size=1024, skip=uploads) == 0
+
+    client = make_client(tmp_path, source_maps=False)
+    response = client.get("/js/app.ee2cdef2.js", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-length"] == str(compressed.stat().st_size)
+    assert response.headers["content-type"].startswith("text/javascript")
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.content == SCRIPT
+
+    identity = client.get(
+        "/js/app.ee2cdef2.js", headers={"Accept-Encoding": "identity"}
+    )
+    assert "content-encoding" not in identity.headers
+    assert identity.headers["content-length"] == str(len(SCRIPT))
+    assert identity.headers["etag"] != response.headers["etag"]
+
+    not_modified = client.get(
+        "/js/app.ee2cdef2.js",
+        headers={
+            "Accept-Encoding": "gzip",
+            "If-None-Match": response.headers["etag"],
+        },
+    )
+    assert not_modified.status_code == 304
+    assert not_modified.headers["cache-control"].endswith("immutable")
+
+    # Файлы без хэша в имени проверяются при каждом запросе
+    assert client.get("/index.html").headers["cache-control"] == "no-cache"
+
+    # Source map доступны только вне prod
+    assert client.get("/js/app.ee2cdef2.js.map").status_code == 404
+    dev_client = make_client(tmp_path, source_maps=True)
+    assert dev_client.get("/js/app.ee2cdef2.js.map").status_code == 200
+
+    # Изменённый файл сжимается заново
+    script.write_bytes(SCRIPT * 2)
+    os.utime(script, (0, script.stat().st_mtime + 10))
+    assert precompress(tmp_path, min_size=1024, skip=uploads) >= 1
+    assert gzip.decompress(compressed.read_bytes()) == SCRIPT * 2
@@ -1,4 +1,20 @@
-from conftest import TEST_USER_1, TEST_USER_2, TEST_USER_3
+import asyncio
+import io
+from datetime import datetime, timedelta, timezone
+
+from conftest import TEST_PNG, TEST_USER_1, TEST_USER_2, TEST_USER_3
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from microblog.api.schemas import utc_stamp
+from microblog.bulk_import import read_batches
+from microblog.config import settings
+from microblog.core.responses import FastJSONRoute
+from microblog.db.models import Tweet, home_timeline_table
+from microblog.repositories.repository import TweetRepository
 
 TWEET = "Тестовый твит без нагрузки №1"
 TWEET_WITH_MEDIA = "Твит с нагрузкой №2"
@@ -44,7 +60,7 @@ def test_post_tweet(client):
 
     # Проверка публикации твита с нагрузкой
 
-    test_file = {"file": ("test.txt", b"Some beautiful picture", "text/plain")}
+    test_file = {"file": ("test.png", TEST_PNG, "image/png")}
 
     response_media = client.post(
         "/api/medias", files=test_file, headers={"api-key": user["api_key"]}
@@ -235,3 +251,383 @@ def test_unlike_tweet(client):
     assert response.status_code == 200
     assert response.json()["result"]
     assert len(response.json()["tweets"][0]["likes"]) == 0
+
+
+def test_get_tweets_pagination(client):
+    """Тест постраничной выдачи твитов по курсору"""
+    headers = {"api-key": TEST_USER_3["api_key"]}
+    for i in range(3):
+        client.post(
+            "/api/tweets",
+            json={"tweet_data": f"Твит для пагинации №{i}", "tweet_media_ids": []},
+            headers=headers,
+        )
+
+    response = client.get("/api/tweets", headers=headers)
+    all_ids = [tw["id"] for tw in response.json()["tweets"]]
+    assert response.json()["next_cursor"] is None
+
+    collected, cursor = [], None
+    while True:
+        params: dict = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/tweets", params=params, headers=headers)
+        assert response.status_code == 200
+        assert len(response.json()["tweets"]) <= 2
+        collected.extend(tw["id"] for tw in response.json()["tweets"])
+        cursor = response.json()["next_cursor"]
+        if not cursor:
+            break
+
+    assert collected == all_ids
+
+    # Повреждённый курсор
+    response = client.get(
+        "/api/tweets", params={"cursor": "not-a-cursor"}, headers=headers
+    )
+    assert response.status_code == 400
+    assert "курсор" in response.json()["detail"]
+
+
+def test_get_tweets_without_likes(client):
+    """Тест ленты без списка лайкнувших: счётчик отдаётся всегда"""
+    headers = {"api-key": TEST_USER_3["api_key"]}
+    tweet_id = client.get("/api/tweets", headers=headers).json()["tweets"][-1]["id"]
+    client.post(f"/api/tweets/{tweet_id}/likes", headers=headers)
+
+    response = client.get("/api/tweets", headers=headers)
+    liked = response.json()["tweets"][0]
+    assert liked["id"] == tweet_id
+    assert liked["like_count"] == len(liked["likes"]) == 1
+    assert liked["likes"][0] == {
+        "user_id": TEST_USER_3["id"],
+        "name": TEST_USER_3["name"],
+    }
+
+    response = client.get("/api/tweets", params={"with_likes": False}, headers=headers)
+    liked = response.json()["tweets"][0]
+    assert liked["like_count"] == 1
+    assert liked["likes"] == []
+
+    client.delete(f"/api/tweets/{tweet_id}/likes", headers=headers)
+    response = client.get("/api/tweets", headers=headers)
+    assert all(tw["like_count"] == 0 for tw in response.json()["tweets"])
+
+
+def test_home_timeline(client, monkeypatch):
+    """Тест домашней ленты: раскладка при записи, удаление, отписка"""
+    reader = {"api-key": TEST_USER_1["api_key"]}
+    author = {"api-key": TEST_USER_3["api_key"]}
+    author_id = TEST_USER_3["id"]
+
+    response = client.get("/api/tweets", params={"all_tweets": False}, headers=reader)
+    assert not response.json()["result"]
+
+    # При подписке лента дозаполняется последними твитами автора
+    client.post(f"/api/users/{author_id}/follow", headers=reader)
+    response = client.get("/api/tweets", params={"all_tweets": False}, headers=reader)
+    backfilled = [tw["id"] for tw in response.json()["tweets"]]
+    assert backfilled
+    assert backfilled == sorted(backfilled, reverse=True)
+    assert all(tw["author"]["id"] == author_id for tw in response.json()["tweets"])
+
+    # Новый твит раскладывается по лентам подписчиков
+    tweet_id = client.post(
+        "/api/tweets",
+        json={"tweet_data": "Твит в домашнюю ленту", "tweet_media_ids": []},
+        headers=author,
+    ).json()["tweet_id"]
+    response = client.get(
+        "/api/tweets", params={"all_tweets": False, "limit": 1}, headers=reader
+    )
+    assert [tw["id"] for tw in response.json()["tweets"]] == [tweet_id]
+    response = client.get(
+        "/api/tweets",
+        params={"all_tweets": False, "cursor": response.json()["next_cursor"]},
+        headers=reader,
+    )
+    assert [tw["id"] for tw in response.json()["tweets"]] == backfilled
+
+    # Удалённый твит пропадает из лент
+    client.delete(f"/api/tweets/{tweet_id}", headers=author)
+    response = client.get("/api/tweets", params={"all_tweets": False}, headers=reader)
+    assert [tw["id"] for tw in response.json()["tweets"]] == backfilled
+
+    # Твиты знаменитостей не раскладываются, а подмешиваются при чтении
+    monkeypatch.setattr(settings.FEED, "FANOUT_FOLLOWERS_THRESHOLD", 0)
+    tweet_id = client.post(
+        "/api/tweets",
+        json={"tweet_data": "Твит знаменитости", "tweet_media_ids": []},
+        headers=author,
+    ).json()["tweet_id"]
+    response = client.get("/api/tweets", params={"all_tweets": False}, headers=reader)
+    assert [tw["id"] for tw in response.json()["tweets"]] == [tweet_id, *backfilled]
+    client.delete(f"/api/tweets/{tweet_id}", headers=author)
+    monkeypatch.undo()
+
+    # При отписке твиты автора убираются из ленты
+    client.delete(f"/api/users/{author_id}/follow", headers=reader)
+    response = client.get("/api/tweets", params={"all_tweets": False}, headers=reader)
+    assert not response.json()["result"]
+
+
+def test_like_tweet_idempotent(client):
+    """Тест повторного лайка и снятия: счётчик меняется только один раз"""
+    headers = {"api-key": TEST_USER_1["api_key"]}
+    tweet_id = client.get("/api/tweets", headers=headers).json()["tweets"][0]["id"]
+
+    response = client.post(f"/api/tweets/{tweet_id}/likes", headers=headers)
+    assert response.json()["result"]
+    response = client.post(f"/api/tweets/{tweet_id}/likes", headers=headers)
+    assert response.status_code == 404
+
+    tweet = client.get("/api/tweets", headers=headers).json()["tweets"][0]
+    assert tweet["id"] == tweet_id
+    assert tweet["like_count"] == len(tweet["likes"]) == 1
+
+    response = client.delete(f"/api/tweets/{tweet_id}/likes", headers=headers)
+    assert response.json()["result"]
+    response = client.delete(f"/api/tweets/{tweet_id}/likes", headers=headers)
+    assert response.status_code == 404
+
+    response = client.get("/api/tweets", headers=headers)
+    assert all(tw["like_count"] == 0 for tw in response.json()["tweets"])
+
+    # Лайк несуществующего твита
+    response = client.post("/api/tweets/100500/likes", headers=headers)
+    assert response.status_code == 404
+
+
+def test_tweet_stamp_and_response_schema(client):
+    """Тест формата времени твита и схемы ответа при сериализации в байты"""
+    naive = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    aware = datetime(2024, 5, 1, 15, 30, 15, tzinfo=timezone(timedelta(hours=3)))
+    assert utc_stamp(naive) == "2024-05-01T12:30:15Z"
+    assert utc_stamp(aware) == "2024-05-01T12:30:15Z"
+
+    response = client.get("/api/tweets", headers={"api-key": TEST_USER_1["api_key"]})
+    assert response.headers["content-type"] == "application/json"
+    for tweet in response.json()["tweets"]:
+        assert tweet["stamp"].endswith("Z")
+
+    # Схема ответа по-прежнему описана в OpenAPI
+    paths = client.get("/openapi.json").json()["paths"]
+    operation = paths["/api/tweets/{id_tweet}/likes"]["post"]
+    schema = operation["responses"]["200"]["content"]["application/json"]["schema"]
+    assert schema["$ref"].endswith("/TweetSuccessSchema")
+
+
+def test_fast_json_route_filters_response():
+    """Тест фильтрации ответа по response_model при сериализации в байты"""
+
+    class Public(BaseModel):
+        id: int
+
+    class Private(Public):
+        api_key: str
+
+    router = APIRouter(route_class=FastJSONRoute)
+
+    @router.get("/subclass")
+    async def subclass() -> Public:
+        return Private(id=1, api_key="secret")
+
+    @router.get("/invalid", response_model=Public)
+    async def invalid():
+        return {"id": "not a number"}
+
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app, raise_server_exceptions=False)
+
+    # Поле подкласса, не описанное в схеме, клиенту не уходит
+    assert client.get("/subclass").json() == {"id": 1}
+    # Значение не модели проходит обычную валидацию FastAPI
+    assert client.get("/invalid").status_code == 500
+
+
+def test_batch_likes_and_lookup(client):
+    """Тест пакетных лайков одной транзакцией и получения твитов по списку id"""
+    headers = {"api-key": TEST_USER_2["api_key"]}
+    tweet_ids = [
+        tw["id"] for tw in client.get("/api/tweets", headers=headers).json()["tweets"]
+    ]
+    batch = [*tweet_ids, 100500]
+
+    response = client.post(
+        "/api/tweets/likes:batch", json={"ids": batch}, headers=headers
+    )
+    assert response.status_code == 200
+    assert response.json() == {"result": True, "ids": sorted(tweet_ids)}
+
+    # Повторный пакет ничего не меняет
+    response = client.post(
+        "/api/tweets/likes:batch", json={"ids": batch}, headers=headers
+    )
+    assert response.json() == {"result": True, "ids": []}
+
+    response = client.get(
+        "/api/tweets",
+        params={"ids": [tweet_ids[-1], 100500, tweet_ids[0]]},
+        headers=headers,
+    )
+    tweets = response.json()["tweets"]
+    assert [tw["id"] for tw in tweets] == [tweet_ids[-1], tweet_ids[0]]
+    assert all(tw["like_count"] == len(tw["likes"]) == 1 for tw in tweets)
+
+    response = client.request(
+        "DELETE", "/api/tweets/likes:batch", json={"ids": batch}, headers=headers
+    )
+    assert response.json()["ids"] == sorted(tweet_ids)
+    response = client.get("/api/tweets", params={"ids": tweet_ids}, headers=headers)
+    assert all(tw["like_count"] == 0 for tw in response.json()["tweets"])
+
+    # Пустой и слишком большой пакет
+    response = client.post("/api/tweets/likes:batch", json={"ids": []}, headers=headers)
+    assert response.status_code == 422
+    too_many = list(range(settings.BATCH_MAX_SIZE + 1))
+    response = client.post(
+        "/api/tweets/likes:batch", json={"ids": too_many}, headers=headers
+    )
+    assert response.status_code == 422
+
+
+def test_create_tweet_attaches_own_media(client):
+    """Тест прикрепления вложений одним UPDATE: только свои и свободные медиа"""
+    owner = {"api-key": TEST_USER_2["api_key"]}
+    stranger = {"api-key": TEST_USER_1["api_key"]}
+    test_file = {"file": ("test.png", TEST_PNG, "image/png")}
+    media_id = client.post("/api/medias", files=test_file, headers=owner).json()[
+        "media_id"
+    ]
+
+    def attachments(tweet_id: int) -> list[str]:
+        response = client.get("/api/tweets", params={"ids": [tweet_id]}, headers=owner)
+        return response.json()["tweets"][0]["attachments"]
+
+    payload = {"tweet_data": "Чужое медиа", "tweet_media_ids": [media_id, 100500]}
+    tweet_id = client.post("/api/tweets", json=payload, headers=stranger).json()[
+        "tweet_id"
+    ]
+    assert attachments(tweet_id) == []
+
+    payload["tweet_data"] = "Своё медиа"
+    tweet_id = client.post("/api/tweets", json=payload, headers=owner).json()[
+        "tweet_id"
+    ]
+    assert len(attachments(tweet_id)) == 1
+
+    # Уже прикреплённое медиа не переезжает в другой твит
+    payload["tweet_data"] = "Повторное прикрепление"
+    other_id = client.post("/api/tweets", json=payload, headers=owner).json()[
+        "tweet_id"
+    ]
+    assert attachments(other_id) == []
+    assert len(attachments(tweet_id)) == 1
+
+
+def test_bulk_import_tweets(client, setup_database):
+    """Тест массового импорта твитов пачками и идемпотентной раскладки по лентам"""
+    lines = io.StringIO(
+        "\n".join(
+            f'{{"author_id": {TEST_USER_3["id"]}, "content": "Импорт {i}", '
+            f'"created_at": "2024-01-01T00:00:{i % 60:02d}"}}'
+            for i in range(120)
+        )
+        + "\n\n"
+    )
+    client.post(
+        f"/api/users/{TEST_USER_3['id']}/follow",
+        headers={"api-key": TEST_USER_1["api_key"]},
+    )
+
+    async def scenario():
+        async with AsyncSession(setup_database) as session:
+            repository = TweetRepository(session)
+            last_id = await repository.get_last_tweet_id()
+            imported = 0
+            for batch in read_batches(lines, 50):
+                imported += await repository.bulk_create_tweets(batch)
+            await repository.fan_out_imported(after_id=last_id)
+            # Повторная раскладка и раскладка удалённого твита не дают ошибок
+            await repository.fan_out_imported(after_id=last_id)
+            await repository.timeline_repo.fan_out(TEST_USER_3["id"], last_id + 1000)
+            await session.commit()
+
+            stored = await session.scalar(
+                select(func.count()).where(
+                    Tweet.id > last_id, Tweet.content.startswith("Импорт")
+                )
+            )
+            in_timeline = await session.scalar(
+                select(func.count()).where(
+                    home_timeline_table.c.user_id == TEST_USER_1["id"],
+                    home_timeline_table.c.tweet_id > last_id,
+                )
+            )
+            return imported, stored, in_timeline
+
+    assert asyncio.run(scenario()) == (120, 120, 120)
+
+    client.delete(
+        f"/api/users/{TEST_USER_3['id']}/follow",
+        headers={"api-key": TEST_USER_1["api_key"]},
+    )
+
+
+def test_search_tweets(client):
+    """Тест полнотекстового поиска: порядок по релевантности и лайкам,
+    все слова запроса, пагинация по курсору"""
+    author = {"api-key": TEST_USER_1["api_key"]}
+
+    def post(text: str) -> int:
+        return client.post(
+            "/api/tweets",
+            json={"tweet_data": text, "tweet_media_ids": []},
+            headers=author,
+        ).json()["tweet_id"]
+
+    def search(**params) -> dict:
+        response = client.get("/api/tweets/search", params=params, headers=author)
+        assert response.status_code == 200
+        return response.json()
+
+    exact_id = post("Зебра бежит")
+    long_id = post("Зебра бежит по саванне очень долго")
+    liked_id = post("зебра, бежит!")
+    for user in (TEST_USER_2, TEST_USER_3):
+        client.post(
+            f"/api/tweets/{liked_id}/likes", headers={"api-key": user["api_key"]}
+        )
+
+    found = search(q="бежит зебра")
+    assert [tw["id"] for tw in found["tweets"]] == [liked_id, exact_id, long_id]
+    assert found["tweets"][0]["like_count"] == 2
+    assert found["next_cursor"] is None
+
+    collected, cursor = [], None
+    while True:
+        params: dict = {"q": "зебра", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        page = search(**params)
+        collected.extend(tw["id"] for tw in page["tweets"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert collected == [liked_id, exact_id, long_id]
+
+    assert [tw["id"] for tw in search(q="зебра саванне")["tweets"]] == [long_id]
+    assert search(q="зебра жираф")["result"] is False
+
+    # Удалённый твит пропадает из выдачи
+    client.delete(f"/api/tweets/{liked_id}", headers=author)
+    assert [tw["id"] for tw in search(q="зебра")["tweets"]] == [exact_id, long_id]
+
+    response = client.get(
+        "/api/tweets/search", params={"q": "зебра", "cursor": "x"}, headers=author
+    )
+    assert response.status_code == 400
+    response = client.get("/api/tweets/search", params={"q": ""}, headers=author)
+    assert response.status_code == 422
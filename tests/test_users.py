@@ -1,4 +1,4 @@
-from conftest import TEST_USER_1, TEST_USER_2
+from conftest import TEST_USER_1, TEST_USER_2, TEST_USER_3
 
 
 def test_get_me(client):
@@ -148,3 +148,81 @@ def test_unfollow_user_by_id(client):
         following["name"] for following in current_user_data["following"]
     ]
     assert TEST_USER_2.get("name") not in following_names
+
+
+def test_followers_pagination(client):
+    """Тест счётчиков профиля и постраничных списков подписчиков и подписок"""
+    target_id = TEST_USER_2["id"]
+    for user in (TEST_USER_1, TEST_USER_3):
+        client.post(
+            f"/api/users/{target_id}/follow", headers={"api-key": user["api_key"]}
+        )
+    headers = {"api-key": TEST_USER_1["api_key"]}
+
+    profile = client.get(f"/api/users/{target_id}", headers=headers).json()["user"]
+    assert profile["followers_count"] == len(profile["followers"])
+    assert {TEST_USER_1["id"], TEST_USER_3["id"]} <= {
+        follower["id"] for follower in profile["followers"]
+    }
+
+    collected, cursor = [], None
+    while True:
+        params: dict = {"limit": 1}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(
+            f"/api/users/{target_id}/followers", params=params, headers=headers
+        )
+        assert response.status_code == 200
+        assert len(response.json()["users"]) == 1
+        collected.extend(user["id"] for user in response.json()["users"])
+        cursor = response.json()["next_cursor"]
+        if not cursor:
+            break
+    assert collected == sorted(follower["id"] for follower in profile["followers"])
+
+    response = client.get(f"/api/users/{TEST_USER_3['id']}/following", headers=headers)
+    assert target_id in [user["id"] for user in response.json()["users"]]
+    me = client.get("/api/users/me", headers={"api-key": TEST_USER_3["api_key"]})
+    assert me.json()["user"]["following_count"] == len(response.json()["users"])
+
+    response = client.get(
+        f"/api/users/{target_id}/followers", params={"cursor": "bad"}, headers=headers
+    )
+    assert response.status_code == 400
+
+    for user in (TEST_USER_1, TEST_USER_3):
+        client.delete(
+            f"/api/users/{target_id}/follow", headers={"api-key": user["api_key"]}
+        )
+    response = client.get(f"/api/users/{target_id}/followers", headers=headers)
+    assert not response.json()["result"]
+
+
+def test_batch_follow(client):
+    """Тест пакетной подписки и отписки одной транзакцией"""
+    headers = {"api-key": TEST_USER_3["api_key"]}
+    targets = [TEST_USER_1["id"], TEST_USER_2["id"]]
+    batch = [*targets, TEST_USER_3["id"], 100500]
+
+    response = client.post(
+        "/api/users/follow:batch", json={"ids": batch}, headers=headers
+    )
+    assert response.status_code == 200
+    assert response.json() == {"result": True, "ids": targets}
+
+    response = client.post(
+        "/api/users/follow:batch", json={"ids": batch}, headers=headers
+    )
+    assert response.json()["ids"] == []
+
+    for target_id in targets:
+        profile = client.get(f"/api/users/{target_id}", headers=headers).json()["user"]
+        assert TEST_USER_3["id"] in [user["id"] for user in profile["followers"]]
+
+    response = client.request(
+        "DELETE", "/api/users/follow:batch", json={"ids": batch}, headers=headers
+    )
+    assert response.json()["ids"] == targets
+    me = client.get("/api/users/me", headers=headers).json()["user"]
+    assert me["following_count"] == 0